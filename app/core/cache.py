@@ -0,0 +1,115 @@
+"""
+GET 响应缓存
+
+用 @cache_response() 标记路由函数后，NegotiatedRoute（app.core.negotiation）会按
+路径 + 查询参数 + 响应格式（JSON / MessagePack）缓存 200 响应的字节，命中时不打开数据库会话、不执行 CRUD。
+压缩变体在第一次被请求时生成并和原始字节一起保存，热点响应命中时不再消耗压缩 CPU；
+这类响应带 Content-Encoding，CompressionMiddleware 会原样透传。
+
+缓存是进程内的 LRU，条目在 ttl 秒后过期。
+
+RowCache 是按数据版本（app.core.versions）校验的行缓存：保存行时记下当时的版本号，
+版本号变化（写入已提交）后该行自动失效，不需要 ttl。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from app.core import metrics
+from app.core.compression import compress
+from app.core.config import settings
+
+def cache_response(ttl: float = None):
+    """标记路由函数的响应可以缓存 ttl 秒（默认 RESPONSE_CACHE_TTL）"""
+    def decorator(fn):
+        fn.response_cache_ttl = settings.RESPONSE_CACHE_TTL if ttl is None else ttl
+        return fn
+    return decorator
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "expires_at", "_variants", "_lock")
+
+    def __init__(self, body: bytes, media_type: str, expires_at: float):
+        self.body = body
+        self.media_type = media_type
+        self.expires_at = expires_at
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        """指定编码的响应体，每种编码只压缩一次"""
+        if encoding is None:
+            return self.body
+        variant = self._variants.get(encoding)
+        if variant is None:
+            with self._lock:
+                variant = self._variants.get(encoding)
+                if variant is None:
+                    variant = self._variants[encoding] = compress(self.body, encoding)
+        return variant
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    del self._entries[key]
+                metrics.http_response_cache_requests_total.inc("miss")
+                return None
+            self._entries.move_to_end(key)
+        metrics.http_response_cache_requests_total.inc("hit")
+        return entry
+
+    def set(self, key, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
+
+
+class RowCache:
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """版本号一致时返回缓存的行，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                metrics.row_cache_requests_total.inc(self.name, "miss")
+                return None
+            self._entries.move_to_end(key)
+        metrics.row_cache_requests_total.inc(self.name, "hit")
+        return entry[1]
+
+    def set(self, key, version, row):
+        """version 应在查询之前读取：查询期间有写入时，保存的行会在下次读取时失效"""
+        with self._lock:
+            self._entries[key] = (version, row)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
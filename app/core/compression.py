@@ -0,0 +1,157 @@
+"""
+响应压缩（gzip / brotli）
+
+CompressionMiddleware 按 Accept-Encoding 协商编码（优先 br），只压缩不小于
+COMPRESSION_MIN_SIZE 字节的可压缩类型（JSON、NDJSON、CSV、文本等）；流式响应逐块压缩。
+已经带 Content-Encoding 的响应原样透传——响应缓存（app.core.cache）命中时直接返回
+预先压缩好的变体，不再重复压缩。
+
+brotli 为可选依赖，未安装时只使用 gzip。
+"""
+import gzip
+import zlib
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只提供 gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/msgpack",
+    "text/", "application/javascript", "image/svg+xml",
+)
+
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str):
+    """从 Accept-Encoding 中选出服务端支持的编码（br 优先），没有可用编码时返回 None"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=settings.GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+            self._compress, self._flush = self._compressor.process, self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress, self._flush = self._compressor.compress, self._compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._flush()
+
+
+def _add_vary(headers: list):
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[i] = (name, value + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 压缩响应（纯 ASGI，支持流式响应）"""
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), None)
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = next((v.decode("latin-1") for k, v in headers if k.lower() == b"content-type"), "")
+                already_encoded = any(k.lower() == b"content-encoding" for k, _ in headers)
+                if already_encoded or not is_compressible(content_type) or message["status"] in (204, 304):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # 看到第一块响应体后再决定是否压缩
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() != b"content-length"]
+                if not more_body and (not body or len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                headers.append((b"content-encoding", encoding.encode()))
+                _add_vary(headers)
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start_message, "headers": headers})
+                    start_message = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = _StreamCompressor(encoding)
+                await send({**start_message, "headers": headers})
+                start_message = None
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +8,17 @@ class Settings(BaseSettings):
 
     # Database
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///./test.db"
+    DB_POOL_SIZE: int = 8  # 读连接池大小；SQLite 单文件数据库不需要上百个连接
+    DB_MAX_OVERFLOW: int = 8
+    DB_POOL_TIMEOUT: int = 30
+    # 只读连接池（GET 接口使用），可指向只读副本或快照文件，留空则与主库相同
+    READ_DATABASE_URI: Optional[str] = None
+    READ_DB_POOL_SIZE: int = 16
+
+    # SQLite 性能配置（见 app.core.db.SQLITE_PROFILES）
+    SQLITE_PROFILE: str = "production"  # production | legacy
+    SQLITE_PRAGMAS: dict = {}  # 覆盖单个 pragma，例如 {"mmap_size": 0}
+    SQLITE_OPTIMIZE_INTERVAL: int = 3600  # 两次 PRAGMA optimize 之间的最小间隔（秒），0 表示关闭
 
     # Security
     SECRET_KEY: str = "a_very_secret_key"
@@ -15,6 +28,45 @@ class Settings(BaseSettings):
 
     # General
     TIMEZONE: str = "Asia/Shanghai"
+    DEBUG: bool = False  # 开启后响应头附带 SQL 统计（X-SQL-Queries 等）
+
+    # 单次请求中同一语句形状重复达到该次数即视为疑似 N+1（见 app.core.querystats）
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5
+
+    # 慢查询日志（见 app.core.slowlog）
+    SLOW_QUERY_MS: float = 200  # 超过该耗时的语句记为慢查询，0 表示关闭
+    SLOW_QUERY_BUFFER: int = 200  # 内存中保留的最近慢查询条数
+    SLOW_QUERY_LOG_FILE: Optional[str] = None  # 额外追加写入的 JSON Lines 文件
+
+    # 链路追踪（见 app.core.tracing）
+    TRACING_ENABLED: bool = True
+    TRACE_BUFFER_SIZE: int = 500  # 内存中保留的最近 trace 数
+    TRACE_SLOW_MS: float = 200  # /api/debug/traces 默认只显示超过该耗时的 trace
+    TRACE_LOG_FILE: Optional[str] = None  # 超过 TRACE_SLOW_MS 的 trace 追加写入的 JSON Lines 文件
+
+    # 请求剖析（见 app.core.profiling），关闭时不注册中间件
+    PROFILING_ENABLED: bool = False
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_SAMPLE_RATE: float = 0.0  # 0~1，随机抽样剖析的请求比例
+
+    # 数据导出（见 app.modules.exports）
+    EXPORT_BATCH_SIZE: int = 1000  # 服务端游标每批读取的行数，决定导出时的内存占用
+
+    # 响应压缩与缓存（见 app.core.compression / app.core.cache）
+    COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5  # brotli 为可选依赖
+    RESPONSE_CACHE_TTL: float = 30.0  # 标记了 @cache_response 的接口的默认缓存秒数（缓存键含数据版本，写入后立即失效），0 表示关闭
+    RESPONSE_CACHE_SIZE: int = 512  # 最多缓存的响应数
+    USER_ROW_CACHE_SIZE: int = 10000  # 批量查询玩家时缓存的精简玩家行数（按数据版本失效）
+
+    # 增量同步（见 app.modules.changes）
+    CHANGES_PAGE_SIZE: int = 1000  # /api/changes 每次最多返回的变更日志行数
+
+    # 批量请求（见 app.modules.batch）
+    BATCH_MAX_REQUESTS: int = 20  # /api/batch 每次最多执行的子请求数
+    USERS_BATCH_MAX_IDS: int = 500  # /api/users/batch 每次最多查询的玩家数
+    USERS_BULK_MAX: int = 1000  # /api/users/bulk 每次最多 get-or-create 的玩家数
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,21 +1,182 @@
-from sqlalchemy import create_engine
+import logging
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    # required for sqlite
-    connect_args={"check_same_thread": False},
-    # 优化连接池配置
-    pool_size=500,  # 减少基础连接池大小
-    max_overflow=0,  # 不允许溢出连接，强制复用
-    pool_timeout=30,  # 减少连接超时时间
-    pool_recycle=180,  # 30分钟回收连接
-    pool_pre_ping=True,  # 连接前ping检查
-    echo=False,  # 关闭SQL日志以提高性能
-)
+logger = logging.getLogger(__name__)
+
+# SQLite 连接级 pragma 配置
+SQLITE_PROFILES = {
+    # 旧行为：回滚日志模式，全部使用 SQLite 默认值
+    "legacy": {},
+    # 生产配置：WAL 允许读写并发，NORMAL 同步在 WAL 下仍保证一致性
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,  # 256MB 内存映射
+        "cache_size": -64 * 1024,  # 负数单位为 KB，即 64MB 页缓存
+        "busy_timeout": 5000,  # 遇到写锁时最多等待 5 秒，而不是立即报 database is locked
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def get_sqlite_pragmas(profile: str = None) -> dict:
+    """获取指定配置的 pragma，并叠加 settings.SQLITE_PRAGMAS 中的覆盖项"""
+    profile = profile or settings.SQLITE_PROFILE
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    pragmas.update(settings.SQLITE_PRAGMAS)
+    return pragmas
+
+
+def apply_sqlite_profile(engine, pragmas: dict, optimize_interval: int = None):
+    """
+    通过连接事件为引擎的每个新连接设置 pragma，并定期执行 PRAGMA optimize
+
+    Args:
+        engine: SQLAlchemy 引擎
+        pragmas: pragma 名称 -> 值
+        optimize_interval: 两次 PRAGMA optimize 之间的最小间隔（秒），0 表示不执行
+    """
+    if optimize_interval is None:
+        optimize_interval = settings.SQLITE_OPTIMIZE_INTERVAL
+    state = {"last_optimize": time.monotonic()}
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    if optimize_interval:
+        @event.listens_for(engine, "checkin")
+        def _periodic_optimize(dbapi_connection, connection_record):
+            # 连接归还时顺带检查，避免额外的后台线程
+            now = time.monotonic()
+            if now - state["last_optimize"] < optimize_interval:
+                return
+            state["last_optimize"] = now
+            try:
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA optimize")
+                cursor.close()
+            except Exception as e:
+                logger.warning(f"PRAGMA optimize failed: {e}")
+
+
+def analyze_database(engine):
+    """执行 ANALYZE 收集统计信息，供查询规划器选择索引（建表或批量导入后调用）"""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+
+def create_db_engine(url: str = None, pool_size: int = None, profile: str = None, read_only: bool = False, **kwargs):
+    """
+    按项目约定创建数据库引擎
+
+    SQLite 下会应用 SQLITE_PROFILE 配置，并关闭对本地文件无意义的 pre_ping 和连接回收
+    （回收连接会丢掉页缓存和 mmap）。read_only=True 时与 create_async_db_engine 一样设置 PRAGMA query_only。
+    """
+    url = url or settings.SQLALCHEMY_DATABASE_URI
+    options = {
+        "pool_size": settings.DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "echo": False,  # 关闭SQL日志以提高性能
+    }
+    if is_sqlite(url):
+        # required for sqlite
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_recycle"] = 180
+        options["pool_pre_ping"] = True
+    options.update(kwargs)
+
+    engine = create_engine(url, **options)
+    if is_sqlite(url):
+        pragmas = get_sqlite_pragmas(profile)
+        if read_only:
+            pragmas["query_only"] = "ON"
+        apply_sqlite_profile(engine, pragmas)
+    return engine
+
+
+def to_async_url(url: str) -> str:
+    """把同步驱动的数据库地址转换为对应的异步驱动地址"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+def create_async_db_engine(url: str = None, pool_size: int = None, profile: str = None, read_only: bool = False, **kwargs):
+    """
+    创建异步引擎（aiosqlite），连接池和 pragma 配置与 create_db_engine 一致
+
+    read_only=True 时为每个连接设置 PRAGMA query_only，任何写语句都会直接报错。
+    """
+    url = url or settings.SQLALCHEMY_DATABASE_URI
+    options = {
+        "pool_size": settings.DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "echo": False,
+    }
+    if not is_sqlite(url):
+        options["pool_recycle"] = 180
+        options["pool_pre_ping"] = True
+    options.update(kwargs)
+
+    engine = create_async_engine(to_async_url(url), **options)
+    if is_sqlite(url):
+        pragmas = get_sqlite_pragmas(profile)
+        if read_only:
+            # 必须放在最后：query_only 之后不能再切换 journal_mode
+            pragmas["query_only"] = "ON"
+        # 定期 optimize 由同步引擎负责
+        apply_sqlite_profile(engine.sync_engine, pragmas, optimize_interval=0)
+    return engine
+
+
+# 读连接池：所有只读查询共用
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# 写连接：只由单写线程（见 app.core.writer）使用，SQLite 同一时刻只允许一个写者
+writer_engine = create_db_engine(pool_size=1, max_overflow=0)
+# expire_on_commit=False：写操作返回的对象在写线程关闭会话后仍可被请求线程序列化
+WriterSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=writer_engine
+)
+
+# 只读连接池：GET 路由（async def）专用，与写线程互不阻塞，可单独扩容或指向副本
+read_engine = create_async_db_engine(
+    settings.READ_DATABASE_URI or settings.SQLALCHEMY_DATABASE_URI,
+    pool_size=settings.READ_DB_POOL_SIZE,
+    read_only=True,
+)
+ReadSessionLocal = async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+
+# 同步只读连接池：计算量大的 GET 接口在线程池中使用（见 app.core.deps.run_read），不占用事件循环
+sync_read_engine = create_db_engine(
+    settings.READ_DATABASE_URI or settings.SQLALCHEMY_DATABASE_URI,
+    pool_size=settings.READ_DB_POOL_SIZE,
+    read_only=True,
+)
+SyncReadSessionLocal = sessionmaker(autoflush=False, expire_on_commit=False, bind=sync_read_engine)
+
+Base = declarative_base()
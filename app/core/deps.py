@@ -1,8 +1,19 @@
 """
 数据库和其他依赖项的统一管理
 """
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.db import SessionLocal
+from starlette.concurrency import run_in_threadpool
+
+from app.core.db import SessionLocal, ReadSessionLocal, SyncReadSessionLocal
+from app.core.profiling import run_profiled
+
+# 批量请求期间共享的只读会话（见 shared_read_session）
+_shared_read_db: ContextVar[Optional[AsyncSession]] = ContextVar("shared_read_db", default=None)
 
 
 def get_db():
@@ -12,3 +23,55 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_read_db():
+    """
+    获取只读异步数据库会话的依赖函数（GET 接口使用）
+
+    连接设置了 query_only，会话不自动 flush，提交后不过期对象。
+    路由中通过 `await db.run_sync(crud.xxx, ...)` 复用同步 CRUD 函数，
+    CRUD 函数收到的是绑定在该异步连接上的同步 Session。
+    在 shared_read_session() 中执行时返回共享的会话，不再新建。
+    """
+    shared = _shared_read_db.get()
+    if shared is not None:
+        yield shared
+        return
+    async with ReadSessionLocal() as db:
+        yield db
+
+
+async def run_read(db: AsyncSession, fn, *args, **kwargs):
+    """
+    执行计算量大的只读 CRUD（玩家统计、排行榜、比赛历史）
+
+    `db.run_sync` 中的同步代码在事件循环线程上运行，结果组装等 CPU 工作会阻塞其他异步请求；
+    这里改在线程池中用同步只读会话执行。批量请求（shared_read_session）中仍在共享会话上执行，
+    保证所有子请求看到同一个数据快照。
+    """
+    if _shared_read_db.get() is db:
+        return await db.run_sync(fn, *args, **kwargs)
+
+    def call():
+        with SyncReadSessionLocal() as session:
+            return fn(session, *args, **kwargs)
+
+    # 发起请求正在被剖析时，线程池中的 CRUD 也计入同一份 profile
+    return await run_in_threadpool(run_profiled, call)
+
+
+@asynccontextmanager
+async def shared_read_session():
+    """
+    在当前上下文中共享一个只读会话（批量请求使用）
+
+    期间通过 get_read_db 注入的会话都是同一个，所有子请求在同一个读事务中执行，
+    看到的是同一个数据快照。会话不能并发使用，子请求需要依次执行。
+    """
+    async with ReadSessionLocal() as db:
+        token = _shared_read_db.set(db)
+        try:
+            yield db
+        finally:
+            _shared_read_db.reset(token)
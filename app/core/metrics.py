@@ -0,0 +1,208 @@
+"""
+进程内指标注册表，按 Prometheus 文本格式输出
+
+不依赖 prometheus_client；只实现本项目需要的 Counter / Gauge / Histogram。
+"""
+import threading
+from bisect import bisect_left
+
+# 请求耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        """callback 返回 {标签值元组: 数值}，在每次输出时调用，用于采集连接池等外部状态"""
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self):
+        if self._callback is not None:
+            for labels, value in self._callback().items():
+                yield self.name, _format_labels(self.labelnames, labels), value
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # 标签值 -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(state)) for labels, state in self._values.items()]
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, labels, ("le", _format_value(float(bound)))),
+                    cumulative,
+                )
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), state[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（version 0.0.4）"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- HTTP 指标（由 app.core.middleware.MetricsMiddleware 更新） ---
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（秒）", ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "正在处理中的 HTTP 请求数"
+)
+
+# 由 app.core.middleware.QueryStatsMiddleware 更新
+http_request_sql_queries = registry.histogram(
+    "http_request_sql_queries", "每个请求执行的 SQL 语句数", ("method", "route"),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+db_n_plus_one_suspects_total = registry.counter(
+    "db_n_plus_one_suspects_total", "出现疑似 N+1 查询的请求数", ("method", "route")
+)
+
+# 响应缓存（app.core.cache）
+http_response_cache_requests_total = registry.counter(
+    "http_response_cache_requests_total", "响应缓存查询次数", ("result",)
+)
+row_cache_requests_total = registry.counter(
+    "row_cache_requests_total", "行缓存查询的行数", ("cache", "result")
+)
+
+
+# --- 数据库指标（输出时采集） ---
+
+def _pool_engines():
+    from app.core.db import engine, writer_engine, read_engine, sync_read_engine
+    return {"default": engine, "writer": writer_engine, "read": read_engine.sync_engine, "sync_read": sync_read_engine}
+
+
+def _pool_stat(method_name):
+    def collect():
+        values = {}
+        for name, db_engine in _pool_engines().items():
+            method = getattr(db_engine.pool, method_name, None)
+            if method is not None:
+                values[(name,)] = method()
+        return values
+    return collect
+
+
+registry.gauge("db_pool_size", "连接池容量", ("pool",), callback=_pool_stat("size"))
+registry.gauge("db_pool_checked_out", "已借出的连接数", ("pool",), callback=_pool_stat("checkedout"))
+registry.gauge("db_pool_checked_in", "池中空闲的连接数", ("pool",), callback=_pool_stat("checkedin"))
+registry.gauge("db_pool_overflow", "溢出连接数", ("pool",), callback=_pool_stat("overflow"))
+
+
+def _writer_queue_depth():
+    from app.core.writer import write_queue
+    return {(): write_queue.depth}
+
+
+registry.gauge("db_writer_queue_depth", "写队列中等待或执行中的操作数", callback=_writer_queue_depth)
+db_write_duration_seconds = registry.histogram(
+    "db_write_duration_seconds", "写线程中每个写操作的执行耗时（秒）", ("operation",)
+)
@@ -1,55 +1,155 @@
 """
-数据库连接池监控和优化中间件
+请求指标采集中间件
+
+纯 ASGI 实现（不继承 BaseHTTPMiddleware），不会缓冲响应体，也不会打断流式响应；
+每个请求只做几次计数和一次直方图记录。
 """
 import logging
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
-from app.core.db import engine
+from contextvars import ContextVar
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.querystats import publish_request_stats, track_queries
+from app.core.tracing import tracer
+
+try:
+    # 新版 FastAPI 中 include_router 后 scope["route"] 仍是原路由对象，path 不含前缀；
+    # 完整模板保存在有效路由上下文里
+    from fastapi.routing import _get_scope_effective_route_context
+except ImportError:  # 旧版 FastAPI：scope["route"].path 本身就是完整模板
+    _get_scope_effective_route_context = None
 
 logger = logging.getLogger(__name__)
 
+# 未匹配到任何路由的请求统一归为一个标签，避免扫描类请求撑爆标签基数
+UNMATCHED_ROUTE = "__unmatched__"
+SLOW_REQUEST_SECONDS = 5.0
+
+# 当前请求的 ASGI scope，供慢查询日志等在请求内部获取路由
+_current_scope: ContextVar = ContextVar("request_scope", default=None)
+
+
+def get_route_template(scope) -> str:
+    """返回路由模板（如 /api/users/{user_id}），路由匹配后才有值"""
+    if _get_scope_effective_route_context is not None:
+        context = _get_scope_effective_route_context(scope)
+        if getattr(context, "path", None):
+            return context.path
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def current_route():
+    """当前请求的 "方法 路由模板"，不在请求中时为 None"""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    return f"{scope['method']} {get_route_template(scope)}"
+
+
+class MetricsMiddleware:
+    """记录每个路由的耗时直方图、状态码计数和处理中的请求数"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-class DatabaseConnectionMiddleware(BaseHTTPMiddleware):
-    """数据库连接池监控中间件"""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # 记录请求开始前的连接池状态
-        pool = engine.pool
-        pool_status_before = {
-            "size": pool.size(),
-            "checked_out": pool.checkedout(),
-            "checked_in": pool.checkedin(),
-            "overflow": pool.overflow()
-        }
-        
+        metrics.http_requests_in_flight.inc()
+        token = _current_scope.set(scope)
         try:
-            response = await call_next(request)
-            return response
-        except Exception as e:
-            logger.error(f"Request failed: {e}")
-            raise
+            await self.app(scope, receive, send_wrapper)
         finally:
-            # 记录请求完成后的连接池状态
-            pool_status_after = {
-                "size": pool.size(),
-                "checked_out": pool.checkedout(),
-                "checked_in": pool.checkedin(),
-                "overflow": pool.overflow()
-            }
-            
-            duration = time.time() - start_time
-            
-            # 如果连接池状态异常或请求时间过长，记录警告
-            if (pool_status_after["checked_out"] > 3 or 
-                duration > 5.0 or 
-                pool_status_after["overflow"] > 0):
-                logger.warning(
-                    f"DB Pool Status - Path: {request.url.path} | "
-                    f"Duration: {duration:.2f}s | "
-                    f"Before: {pool_status_before} | "
-                    f"After: {pool_status_after}"
-                )
+            _current_scope.reset(token)
+            duration = time.perf_counter() - start_time
+            metrics.http_requests_in_flight.dec()
+            method = scope["method"]
+            route = get_route_template(scope)
+            metrics.http_requests_total.inc(method, route, str(status_code))
+            metrics.http_request_duration_seconds.observe(method, route, value=duration)
+            if duration > SLOW_REQUEST_SECONDS:
+                logger.warning(f"Slow request - {method} {scope['path']} | Duration: {duration:.2f}s | Status: {status_code}")
+
+
+class QueryStatsMiddleware:
+    """
+    为每个请求开启 SQL 统计（见 app.core.querystats）
+
+    疑似 N+1 的请求会记录警告日志；DEBUG 模式下在响应头中附带统计：
+    X-SQL-Queries、X-SQL-Time-Ms、X-SQL-N-Plus-One（疑似 N+1 的语句形状数）。
+    流式响应在响应头发出之后执行的语句不计入响应头，但会计入日志和指标。
+    """
+
+    def __init__(self, app, debug: bool = None):
+        self.app = app
+        self.debug = settings.DEBUG if debug is None else debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_wrapper(message):
+                if self.debug and message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-sql-queries", str(stats.count).encode()))
+                    headers.append((b"x-sql-time-ms", f"{stats.total_ms:.2f}".encode()))
+                    headers.append((b"x-sql-n-plus-one", str(len(stats.n_plus_one_suspects())).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                publish_request_stats(stats)
+                route = get_route_template(scope)
+                metrics.http_request_sql_queries.observe(scope["method"], route, value=stats.count)
+                suspects = stats.n_plus_one_suspects()
+                if suspects:
+                    metrics.db_n_plus_one_suspects_total.inc(scope["method"], route)
+                    worst_shape, worst_count = next(iter(suspects.items()))
+                    logger.warning(
+                        f"Possible N+1 - {scope['method']} {route} | {stats.count} queries | "
+                        f"repeated {worst_count}x: {worst_shape[:200]}"
+                    )
+
+
+class TracingMiddleware:
+    """为每个请求开启一条 trace（见 app.core.tracing），根 span 以 "方法 路由模板" 命名"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with tracer.span(f"{scope['method']} {scope['path']}", path=scope["path"]) as root:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                root.name = f"{scope['method']} {get_route_template(scope)}"
+                root.set(status=status_code)
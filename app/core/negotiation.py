@@ -0,0 +1,150 @@
+"""
+JSON / MessagePack 内容协商
+
+机器客户端（直播叠加层渲染器、游戏服务器插件）可以用 MessagePack 代替 JSON：
+- 请求头 Accept: application/msgpack 时响应以 MessagePack 编码，JSON 仍是默认格式；
+- 请求头 Content-Type: application/msgpack 的请求体解码后按 JSON 请求体同样校验。
+
+路由器使用 APIRouter(route_class=NegotiatedRoute) 即可支持两种格式。
+直接返回数据的路由用 negotiate() 一步编码为目标格式；
+其他路由（response_model 序列化）的 JSON 响应在返回前转码。
+路由内抛出的 HTTPException 和请求校验错误由全局异常处理器输出，仍为 JSON。
+
+标记了 @cache_response 的 GET 路由在这里查询和写入响应缓存（见 app.core.cache），
+缓存键包含响应格式，命中时按 Accept-Encoding 返回预先压缩好的变体。
+
+标记了 @versioned 的路由附带 ETag / Last-Modified（见 app.core.versions），条件请求命中时直接返回 304；
+这类路由的缓存键还包含数据版本，写操作提交后缓存立即失效。
+"""
+import time
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+import msgpack
+import orjson
+
+from app.core.cache import CachedResponse, response_cache
+from app.core.compression import choose_encoding, is_compressible
+from app.core.config import settings
+from app.core.responses import MSGPACK_MEDIA_TYPE, FastJSONResponse, MsgPackResponse, packb
+from app.core.versions import data_versions, http_date, is_not_modified
+
+MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+# 缓存 / 带版本的响应按格式和压缩方式区分变体，200 和 304 使用同一个 Vary
+_VARY_ENCODED = "Accept, Accept-Encoding"
+
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def wants_msgpack(accept: str) -> bool:
+    """Accept 头中 MessagePack 的权重不低于显式的 application/json 时返回 True（通配符不参与比较）"""
+    if not accept:
+        return False
+    msgpack_q = json_q = 0.0
+    for item in accept.split(","):
+        media_type, _, params = item.partition(";")
+        media_type = media_type.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type == "application/json":
+            json_q = max(json_q, q)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def negotiate(request: Request, content, status_code: int = 200):
+    """按 Accept 头把数据编码为 MessagePack 或 JSON 响应"""
+    if wants_msgpack(request.headers.get("accept")):
+        return MsgPackResponse(content, status_code=status_code, headers={"Vary": "Accept"})
+    return FastJSONResponse(content, status_code=status_code, headers={"Vary": "Accept"})
+
+
+async def _as_json_request(request: Request) -> Request:
+    """把 MessagePack 请求体解码，伪装成已解析的 JSON 请求交给 FastAPI 校验"""
+    body = await request.body()
+    try:
+        decoded = msgpack.unpackb(body, raw=False) if body else None
+    except (ValueError, msgpack.UnpackException) as e:
+        raise HTTPException(status_code=400, detail="Invalid MessagePack body") from e
+
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (name, b"application/json" if name == b"content-type" else value)
+        for name, value in request.scope["headers"]
+    ]
+    json_request = Request(scope, request.receive)
+    json_request._body = body
+    json_request._json = decoded
+    return json_request
+
+
+def _cached_response(request: Request, entry: CachedResponse, cache_status: str, headers: dict) -> Response:
+    encoding = None
+    if len(entry.body) >= settings.COMPRESSION_MIN_SIZE and is_compressible(entry.media_type):
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    headers = {**headers, "Vary": _VARY_ENCODED, "X-Cache": cache_status}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(entry.variant(encoding), media_type=entry.media_type, headers=headers)
+
+
+class NegotiatedRoute(APIRoute):
+    """支持 MessagePack 请求体和响应、以及 GET 响应缓存的路由类"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        cache_ttl = getattr(self.endpoint, "response_cache_ttl", None)
+        version_scopes = getattr(self.endpoint, "version_scopes", None)
+
+        async def route_handler(request: Request):
+            if _media_type(request.headers.get("content-type", "")) in MSGPACK_MEDIA_TYPES:
+                request = await _as_json_request(request)
+            use_msgpack = wants_msgpack(request.headers.get("accept"))
+
+            # 版本号在执行 CRUD 之前读取：期间有写入时 ETag 偏旧，客户端下次只会多拿一次 200
+            validators, etag = {}, None
+            if version_scopes and request.method == "GET":
+                scopes = [scope.format(**request.path_params) for scope in version_scopes]
+                etag = data_versions.etag(scopes, "msgpack" if use_msgpack else "")
+                last_modified = data_versions.last_modified(scopes)
+                validators = {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": "no-cache"}
+                if is_not_modified(request.headers, etag, last_modified):
+                    return Response(status_code=304, headers={**validators, "Vary": _VARY_ENCODED})
+
+            cache_key = None
+            if cache_ttl and request.method == "GET":
+                cache_key = (request.url.path, tuple(sorted(request.query_params.multi_items())), use_msgpack, etag)
+                entry = response_cache.get(cache_key)
+                if entry is not None:
+                    return _cached_response(request, entry, "HIT", validators)
+
+            response = await handler(request)
+            if _media_type(response.headers.get("content-type", "")) == "application/json":
+                if "vary" not in response.headers:
+                    response.headers["Vary"] = "Accept"
+                if use_msgpack:
+                    response.body = packb(orjson.loads(response.body)) if response.body else b""
+                    response.headers["content-type"] = MSGPACK_MEDIA_TYPE
+                    response.headers["content-length"] = str(len(response.body))
+
+            if cache_key is not None and response.status_code == 200 and getattr(response, "body", None):
+                entry = CachedResponse(
+                    response.body, response.headers.get("content-type"), time.monotonic() + cache_ttl)
+                response_cache.set(cache_key, entry)
+                return _cached_response(request, entry, "MISS", validators)
+            if validators and response.status_code == 200:
+                response.headers.update(validators)
+                response.headers["Vary"] = _VARY_ENCODED
+            return response
+
+        return route_handler
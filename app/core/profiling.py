@@ -0,0 +1,139 @@
+"""
+按需的请求级性能剖析（cProfile）
+
+默认关闭：PROFILING_ENABLED=false 时 ProfilingMiddleware 不会被注册，请求路径上没有任何额外开销。
+开启后以下请求会被剖析，结果写入 PROFILING_DIR 下的 .prof 文件：
+- 带有效 X-API-Key 且带 `X-Profile: 1` 请求头或 `?profile=1` 查询参数的请求；
+- 按 PROFILING_SAMPLE_RATE 随机抽样的请求。
+
+剖析范围：
+- 事件循环线程：async 路由、run_sync 中的同步 CRUD（ORM 查询、分级计算等）以及响应序列化；
+- 线程池：run_read 执行的只读 CRUD（玩家统计、排行榜、比赛历史，见 run_profiled）；
+- 写线程：请求通过 write_queue 提交的写操作（见 run_profiled）。
+同步路由在线程池中执行的部分（请求校验、等待写队列）不计入；
+剖析期间同一事件循环上并发执行的其他请求会混入结果，排查时最好在低峰期触发。
+
+.prof 文件可用 `snakeviz`、`flameprof` 或 `python -m pstats` 查看，例如：
+    flameprof profiles/xxx.prof > flame.svg
+"""
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_session: ContextVar = ContextVar("profile_session", default=None)
+# 同一时刻只剖析一个请求：cProfile 按线程生效，重叠的剖析会互相覆盖
+_profiling_lock = threading.Lock()
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class ProfileSession:
+    """一次被剖析请求的所有 profiler（事件循环线程一个，写线程每个写操作一个）"""
+
+    def __init__(self):
+        self.profilers = []
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def dump(self, path: str):
+        with self._lock:
+            profilers = list(self.profilers)
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+
+
+def run_profiled(fn, *args, **kwargs):
+    """当前上下文正在剖析时，在本线程剖析 fn 的执行；否则直接调用"""
+    session = _current_session.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        session.add(profiler)
+
+
+def _profile_filename(method: str, path: str) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    slug = _UNSAFE_FILENAME_CHARS.sub("_", path.strip("/")) or "root"
+    return f"{timestamp}-{method}-{slug[:80]}.prof"
+
+
+class ProfilingMiddleware:
+    """满足触发条件的请求在 cProfile 下执行，并在响应头 X-Profile-File 中返回文件名"""
+
+    def __init__(self, app, output_dir: str = None, sample_rate: float = None):
+        self.app = app
+        self.output_dir = output_dir or settings.PROFILING_DIR
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _requested(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-api-key", b"").decode("latin-1") != settings.API_KEY:
+            return False
+        if headers.get(b"x-profile", b"") in (b"1", b"true"):
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", [""])[0] in ("1", "true")
+
+    def _should_profile(self, scope) -> bool:
+        if self._requested(scope):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            logger.info(f"Profiler busy, skipping {scope['method']} {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession()
+        token = _current_session.set(session)
+        filename = _profile_filename(scope["method"], scope["path"])
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-file", filename.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            _current_session.reset(token)
+            session.add(profiler)
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            try:
+                session.dump(os.path.join(self.output_dir, filename))
+                logger.info(f"Profiled {scope['method']} {scope['path']} ({duration_ms:.1f}ms) -> {filename}")
+            except Exception as e:
+                logger.warning(f"Failed to write profile {filename}: {e}")
+            finally:
+                _profiling_lock.release()
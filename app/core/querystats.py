@@ -0,0 +1,170 @@
+"""
+请求级 SQL 统计与 N+1 检测
+
+在 SQLAlchemy 的 before/after_cursor_execute 事件上统计语句数和 SQL 耗时，
+结果记录在当前上下文（contextvars）的 QueryStats 上：
+- HTTP 请求由 app.core.middleware.QueryStatsMiddleware 开启统计；
+- 写线程（app.core.writer）会复制调用方上下文，写操作的语句同样计入发起请求；
+- 测试或脚本中可用 track_queries() / assert_query_budget() 手动开启。
+
+同一"语句形状"（去掉字面量和参数后的 SQL）在一次请求内重复出现超过阈值时，
+视为疑似 N+1（通常是循环中的懒加载）。
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+_current_stats: ContextVar = ContextVar("query_stats", default=None)
+# track_queries() 块内完成的 HTTP 请求也要计入（TestClient 在另一个线程里运行应用，上下文不相通）
+_request_listeners = []
+_listeners_lock = threading.Lock()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|__\[POSTCOMPILE_\w+\])\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """把 SQL 归一化为语句形状：去掉字面量，合并 IN 列表和空白"""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """一次请求（或一段代码）内执行的 SQL 统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self._lock = threading.Lock()  # 写线程和请求线程可能同时记录
+
+    def record(self, statement: str, elapsed_ms: float):
+        shape = normalize_statement(statement)
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.shapes[shape] += 1
+
+    def merge(self, other: "QueryStats"):
+        with other._lock:
+            count, total_ms, shapes = other.count, other.total_ms, Counter(other.shapes)
+        with self._lock:
+            self.count += count
+            self.total_ms += total_ms
+            self.shapes.update(shapes)
+
+    def n_plus_one_suspects(self, threshold: int = None) -> dict:
+        """重复次数达到阈值的语句形状 -> 次数"""
+        threshold = threshold or settings.SQL_N_PLUS_ONE_THRESHOLD
+        with self._lock:
+            return {shape: n for shape, n in self.shapes.most_common() if n >= threshold}
+
+    def summary(self) -> dict:
+        return {
+            "queries": self.count,
+            "sql_ms": round(self.total_ms, 2),
+            "n_plus_one_suspects": self.n_plus_one_suspects(),
+        }
+
+
+def current_stats():
+    """当前上下文的 QueryStats，未开启统计时为 None"""
+    return _current_stats.get()
+
+
+def publish_request_stats(stats: QueryStats):
+    """请求结束时由中间件调用，把请求的统计汇总到正在进行的 track_queries(include_requests=True)"""
+    if not _request_listeners:
+        return
+    with _listeners_lock:
+        listeners = list(_request_listeners)
+    for listener in listeners:
+        listener.merge(stats)
+
+
+@contextmanager
+def track_queries(include_requests: bool = False):
+    """
+    在 with 块内开启 SQL 统计，返回 QueryStats
+
+    include_requests=True 时同时汇总块内完成的 HTTP 请求（经 QueryStatsMiddleware）的语句。
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    if include_requests:
+        with _listeners_lock:
+            _request_listeners.append(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        if include_requests:
+            with _listeners_lock:
+                _request_listeners.remove(stats)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: int = None):
+    """
+    断言 with 块内的 SQL 数量不超过预算，供测试和检查脚本使用
+
+    块内直接调用的 CRUD 和通过 TestClient 发出的请求都会计入。
+
+    Args:
+        max_queries: 允许的最大语句数
+        max_repeats: 同一语句形状允许的最大重复次数（用于拦截 N+1），None 表示不检查
+
+    用法：
+        with assert_query_budget(5):
+            client.get("/api/users/1/stats")
+    """
+    with track_queries(include_requests=True) as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"executed {stats.count} queries, budget is {max_queries}")
+    if max_repeats is not None:
+        for shape, n in stats.n_plus_one_suspects(max_repeats + 1).items():
+            problems.append(f"statement repeated {n} times (max {max_repeats}): {shape}")
+    if problems:
+        raise AssertionError("SQL query budget exceeded:\n  " + "\n  ".join(problems))
+
+
+# 监听注册在 Engine 类上，覆盖所有引擎（读池、写线程、异步只读池、脚本里临时创建的引擎）
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    stats.record(statement, (time.perf_counter() - start_times.pop()) * 1000)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # 出错的语句不会触发 after_cursor_execute，弹出计时避免后续语句错位
+    conn = exception_context.connection
+    if conn is not None and _current_stats.get() is not None:
+        start_times = conn.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
@@ -0,0 +1,55 @@
+"""
+快速 JSON 响应
+
+FastAPI 对声明了 response_model 的路由会用 Pydantic 直接序列化，
+但 ORM 对象要先逐个属性读取、校验，返回 dict 的路由还要经过 jsonable_encoder 递归转换一遍。
+大列表接口改为查询列元组（见各模块 crud 的 *_rows 函数），并直接返回 FastJSONResponse：
+路由返回 Response 时 FastAPI 跳过 response_model 校验和 jsonable_encoder，
+response_model 仍保留用于 OpenAPI 文档。
+
+orjson 原生支持 datetime（输出格式与 Pydantic 相同）、Enum、dict 和 list。
+
+MsgPackResponse 供机器客户端使用（见 app.core.negotiation），
+datetime 编码为与 JSON 相同的 ISO 8601 字符串，两种格式的数据完全对应。
+"""
+import datetime
+import enum
+
+import msgpack
+import orjson
+from starlette.responses import JSONResponse, Response
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+class FastJSONResponse(JSONResponse):
+    """用 orjson 编码的 JSON 响应"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def packb(content) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+class MsgPackResponse(Response):
+    """MessagePack 编码的响应"""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content) -> bytes:
+        return packb(content)
+
+
+def rows_to_dicts(result) -> list:
+    """把查询结果（Result / Row 列表）转换为 dict 列表，键为列的 label"""
+    return [dict(row._mapping) for row in result]
@@ -0,0 +1,175 @@
+"""
+慢查询日志
+
+执行时间超过 SLOW_QUERY_MS 的语句会连同绑定参数、发起的路由和 CRUD 函数一起记录：
+- 写入 "app.slow_query" 日志（WARNING）；
+- 保留在内存中（最近 SLOW_QUERY_BUFFER 条 + 按语句形状汇总），由 /api/debug/slow-queries 查看；
+- 配置了 SLOW_QUERY_LOG_FILE 时追加写入 JSON Lines 文件。
+
+SQLite 下每种语句形状第一次变慢时会在同一连接上执行 EXPLAIN QUERY PLAN 并缓存结果，
+出现 "SCAN 表名" 通常意味着缺少索引。
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.middleware import current_route
+from app.core.querystats import normalize_statement
+
+logger = logging.getLogger("app.slow_query")
+
+MAX_PARAMS_LENGTH = 500
+
+
+def _format_params(parameters, executemany: bool) -> str:
+    if executemany and parameters:
+        text = f"{parameters[0]!r} ... ({len(parameters)} rows)"
+    else:
+        text = repr(parameters)
+    return text if len(text) <= MAX_PARAMS_LENGTH else text[:MAX_PARAMS_LENGTH] + "..."
+
+
+def find_crud_function():
+    """在调用栈中找到最近的 app.modules.*.crud 函数（只在慢查询时调用）"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.modules.") and module.endswith(".crud"):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def explain_query_plan(conn, statement: str, parameters, executemany: bool):
+    """在当前连接上执行 EXPLAIN QUERY PLAN，返回计划行的 detail 列表（非 SQLite 返回 None）"""
+    if conn.dialect.name != "sqlite":
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    # 直接使用 DBAPI 游标，避免再次触发引擎事件
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    def __init__(self, buffer_size: int = None, log_file: str = None):
+        self.recent = deque(maxlen=buffer_size or settings.SLOW_QUERY_BUFFER)
+        self.shapes = {}  # 语句形状 -> 汇总（次数、耗时、查询计划、示例参数）
+        self.log_file = log_file if log_file is not None else settings.SLOW_QUERY_LOG_FILE
+        self._lock = threading.Lock()
+
+    def record(self, conn, statement: str, parameters, executemany: bool, elapsed_ms: float):
+        shape = normalize_statement(statement)
+        entry = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(elapsed_ms, 2),
+            "statement": statement,
+            "parameters": _format_params(parameters, executemany),
+            "route": current_route(),
+            "crud": find_crud_function(),
+        }
+
+        with self._lock:
+            summary = self.shapes.get(shape)
+            needs_plan = summary is None
+            if summary is None:
+                summary = self.shapes[shape] = {
+                    "shape": shape,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "plan": None,
+                    "routes": [],
+                    "crud": [],
+                }
+            summary["count"] += 1
+            summary["total_ms"] += elapsed_ms
+            summary["max_ms"] = max(summary["max_ms"], elapsed_ms)
+            summary["last_seen"] = entry["time"]
+            summary["example_parameters"] = entry["parameters"]
+            for key, value in (("routes", entry["route"]), ("crud", entry["crud"])):
+                if value and value not in summary[key]:
+                    summary[key].append(value)
+
+        if needs_plan:
+            try:
+                plan = explain_query_plan(conn, statement, parameters, executemany)
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+            with self._lock:
+                summary["plan"] = plan
+        entry["plan"] = summary["plan"]
+
+        with self._lock:
+            self.recent.append(entry)
+        logger.warning(
+            f"Slow query {elapsed_ms:.1f}ms | route={entry['route']} crud={entry['crud']} | "
+            f"{shape[:300]} | params={entry['parameters']} | plan={entry['plan']}"
+        )
+        if self.log_file:
+            self._write(entry)
+
+    def _write(self, entry: dict):
+        try:
+            with self._lock, open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write slow query log {self.log_file}: {e}")
+
+    def snapshot(self, limit: int = 50) -> dict:
+        """最近的慢查询和按总耗时排序的语句形状汇总"""
+        with self._lock:
+            recent = list(self.recent)[-limit:][::-1]
+            shapes = sorted(
+                ({**s, "total_ms": round(s["total_ms"], 2), "max_ms": round(s["max_ms"], 2)} for s in self.shapes.values()),
+                key=lambda s: s["total_ms"],
+                reverse=True,
+            )
+        return {"threshold_ms": settings.SLOW_QUERY_MS, "recent": recent, "shapes": shapes[:limit]}
+
+    def clear(self):
+        with self._lock:
+            self.recent.clear()
+            self.shapes.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _check_slow(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("slow_query_start")
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+    if settings.SLOW_QUERY_MS and elapsed_ms >= settings.SLOW_QUERY_MS:
+        try:
+            slow_query_log.record(conn, statement, parameters, executemany, elapsed_ms)
+        except Exception as e:
+            logger.error(f"Failed to record slow query: {e}")
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    conn = exception_context.connection
+    if conn is not None:
+        start_times = conn.info.get("slow_query_start")
+        if start_times:
+            start_times.pop()
@@ -0,0 +1,230 @@
+"""
+轻量级链路追踪
+
+每个 HTTP 请求（TracingMiddleware）或没有父 span 的调用会开启一条 trace，
+CRUD / 标准分计算入口通过 @traced 和 span() 记录嵌套的 span。
+span 的父子关系保存在 contextvars 中；写线程会复制调用方上下文，写操作的 span 会挂在发起请求下面。
+
+trace 结束（根 span 结束）后交给导出器：
+- RingBufferExporter：内存中保留最近的 trace，供 /api/debug/traces 查看；
+- JsonLinesExporter：把超过阈值的 trace 追加写入 JSON Lines 文件。
+实现 export(trace: dict) 方法即可接入其他导出器（tracer.add_exporter）。
+
+TRACING_ENABLED=false 时 @traced 直接返回原函数，span() 不做任何记录。
+"""
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 单条 trace 最多记录的 span 数，避免循环中的 span 占用过多内存
+MAX_SPANS_PER_TRACE = 1000
+
+_current_span: ContextVar = ContextVar("trace_span", default=None)
+# detached() 块内新开的 trace 关联到的上级 trace
+_linked_trace_id: ContextVar = ContextVar("linked_trace_id", default=None)
+
+
+class Trace:
+    def __init__(self, name: str, parent_trace_id: str = None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.parent_trace_id = parent_trace_id  # 请求结束后才执行的异步写操作指向发起请求的 trace
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.finished = False
+        self._lock = threading.Lock()  # 写线程和请求线程会同时添加 span
+
+    def add(self, span: "Span"):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def to_dict(self, root: "Span") -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "trace_id": self.trace_id,
+            "parent_trace_id": self.parent_trace_id,
+            "name": root.name,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": root.duration_ms,
+            "error": root.error,
+            "dropped_spans": self.dropped_spans,
+            "spans": [s.to_dict(self.start) for s in spans],
+        }
+
+
+class Span:
+    def __init__(self, trace: Trace, name: str, parent: "Span" = None, attributes: dict = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attributes = attributes or {}
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 3)
+
+    def to_dict(self, trace_start: float) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start - trace_start) * 1000, 3),
+            "duration_ms": self.duration_ms,
+            "thread": self.thread,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class RingBufferExporter:
+    """在内存中保留最近的 trace"""
+
+    def __init__(self, size: int):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def export(self, trace: dict):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, limit: int = 20, min_duration_ms: float = 0) -> list:
+        """最近的 trace（新的在前），只返回耗时不低于 min_duration_ms 的"""
+        with self._lock:
+            traces = list(self._traces)
+        slow = [t for t in reversed(traces) if (t["duration_ms"] or 0) >= min_duration_ms]
+        return slow[:limit]
+
+
+class JsonLinesExporter:
+    """把耗时不低于 min_duration_ms 的 trace 追加写入 JSON Lines 文件"""
+
+    def __init__(self, path: str, min_duration_ms: float = 0):
+        self.path = path
+        self.min_duration_ms = min_duration_ms
+        self._lock = threading.Lock()
+
+    def export(self, trace: dict):
+        if (trace["duration_ms"] or 0) < self.min_duration_ms:
+            return
+        line = json.dumps(trace, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.exporters = []
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        return exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """记录一个 span；当前没有活动 trace（或所属 trace 已结束）时开启新的 trace"""
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        if parent is not None and not parent.trace.finished:
+            current = Span(parent.trace, name, parent, attributes)
+        else:
+            linked_trace_id = parent.trace.trace_id if parent is not None else _linked_trace_id.get()
+            current = Span(Trace(name, linked_trace_id), name, None, attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            current.finish()
+            current.trace.add(current)
+            if current.parent_id is None:
+                current.trace.finished = True
+                self._export(current.trace.to_dict(current))
+
+    def _export(self, trace: dict):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.warning(f"Trace exporter {type(exporter).__name__} failed: {e}")
+
+
+tracer = Tracer(enabled=settings.TRACING_ENABLED)
+recent_traces = tracer.add_exporter(RingBufferExporter(settings.TRACE_BUFFER_SIZE))
+if settings.TRACE_LOG_FILE:
+    tracer.add_exporter(JsonLinesExporter(settings.TRACE_LOG_FILE, settings.TRACE_SLOW_MS))
+
+
+def span(name: str, **attributes):
+    """在当前 trace 下记录一个子 span：with span("insert_score", user_id=1): ..."""
+    return tracer.span(name, **attributes)
+
+
+@contextmanager
+def detached():
+    """
+    块内提交的后台任务（如 write_queue.submit）开启独立的 trace，不挂在当前请求下
+
+    请求可能先于后台任务结束，挂在请求 trace 下的 span 会在导出后才完成而丢失。
+    新 trace 的 parent_trace_id 指向当前 trace。
+    """
+    parent = _current_span.get()
+    link_token = _linked_trace_id.set(parent.trace.trace_id if parent is not None else _linked_trace_id.get())
+    span_token = _current_span.set(None)
+    try:
+        yield
+    finally:
+        _current_span.reset(span_token)
+        _linked_trace_id.reset(link_token)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def traced(name: str = None):
+    """
+    装饰器：把函数调用记录为一个 span
+
+    默认名称为去掉 app.modules. 前缀的模块名加函数名，例如 matches.crud.create_match_score。
+    """
+    def decorator(fn):
+        if not tracer.enabled:
+            return fn
+        span_name = name or f"{fn.__module__.removeprefix('app.modules.')}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
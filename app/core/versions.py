@@ -0,0 +1,261 @@
+"""
+数据版本计数器（ETag / Last-Modified）
+
+每个数据范围（scope）有一个递增的版本号和最后修改时间，写操作提交后递增：
+- match:{id}        比赛及其队伍、队员、赛程、阵容、分数、队伍积分
+- match_game:{id}   单个赛程及其阵容、分数、标准分
+- user:{id}         单个玩家及其分数、队伍关系
+- leaderboard       排行榜（任何玩家统计或分数变化）
+- users / matches / games   对应的列表接口
+- teams             任意比赛队伍的名称、颜色等（玩家统计中按队员展示队伍信息）
+
+ORM 会话 flush 的对象由 after_flush 事件自动归入对应 scope，提交成功后统一递增；
+直接执行 SQL 的写操作需要调用 mark_changed() / mark_match_game_changed() 标记。
+
+路由用 @versioned("match:{match_id}") 声明依赖的 scope（按路径参数填充），
+NegotiatedRoute 据此生成 ETag / Last-Modified，If-None-Match / If-Modified-Since 命中时
+直接返回 304，不打开数据库会话也不执行 CRUD。
+
+计数器保存在进程内（写操作都经过本进程的单写线程），进程重启后 ETag 的前缀随之变化，
+旧 ETag 全部失效。绕过服务直接写库（如 import_data.py）后需要重启服务。
+"""
+import threading
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import chain
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import PASSIVE_NO_INITIALIZE, instance_state
+
+
+def versioned(*scopes: str):
+    """声明路由响应依赖的数据范围，scope 中的 {参数} 用路径参数填充"""
+    def decorator(fn):
+        fn.version_scopes = scopes
+        return fn
+    return decorator
+
+
+class DataVersions:
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self._versions = {}
+        self._modified = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *scopes: str):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+                self._modified[scope] = now
+
+    def version(self, scope: str) -> int:
+        return self._versions.get(scope, 0)
+
+    def etag(self, scopes, variant: str = "") -> str:
+        """弱 ETag：进程前缀 + 各 scope 版本号（+ 表示格式的后缀）"""
+        with self._lock:
+            versions = ".".join(str(self._versions.get(scope, 0)) for scope in scopes)
+        suffix = f"-{variant}" if variant else ""
+        return f'W/"{self.epoch}.{versions}{suffix}"'
+
+    def last_modified(self, scopes) -> datetime:
+        """各 scope 中最晚的修改时间；进程启动后没有修改过的 scope 按启动时间计"""
+        with self._lock:
+            return max((self._modified.get(scope, self.started_at) for scope in scopes), default=self.started_at)
+
+
+data_versions = DataVersions()
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value, usegmt=True)
+
+
+def is_not_modified(request_headers, etag: str, last_modified: datetime) -> bool:
+    """按 If-None-Match（优先，弱比较）或 If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        current = etag.removeprefix("W/")
+        return any(
+            tag.strip() == "*" or tag.strip().removeprefix("W/") == current
+            for tag in if_none_match.split(",")
+        )
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+# ---------- 写操作标记 ----------
+
+_CHANGED_KEY = "changed_scopes"
+# 赛程 / 队伍所属的比赛不会改变，缓存查询结果。
+# SQLite 会复用删除后的ID：删除的赛程 / 队伍提交后移出缓存，不存在的ID不缓存
+_match_of_game = {}
+_match_of_team = {}
+_MATCH_CACHES = {"match_games": _match_of_game, "match_teams": _match_of_team}
+_PRIMED_KEY = "primed_match_cache"
+_EVICT_KEY = "evicted_match_cache"
+_MODIFIED_KEY = "modified_objects"
+
+
+def mark_changed(db: Session, *scopes: str):
+    """标记当前事务修改了哪些 scope，提交成功后递增版本"""
+    db.info.setdefault(_CHANGED_KEY, set()).update(scopes)
+
+
+def _lookup_match(db: Session, cache: dict, table: str, row_id):
+    if row_id is None:
+        return None
+    match_id = cache.get(row_id)
+    if match_id is None:
+        match_id = db.connection().execute(
+            text(f"SELECT match_id FROM {table} WHERE id = :id"), {"id": row_id}
+        ).scalar()
+        if match_id is not None:
+            cache[row_id] = match_id
+    return match_id
+
+
+def match_of_game(db: Session, match_game_id):
+    """赛程所属的比赛ID（进程内缓存）"""
+    return _lookup_match(db, _match_of_game, "match_games", match_game_id)
+
+
+def match_of_team(db: Session, match_team_id):
+    """队伍所属的比赛ID（进程内缓存）"""
+    return _lookup_match(db, _match_of_team, "match_teams", match_team_id)
+
+
+def _prime_new_parents(db: Session):
+    """
+    本次 flush 新建的队伍 / 赛程直接写入缓存（覆盖复用ID留下的旧值），
+    同一事务里随后加入的队员、阵容不必再查所属比赛。事务回滚时恢复写入前的值。
+    """
+    for obj in db.new:
+        cache = _MATCH_CACHES.get(getattr(obj, "__tablename__", None))
+        if cache is not None:
+            db.info.setdefault(_PRIMED_KEY, []).append((cache, obj.id, cache.get(obj.id)))
+            cache[obj.id] = obj.match_id
+
+
+def _track_deleted_parents(db: Session):
+    """
+    本次 flush 删除的赛程 / 队伍：先按对象上的 match_id 写入缓存（同一 flush 中级联删除的阵容、分数、
+    队员还要查所属比赛，而行已经删除），事务结束后移出缓存，ID 被复用时重新查询
+    """
+    for obj in db.deleted:
+        cache = _MATCH_CACHES.get(getattr(obj, "__tablename__", None))
+        if cache is not None and obj.match_id is not None:
+            cache[obj.id] = obj.match_id
+            db.info.setdefault(_EVICT_KEY, []).append((cache, obj.id))
+
+
+def _evict_deleted_parents(db: Session):
+    for cache, row_id in db.info.pop(_EVICT_KEY, ()):
+        cache.pop(row_id, None)
+
+
+def mark_match_game_changed(db: Session, match_game_id: int):
+    """标记赛程（及所属比赛）的数据发生了变化"""
+    scopes = [f"match_game:{match_game_id}"]
+    match_id = match_of_game(db, match_game_id)
+    if match_id is not None:
+        scopes.append(f"match:{match_id}")
+    mark_changed(db, *scopes)
+
+
+def _has_column_changes(obj) -> bool:
+    state = instance_state(obj)
+    for key in state.committed_state:
+        impl = state.manager[key].impl
+        if not impl.collection and impl.get_history(state, state.dict, PASSIVE_NO_INITIALIZE).has_changes():
+            return True
+    return False
+
+
+def modified_objects(session: Session, flush_context) -> list:
+    """
+    本次 flush 中列值真正改变的 dirty 对象，与 session.is_modified(obj, include_collections=False) 一致
+
+    dirty 中包含只被赋了相同值的对象（如重算统计）。只检查被赋过值的属性（committed_state），
+    不必像 is_modified 那样遍历全部属性；结果缓存在 flush_context 上，
+    数据版本和变更日志的 after_flush 共用一次计算。
+    """
+    modified = flush_context.attributes.get(_MODIFIED_KEY)
+    if modified is None:
+        modified = flush_context.attributes[_MODIFIED_KEY] = [
+            obj for obj in session.dirty if _has_column_changes(obj)
+        ]
+    return modified
+
+
+def _match_scope(match_id) -> list:
+    return [f"match:{match_id}"] if match_id is not None else []
+
+
+def _scopes_for(db: Session, obj) -> list:
+    table = getattr(obj, "__tablename__", None)
+    if table == "scores":
+        match_id = match_of_game(db, obj.match_game_id)
+        return [f"match_game:{obj.match_game_id}", *_match_scope(match_id), f"user:{obj.user_id}", "leaderboard"]
+    if table == "game_lineups":
+        match_id = match_of_game(db, obj.match_game_id)
+        return [f"match_game:{obj.match_game_id}", *_match_scope(match_id), f"user:{obj.user_id}"]
+    if table == "match_team_memberships":
+        match_id = match_of_team(db, obj.match_team_id)
+        return [*_match_scope(match_id), f"user:{obj.user_id}"]
+    if table == "match_teams":
+        return [f"match:{obj.match_id}", "teams"]
+    if table == "match_games":
+        return [f"match_game:{obj.id}", f"match:{obj.match_id}"]
+    if table == "matches":
+        return [f"match:{obj.id}", "matches"]
+    if table == "users":
+        return [f"user:{obj.id}", "users", "leaderboard"]
+    if table == "games":
+        return ["games", "leaderboard"]
+    return []
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_scopes(session, flush_context):
+    # 在变更日志的 after_flush 之前注册（app.modules.changes 导入本模块），新建和删除的赛程 / 队伍先写入缓存
+    _prime_new_parents(session)
+    _track_deleted_parents(session)
+    scopes = set()
+    for obj in chain(session.new, modified_objects(session, flush_context), session.deleted):
+        scopes.update(_scopes_for(session, obj))
+    if scopes:
+        mark_changed(session, *scopes)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_scopes(session):
+    session.info.pop(_PRIMED_KEY, None)
+    _evict_deleted_parents(session)
+    scopes = session.info.pop(_CHANGED_KEY, None)
+    if scopes:
+        data_versions.bump(*scopes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_scopes(session):
+    session.info.pop(_CHANGED_KEY, None)
+    for cache, row_id, previous in reversed(session.info.pop(_PRIMED_KEY, ())):
+        if previous is None:
+            cache.pop(row_id, None)
+        else:
+            cache[row_id] = previous
+    _evict_deleted_parents(session)
@@ -0,0 +1,134 @@
+"""
+单写线程队列
+
+SQLite 同一时刻只允许一个写事务。所有会修改数据的 CRUD 操作都通过这里排队，
+由唯一的写线程按提交顺序依次执行，避免多个线程争抢写锁导致 "database is locked"。
+读请求继续使用 app.core.db.engine 的连接池，不受影响。
+
+写操作的会话在 info[WRITE_JOB_KEY] 上有标记，会话事件可以据此把按提交重复的工作
+（如写变更日志）推迟到写操作结束时，由 add_finish_hook 注册的函数统一完成。
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.core.db import WriterSessionLocal
+from app.core.metrics import db_write_duration_seconds
+from app.core.profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+# 写操作会话的 info 标记
+WRITE_JOB_KEY = "write_job"
+
+
+class WriteQueue:
+    """把写操作串行化到一个专用线程上执行"""
+
+    def __init__(self, session_factory=WriterSessionLocal):
+        self._session_factory = session_factory
+        # 单线程执行器本身就是一个有序（FIFO）队列
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {}  # 操作名 -> {"count", "errors", "total_ms", "max_ms", "last_ms"}
+        self._finish_hooks = []
+
+    def add_finish_hook(self, hook):
+        """注册写操作结束时（关闭会话之前）调用的 hook(db)，写操作成功或失败都会调用"""
+        self._finish_hooks.append(hook)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        将写操作加入队列，立即返回 Future
+
+        fn 的第一个参数会收到写线程专用的数据库会话，其余参数原样传入。
+        """
+        with self._lock:
+            self._pending += 1
+        # 保留调用方的上下文（请求级统计等依赖 contextvars）
+        ctx = contextvars.copy_context()
+        return self._executor.submit(ctx.run, self._execute, fn, time.perf_counter(), args, kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        """将写操作加入队列并等待其完成，返回 fn 的返回值（异常会原样抛出）"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _execute(self, fn, enqueued_at, args, kwargs):
+        started_at = time.perf_counter()
+        db = self._session_factory()
+        db.info[WRITE_JOB_KEY] = True
+        failed = False
+        try:
+            # 发起请求正在被剖析时，写操作也计入同一份 profile
+            return run_profiled(fn, db, *args, **kwargs)
+        except Exception:
+            failed = True
+            db.rollback()
+            raise
+        finally:
+            self._run_finish_hooks(db)
+            db.close()
+            finished_at = time.perf_counter()
+            self._record(
+                getattr(fn, "__qualname__", repr(fn)),
+                wait_ms=(started_at - enqueued_at) * 1000,
+                run_ms=(finished_at - started_at) * 1000,
+                failed=failed,
+            )
+
+    def _run_finish_hooks(self, db):
+        # 写操作本身已经提交，hook 出错只记录日志，不影响写操作的结果
+        for hook in self._finish_hooks:
+            try:
+                hook(db)
+            except Exception:
+                db.rollback()
+                logger.exception(f"Write finish hook {getattr(hook, '__qualname__', hook)} failed")
+
+    def _record(self, name: str, wait_ms: float, run_ms: float, failed: bool):
+        with self._lock:
+            self._pending -= 1
+            stat = self._stats.setdefault(name, {
+                "count": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_ms": 0.0,
+                "total_wait_ms": 0.0,
+            })
+            stat["count"] += 1
+            stat["errors"] += int(failed)
+            stat["total_ms"] += run_ms
+            stat["max_ms"] = max(stat["max_ms"], run_ms)
+            stat["last_ms"] = run_ms
+            stat["total_wait_ms"] += wait_ms
+        db_write_duration_seconds.observe(name, value=run_ms / 1000)
+        if run_ms > 1000:
+            logger.warning(f"Slow write operation {name}: {run_ms:.1f}ms (waited {wait_ms:.1f}ms in queue)")
+
+    @property
+    def depth(self) -> int:
+        """当前排队中（含正在执行）的写操作数量"""
+        return self._pending
+
+    def stats(self) -> dict:
+        """队列深度和每种写操作的耗时统计"""
+        with self._lock:
+            operations = {
+                name: {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2),
+                    "last_ms": round(s["last_ms"], 2),
+                    "avg_wait_ms": round(s["total_wait_ms"] / s["count"], 2) if s["count"] else 0.0,
+                }
+                for name, s in self._stats.items()
+            }
+            return {"queue_depth": self._pending, "operations": operations}
+
+
+write_queue = WriteQueue()
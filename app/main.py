@@ -1,11 +1,19 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 import os
 from pathlib import Path
 
-from app.core.middleware import DatabaseConnectionMiddleware
+from app.core import metrics
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings
+from app.core.middleware import MetricsMiddleware, QueryStatsMiddleware, TracingMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.security import get_api_key
+from app.core.slowlog import slow_query_log
+from app.core.tracing import recent_traces
+from app.core.writer import write_queue
 
 app = FastAPI(
     title="Competition Server API",
@@ -13,8 +21,21 @@ app = FastAPI(
     version="2.0.0",  # 升级版本号表示新的队伍系统
 )
 
-# 添加数据库连接池监控中间件
-app.add_middleware(DatabaseConnectionMiddleware)
+# 响应压缩（gzip / brotli，小于 COMPRESSION_MIN_SIZE 的响应不压缩）
+app.add_middleware(CompressionMiddleware)
+
+# 按需剖析请求（PROFILING_ENABLED 开启时才注册，关闭时零开销）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# 添加请求级 SQL 统计中间件（N+1 检测；DEBUG 模式下附带 X-SQL-* 响应头）
+app.add_middleware(QueryStatsMiddleware)
+
+# 添加链路追踪中间件（/api/debug/traces 查看）
+app.add_middleware(TracingMiddleware)
+
+# 添加请求指标采集中间件（/api/metrics 输出）
+app.add_middleware(MetricsMiddleware)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -45,14 +66,41 @@ if FRONTEND_BUILD_DIR.exists():
 def read_root():
     return {"message": "Welcome to the Competition Server API v2.0 - New Team Management System"}
 
+@app.get("/api/metrics", include_in_schema=False)
+def read_metrics():
+    """Prometheus 文本格式的指标：路由耗时、状态码、处理中请求数、连接池和写队列"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/health/writer")
+def read_writer_stats():
+    """写队列深度和各写操作耗时"""
+    return write_queue.stats()
+
+@app.get("/api/debug/slow-queries", dependencies=[Depends(get_api_key)])
+def read_slow_queries(limit: int = 50):
+    """最近的慢查询（含绑定参数、路由、CRUD 函数）和按语句形状汇总的查询计划"""
+    return slow_query_log.snapshot(limit)
+
+@app.get("/api/debug/traces", dependencies=[Depends(get_api_key)])
+def read_recent_traces(limit: int = 20, min_ms: float = None):
+    """最近的慢 trace（含嵌套 span），min_ms 默认为 TRACE_SLOW_MS"""
+    min_ms = settings.TRACE_SLOW_MS if min_ms is None else min_ms
+    return recent_traces.recent(limit, min_ms)
+
 # Here we will include the routers from our modules
 from app.modules.users.router import router as users_router
 from app.modules.games.router import router as games_router
 from app.modules.matches.router import router as matches_router
+from app.modules.exports.router import router as exports_router
+from app.modules.changes.router import router as changes_router
+from app.modules.batch.router import router as batch_router
 
 app.include_router(users_router, prefix="/api/users", tags=["users"])
 app.include_router(games_router, prefix="/api/games", tags=["games"])
 app.include_router(matches_router, prefix="/api/matches", tags=["matches"])
+app.include_router(exports_router, prefix="/api/exports", tags=["exports"])
+app.include_router(changes_router, prefix="/api/changes", tags=["changes"])
+app.include_router(batch_router, prefix="/api/batch", tags=["batch"])
 
 # 注意：teams 模块已被整合到 matches 模块中
 # 新的队伍管理API现在在 /matches/{match_id}/teams 下
\ No newline at end of file
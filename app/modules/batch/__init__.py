@@ -0,0 +1 @@
+# 这个文件使得 Python 将 batch 目录识别为一个模块。
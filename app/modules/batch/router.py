@@ -0,0 +1,104 @@
+"""
+批量请求：一次 HTTP 请求在进程内依次执行多个 GET 接口
+
+子请求直接交给应用路由处理（不经过中间件），共享同一个只读会话（同一个数据快照），
+响应缓存、ETag / 304 与单独请求时的行为相同。
+"""
+import logging
+from urllib.parse import unquote, urlsplit
+
+import orjson
+from fastapi import APIRouter, Request
+from starlette.exceptions import HTTPException
+
+from app.core.deps import shared_read_session
+from app.core.negotiation import NegotiatedRoute, negotiate
+from . import schemas
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(route_class=NegotiatedRoute)
+
+# 不能在批量请求中执行的路径（递归调用、流式导出）
+EXCLUDED_PREFIXES = ("/api/batch", "/api/exports")
+# 不转发给子请求的请求头：子请求总是返回未压缩的 JSON，条件请求头按每项的 etag 设置
+_DROPPED_HEADERS = {
+    b"content-length", b"content-type", b"transfer-encoding", b"accept", b"accept-encoding",
+    b"if-none-match", b"if-modified-since",
+}
+# 子请求从父请求继承的 scope 键
+_INHERITED_SCOPE_KEYS = (
+    "asgi", "http_version", "scheme", "server", "client", "root_path", "app", "state",
+    "extensions", "starlette.exception_handlers", "fastapi_middleware_astack",
+)
+# 随每项结果返回的响应头
+_RETURNED_HEADERS = ("etag", "last-modified", "x-cache", "location")
+
+
+def _result(item: schemas.BatchItem, status: int, headers: dict, body) -> dict:
+    return {"path": item.path, "status": status, "headers": headers, "body": body}
+
+
+async def _dispatch(request: Request, item: schemas.BatchItem) -> dict:
+    """在进程内执行一个 GET 子请求，返回状态码、部分响应头和解码后的 body"""
+    url = urlsplit(item.path)
+    path = unquote(url.path)
+    if not path.startswith("/api/") or path.startswith(EXCLUDED_PREFIXES):
+        return _result(item, 400, {}, {"detail": "该路径不能在批量请求中执行"})
+
+    headers = [(name, value) for name, value in request.scope["headers"] if name not in _DROPPED_HEADERS]
+    headers.append((b"accept", b"application/json"))
+    if item.etag:
+        headers.append((b"if-none-match", item.etag.encode("latin-1")))
+    # 只继承连接信息，路由匹配留下的状态（route、path_params 等）由子请求重新生成
+    scope = {key: request.scope[key] for key in _INHERITED_SCOPE_KEYS if key in request.scope}
+    scope.update(type="http", 
+        method="GET", path=path, raw_path=url.path.encode(),
+        query_string=url.query.encode(), headers=headers,
+    )
+
+    start, chunks = {}, []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app.router(scope, receive, send)
+    except HTTPException as exc:
+        # 路由表之外抛出的 HTTPException（如未知路径的 404）不经过异常中间件，按其状态码返回
+        return _result(item, exc.status_code, dict(exc.headers or {}), {"detail": exc.detail})
+    except Exception:
+        logger.exception("批量请求中的子请求失败: %s", item.path)
+        return _result(item, 500, {}, {"detail": "Internal Server Error"})
+
+    response_headers = {
+        name.decode("latin-1").lower(): value.decode("latin-1") for name, value in start.get("headers", [])
+    }
+    body = b"".join(chunks)
+    if not body:
+        content = None
+    elif response_headers.get("content-type", "").startswith("application/json"):
+        content = orjson.loads(body)
+    else:
+        content = body.decode("utf-8", errors="replace")
+    returned = {name: response_headers[name] for name in _RETURNED_HEADERS if name in response_headers}
+    return _result(item, start.get("status", 500), returned, content)
+
+
+@router.post("/")
+async def run_batch(request: Request, batch: schemas.BatchRequest):
+    """
+    批量执行站内 GET 请求，按请求顺序返回每项的 status、headers（ETag 等）和 body
+
+    每项可带上次返回的 etag，数据未变化时该项为 304、body 为 null。
+    单项失败不影响其他项；最多 BATCH_MAX_REQUESTS 项。
+    """
+    async with shared_read_session():
+        responses = [await _dispatch(request, item) for item in batch.requests]
+    return negotiate(request, {"responses": responses})
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+from app.core.config import settings
+
+class BatchItem(BaseModel):
+    path: str = Field(..., description="站内 GET 路径，可带查询参数，例如 /api/users/1/stats?game_code=bingo")
+    etag: Optional[str] = Field(None, description="该路径上次返回的 ETag，数据未变化时该项返回 304 且不带 body")
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_REQUESTS)
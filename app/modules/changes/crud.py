@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+变更日志与增量同步
+
+记录：
+- ORM 会话 flush 的对象由 after_flush 事件自动记录（只记录列值真正改变的更新）；
+- 直接执行 SQL 的写操作（队伍积分、标准分、清空阵容、批量重算）调用 record_changes() 记录。
+同一实体的多次变更合并为一行，回滚的事务中的变更直接丢弃。
+- 写队列（app.core.writer）中的写操作常常提交多次（如录分后依次重算标准分、统计、等级），
+  各次提交的变更在写操作结束时用一条 executemany 写入，每个写操作只写一次变更日志；
+- 其他会话（脚本、基准测试）在每次提交前与业务数据写在同一事务中。
+写操作都经过单写线程，变更序号的写入顺序与大小顺序一致，客户端按游标读取不会漏行；
+业务数据提交后、变更日志写入前读取的客户端会在下一次同步时读到这些变更。
+
+读取：get_changes() 返回游标之后的变更，同一实体合并为 inserted / updated / deleted 之一，
+插入和更新返回实体当前的完整行（表的全部列），删除只返回ID。
+"""
+import re
+from itertools import chain
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.db import Base
+from app.core.responses import rows_to_dicts
+from app.core.versions import match_of_game, match_of_team, modified_objects
+from app.core.writer import WRITE_JOB_KEY, write_queue
+from app.modules.matches.models import MatchTeam, MatchTeamMembership
+from . import models
+
+# 记录变更的实体（表名）
+TRACKED_ENTITIES = (
+    "matches", "match_teams", "match_team_memberships", "match_games",
+    "game_lineups", "scores", "users",
+)
+
+_PENDING_KEY = "pending_changes"
+# 写操作中已提交、等待写操作结束时写入的变更
+_COMMITTED_KEY = "committed_changes"
+_SCOPE_PATTERN = re.compile(r"^(match|user):(\d+)$")
+
+
+def _merge_op(previous: str, op: str) -> str:
+    """同一事务内的多次变更合并：删除优先，先插入后更新仍是插入"""
+    if op == "delete":
+        return "delete"
+    if previous == "insert":
+        return "insert"
+    if previous == "delete":
+        return "update"
+    return op
+
+
+def record_changes(db: Session, entity: str, rows: Iterable[Tuple[int, Optional[int], Optional[int]]], op: str = "update"):
+    """
+    记录当前事务对实体的变更，提交时写入变更日志
+
+    Args:
+        db: 数据库会话
+        entity: 实体类型（表名）
+        rows: (实体ID, 所属比赛ID, 所属玩家ID)
+        op: insert / update / delete
+    """
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    for entity_id, match_id, user_id in rows:
+        _merge_change(pending, (entity, entity_id), (op, match_id, user_id))
+
+
+def _merge_change(changes: dict, key: tuple, change: tuple):
+    previous = changes.get(key)
+    if previous:
+        op, match_id, user_id = change
+        op_, match_id_, user_id_ = previous
+        changes[key] = (
+            _merge_op(op_, op),
+            match_id if match_id is not None else match_id_,
+            user_id if user_id is not None else user_id_,
+        )
+    else:
+        changes[key] = change
+
+
+def _row_for(db: Session, entity: str, obj) -> tuple:
+    """ORM 对象对应的 (实体ID, 所属比赛ID, 所属玩家ID)"""
+    if entity in ("scores", "game_lineups"):
+        return obj.id, match_of_game(db, obj.match_game_id), obj.user_id
+    if entity == "match_team_memberships":
+        return obj.id, match_of_team(db, obj.match_team_id), obj.user_id
+    if entity in ("match_teams", "match_games"):
+        return obj.id, obj.match_id, None
+    if entity == "matches":
+        return obj.id, obj.id, None
+    return obj.id, None, obj.id  # users
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_orm_changes(session, flush_context):
+    updated = modified_objects(session, flush_context)
+    for op, objects in (("insert", session.new), ("update", updated), ("delete", session.deleted)):
+        for obj in objects:
+            entity = getattr(obj, "__tablename__", None)
+            if entity not in TRACKED_ENTITIES:
+                continue
+            record_changes(session, entity, [_row_for(session, entity, obj)], op)
+
+
+def _insert_change_log(session, changes: dict):
+    session.connection().execute(insert(models.ChangeLog), [
+        {"entity": entity, "entity_id": entity_id, "op": op, "match_id": match_id, "user_id": user_id}
+        for (entity, entity_id), (op, match_id, user_id) in changes.items()
+    ])
+
+
+@event.listens_for(Session, "before_commit")
+def _write_change_log(session):
+    if session.info.get(WRITE_JOB_KEY):
+        return  # 写操作结束时统一写入（write_deferred_change_log）
+    # 先 flush，让本次提交的 ORM 变更也进入待写列表
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _insert_change_log(session, pending)
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_committed_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        committed = session.info.setdefault(_COMMITTED_KEY, {})
+        for key, change in pending.items():
+            _merge_change(committed, key, change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def write_deferred_change_log(db: Session):
+    """写操作结束时把各次提交的变更用一条 executemany 写入变更日志（写队列的 finish hook）"""
+    committed = db.info.pop(_COMMITTED_KEY, None)
+    if committed:
+        _insert_change_log(db, committed)
+        db.commit()
+
+
+write_queue.add_finish_hook(write_deferred_change_log)
+
+
+# ---------- 增量同步 ----------
+
+def parse_scope(scope: Optional[str]) -> Optional[tuple]:
+    """解析 match:{id} / user:{id}，格式不对时抛出 ValueError"""
+    if not scope:
+        return None
+    matched = _SCOPE_PATTERN.match(scope)
+    if not matched:
+        raise ValueError("scope 格式应为 match:{id} 或 user:{id}")
+    return matched.group(1), int(matched.group(2))
+
+
+def _current_rows(db: Session, entity: str, ids: list) -> dict:
+    """按ID批量读取实体当前的完整行"""
+    table = Base.metadata.tables[entity]
+    rows = {}
+    for start in range(0, len(ids), 500):
+        stmt = select(table).where(table.c.id.in_(ids[start:start + 500]))
+        rows.update((row["id"], row) for row in rows_to_dicts(db.execute(stmt)))
+    return rows
+
+
+def get_changes(db: Session, since: int, scope: Optional[tuple] = None, limit: int = 1000) -> dict:
+    """
+    游标之后的变更
+
+    Args:
+        db: 数据库会话
+        since: 上次同步返回的游标（首次同步传 0）
+        scope: parse_scope 的结果；比赛范围包含该比赛的队伍、队员、赛程、阵容、分数，
+               以及参赛玩家自身的变化（统计、等级）
+        limit: 最多读取的变更日志行数
+
+    Returns:
+        dict: cursor（下次同步使用）、has_more（是否还有未读取的变更）、
+              changes（实体类型 -> inserted / updated / deleted）
+    """
+    log = models.ChangeLog
+    base = select(log.id, log.entity, log.entity_id, log.op).where(log.id > since)
+    if scope is None:
+        stmts = [base]
+    elif scope[0] == "match":
+        members = (
+            select(MatchTeamMembership.user_id)
+            .join(MatchTeam, MatchTeam.id == MatchTeamMembership.match_team_id)
+            .where(MatchTeam.match_id == scope[1])
+        )
+        stmts = [
+            base.where(log.match_id == scope[1]),
+            base.where(log.entity == "users", log.user_id.in_(members)),
+        ]
+    else:
+        stmts = [base.where(log.user_id == scope[1])]
+
+    # 各范围分别走 (match_id, id) / (user_id, id) 索引，再按序号合并
+    entries = sorted(
+        chain.from_iterable(db.execute(stmt.order_by(log.id).limit(limit + 1)) for stmt in stmts),
+        key=lambda row: row.id,
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    first_op, last_op = {}, {}
+    for row in entries:
+        key = (row.entity, row.entity_id)
+        first_op.setdefault(key, row.op)
+        last_op[key] = row.op
+
+    changes = {}
+    alive = {}
+    for (entity, entity_id), op in last_op.items():
+        section = changes.setdefault(entity, {"inserted": [], "updated": [], "deleted": []})
+        if op == "delete":
+            section["deleted"].append(entity_id)
+        else:
+            alive.setdefault(entity, []).append(entity_id)
+
+    for entity, ids in alive.items():
+        current = _current_rows(db, entity, ids)
+        section = changes[entity]
+        for entity_id in ids:
+            row = current.get(entity_id)
+            if row is None:
+                # 在本页之后被删除
+                section["deleted"].append(entity_id)
+            elif first_op[(entity, entity_id)] == "insert":
+                section["inserted"].append(row)
+            else:
+                section["updated"].append(row)
+
+    for section in changes.values():
+        section["inserted"].sort(key=lambda row: row["id"])
+        section["updated"].sort(key=lambda row: row["id"])
+        section["deleted"].sort()
+
+    return {
+        "cursor": entries[-1].id if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
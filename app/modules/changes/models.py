@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import Column, Integer, String, DateTime, Index
+import datetime
+
+from app.core.db import Base
+
+
+# 变更日志：每行记录一个实体的一次插入 / 更新 / 删除，自增ID即增量同步的游标
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = (
+        # 按比赛 / 玩家范围读取游标之后的变更
+        Index("ix_change_log_match_id", "match_id", "id"),
+        Index("ix_change_log_user_id", "user_id", "id"),
+        # AUTOINCREMENT 保证ID不会复用，游标单调递增
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, comment="变更序号（游标）")
+    entity = Column(String, nullable=False, comment="实体类型（表名）")
+    entity_id = Column(Integer, nullable=False, comment="实体ID")
+    op = Column(String, nullable=False, comment="操作：insert / update / delete")
+    match_id = Column(Integer, nullable=True, comment="所属比赛ID")
+    user_id = Column(Integer, nullable=True, comment="所属玩家ID")
+    changed_at = Column(DateTime, default=datetime.datetime.utcnow, comment="变更时间")
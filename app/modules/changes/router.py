@@ -0,0 +1,32 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.deps import get_read_db
+from app.core.negotiation import NegotiatedRoute, negotiate
+from . import crud
+
+router = APIRouter(route_class=NegotiatedRoute)
+
+
+@router.get("/")
+async def read_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="上次同步返回的 cursor，首次同步传 0"),
+    scope: Optional[str] = Query(None, description="match:{id} 或 user:{id}，不传则返回全部变更"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="最多读取的变更数，默认 CHANGES_PAGE_SIZE"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    增量同步：返回游标之后插入、更新、删除的实体和新的游标
+
+    has_more 为 true 时用返回的 cursor 继续请求，直到 has_more 为 false。
+    """
+    try:
+        scope_key = crud.parse_scope(scope)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    changes = await db.run_sync(crud.get_changes, since, scope_key, limit or settings.CHANGES_PAGE_SIZE)
+    return negotiate(request, changes)
@@ -0,0 +1,126 @@
+"""
+数据导出查询
+
+只构造列查询（不加载 ORM 对象），由路由通过服务端游标分批读取，
+导出任意规模的数据时内存占用都只与批大小有关。
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, desc, func, select
+
+from app.modules.users.models import User
+from app.modules.games.models import Game
+from app.modules.matches.models import Match, MatchGame, MatchTeam, Score
+
+
+def scores_export_query(match_id: Optional[int] = None, game_code: Optional[str] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None) -> Select:
+    """
+    分数明细（含标准分），按分数ID排序
+
+    队伍、玩家、赛程为空（或已删除）的分数同样导出，对应的名称列为空。
+
+    Args:
+        match_id: 只导出该比赛的分数
+        game_code: 只导出该游戏的分数
+        since / until: 记录时间范围 [since, until)
+    """
+    stmt = (
+        select(
+            Score.id.label("score_id"),
+            Score.recorded_at,
+            MatchGame.match_id,
+            Match.name.label("match_name"),
+            Score.match_game_id,
+            Game.code.label("game_code"),
+            MatchGame.game_order,
+            MatchGame.multiplier,
+            Score.match_team_id.label("team_id"),
+            MatchTeam.name.label("team_name"),
+            Score.user_id,
+            User.nickname,
+            Score.points,
+            Score.standard_score,
+        )
+        .outerjoin(MatchGame, Score.match_game_id == MatchGame.id)
+        .outerjoin(Match, MatchGame.match_id == Match.id)
+        .outerjoin(Game, MatchGame.game_id == Game.id)
+        .outerjoin(MatchTeam, Score.match_team_id == MatchTeam.id)
+        .outerjoin(User, Score.user_id == User.id)
+        .order_by(Score.id)
+    )
+    if match_id is not None:
+        stmt = stmt.where(MatchGame.match_id == match_id)
+    if game_code:
+        stmt = stmt.where(Game.code == game_code)
+    if since is not None:
+        stmt = stmt.where(Score.recorded_at >= since)
+    if until is not None:
+        stmt = stmt.where(Score.recorded_at < until)
+    return stmt
+
+
+def leaderboard_export_query(game_code: Optional[str] = None, match_id: Optional[int] = None,
+                             since: Optional[datetime] = None, until: Optional[datetime] = None) -> Select:
+    """
+    完整排行榜（不分页）
+
+    不带筛选条件时与 /api/users/leaderboard 的综合排行一致（按玩家平均标准分）；
+    带 game_code / match_id / 时间范围时按范围内分数的平均标准分现算排名。
+    """
+    if game_code is None and match_id is None and since is None and until is None:
+        return (
+            select(
+                func.row_number().over(order_by=(desc(User.average_standard_score), User.id)).label("rank"),
+                User.id.label("user_id"),
+                User.nickname,
+                User.display_name,
+                func.round(User.average_standard_score, 1).label("average_standard_score"),
+                func.round(User.total_standard_score, 1).label("total_standard_score"),
+                User.game_level,
+                func.round(User.level_progress, 1).label("level_progress"),
+                User.total_matches,
+            )
+            .where(User.average_standard_score > 0)
+            .order_by(desc(User.average_standard_score), User.id)
+        )
+
+    average = func.avg(Score.standard_score)
+    stmt = (
+        select(
+            User.id.label("user_id"),
+            User.nickname,
+            User.display_name,
+            average.label("average_standard_score"),
+            func.sum(Score.standard_score).label("total_standard_score"),
+            func.count(Score.id).label("games_played"),
+        )
+        .join(Score, Score.user_id == User.id)
+        .join(MatchGame, Score.match_game_id == MatchGame.id)
+        .where(Score.standard_score.isnot(None))
+        .group_by(User.id)
+    )
+    if game_code:
+        stmt = stmt.join(Game, MatchGame.game_id == Game.id).where(Game.code == game_code)
+    if match_id is not None:
+        stmt = stmt.where(MatchGame.match_id == match_id)
+    if since is not None:
+        stmt = stmt.where(Score.recorded_at >= since)
+    if until is not None:
+        stmt = stmt.where(Score.recorded_at < until)
+
+    ranked = stmt.subquery()
+    return (
+        select(
+            func.row_number().over(
+                order_by=(desc(ranked.c.average_standard_score), ranked.c.user_id)).label("rank"),
+            ranked.c.user_id,
+            ranked.c.nickname,
+            ranked.c.display_name,
+            func.round(ranked.c.average_standard_score, 1).label("average_standard_score"),
+            func.round(ranked.c.total_standard_score, 1).label("total_standard_score"),
+            ranked.c.games_played,
+        )
+        .order_by(desc(ranked.c.average_standard_score), ranked.c.user_id)
+    )
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.db import read_engine
+from app.core.security import get_api_key
+from . import crud
+
+router = APIRouter(dependencies=[Depends(get_api_key)])
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv; charset=utf-8",
+    ExportFormat.ndjson: "application/x-ndjson",
+}
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def _stream_rows(stmt, fmt: ExportFormat):
+    """
+    通过服务端游标分批读取并逐批编码输出
+
+    连接在生成器内部打开，响应发送完（或客户端断开）才归还连接池；
+    yield_per 让驱动每次只取一批行，内存占用与结果总量无关。
+    """
+    async with read_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt is ExportFormat.csv else None
+        if writer:
+            writer.writerow(columns)
+        async for rows in result.partitions():
+            for row in rows:
+                if writer:
+                    writer.writerow(_jsonable(v) for v in row)
+                else:
+                    buffer.write(json.dumps(
+                        {k: _jsonable(v) for k, v in zip(columns, row)}, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+def _export_response(stmt, fmt: ExportFormat, name: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.now():%Y%m%d%H%M%S}.{fmt.value}"
+    return StreamingResponse(
+        _stream_rows(stmt, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/scores")
+async def export_scores(
+    format: ExportFormat = ExportFormat.csv,
+    match_id: Optional[int] = None,
+    game_code: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    导出分数明细（原始分、标准分、比赛、赛程、队伍、玩家）
+
+    Args:
+        format: csv 或 ndjson
+        match_id: 比赛ID
+        game_code: 游戏代码
+        since / until: 记录时间范围 [since, until)
+    """
+    stmt = crud.scores_export_query(match_id=match_id, game_code=game_code, since=since, until=until)
+    return _export_response(stmt, format, "scores")
+
+
+@router.get("/leaderboard")
+async def export_leaderboard(
+    format: ExportFormat = ExportFormat.csv,
+    game_code: Optional[str] = None,
+    match_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """
+    导出完整排行榜（不受 /api/users/leaderboard 每页 100 条的限制）
+
+    不带筛选条件时按玩家平均标准分排行；带条件时按范围内分数的平均标准分排行。
+    """
+    stmt = crud.leaderboard_export_query(game_code=game_code, match_id=match_id, since=since, until=until)
+    return _export_response(stmt, format, "leaderboard")
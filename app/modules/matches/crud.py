@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy.orm import Session
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from sqlalchemy import func, text
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select, text
 from . import models, schemas
 from .standard_score import calculate_standard_scores_for_match_game
 from typing import List, Optional
 from fastapi import HTTPException
+from app.core.responses import rows_to_dicts
+from app.core.tracing import detached, span, traced
+from app.core.versions import mark_changed, mark_match_game_changed
+from app.core.writer import write_queue
+from app.modules.changes.crud import record_changes
 
 # --- Match CRUD ---
 
@@ -26,6 +29,20 @@ def get_matches(db: Session, skip: int = 0, limit: int = 100, status: schemas.Ma
     
     return query.offset(skip).limit(limit).all()
 
+def get_match_rows(db: Session, skip: int = 0, limit: int = 100, status: schemas.MatchStatus = None):
+    """与 get_matches 相同的结果，直接查询列（不构造 ORM 对象），字段顺序与 schemas.MatchList 一致"""
+    Match = models.Match
+    stmt = select(
+        Match.name, Match.description, Match.start_time, Match.end_time, Match.status,
+        Match.prize_pool, Match.max_teams, Match.max_players_per_team, Match.allow_substitutes,
+        Match.winning_team_id, Match.id, Match.created_at, Match.updated_at,
+    )
+    if status:
+        stmt = stmt.where(Match.status == status)
+    stmt = stmt.order_by(Match.start_time.desc().nulls_last(), Match.created_at.desc())
+    return rows_to_dicts(db.execute(stmt.offset(skip).limit(limit)))
+
+@traced()
 def create_match(db: Session, match: schemas.MatchCreate):
     # Convert schema status to model status
     status = models.MatchStatus.PREPARING
@@ -130,38 +147,57 @@ def delete_match(db: Session, match_id: int):
 
 # --- MatchTeam CRUD ---
 
+def _require_users(db: Session, user_ids):
+    """一次查询校验玩家都存在，否则返回 400"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    from app.modules.users.models import User
+    found = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    missing = sorted(user_ids - found)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Users not found: {', '.join(map(str, missing))}")
+
+@traced()
+def create_match_teams(db: Session, match_id: int, teams: List[schemas.MatchTeamCreate]):
+    """
+    在一个事务中创建多支比赛专属队伍及其队员
+
+    所有队员先用一条查询校验存在，队伍和队员各一次批量 INSERT，只提交一次；
+    写会话提交后不过期对象，返回的队伍无需 refresh。
+    """
+    _require_users(db, (member.user_id for team in teams for member in team.members or []))
+
+    db_teams = [models.MatchTeam(match_id=match_id, name=team.name, color=team.color) for team in teams]
+    db.add_all(db_teams)
+    # 取得队伍ID
+    db.flush()
+
+    db.add_all([
+        models.MatchTeamMembership(
+            match_team_id=db_team.id,
+            user_id=member.user_id,
+            role=models.MemberRole(member.role) if member.role else models.MemberRole.MAIN
+        )
+        for db_team, team in zip(db_teams, teams)
+        for member in team.members or []
+    ])
+    db.commit()
+    return db_teams
+
 def create_match_team(db: Session, match_id: int, team_data: schemas.MatchTeamCreate):
     """创建比赛专属队伍"""
-    db_team = models.MatchTeam(
-        match_id=match_id,
-        name=team_data.name,
-        color=team_data.color
-    )
-    db.add(db_team)
-    db.commit()
-    db.refresh(db_team)
-    
-    # 添加队员
-    if team_data.members:
-        for member in team_data.members:
-            membership = models.MatchTeamMembership(
-                match_team_id=db_team.id,
-                user_id=member.user_id,
-                role=models.MemberRole(member.role) if member.role else models.MemberRole.MAIN
-            )
-            db.add(membership)
-    
-    db.commit()
-    db.refresh(db_team)
-    return db_team
+    return create_match_teams(db, match_id, [team_data])[0]
 
 def get_match_teams(db: Session, match_id: int):
     """获取比赛的所有队伍"""
     return db.query(models.MatchTeam).filter(models.MatchTeam.match_id == match_id).all()
 
 def get_match_team(db: Session, team_id: int):
-    """获取单个比赛队伍"""
-    return db.query(models.MatchTeam).filter(models.MatchTeam.id == team_id).first()
+    """获取单个比赛队伍（预加载所属比赛）"""
+    return db.query(models.MatchTeam).options(
+        joinedload(models.MatchTeam.match)
+    ).filter(models.MatchTeam.id == team_id).first()
 
 def get_team_members(db: Session, team_id: int):
     """获取队伍成员列表"""
@@ -278,6 +314,7 @@ def delete_match_game(db: Session, match_game_id: int):
 
 # --- GameLineup CRUD ---
 
+@traced()
 def set_game_lineups(db: Session, match_game_id: int, lineup_setting: schemas.LineupSetting):
     """设置一个游戏所有队伍的出战阵容，并验证选手唯一性"""
     
@@ -285,27 +322,41 @@ def set_game_lineups(db: Session, match_game_id: int, lineup_setting: schemas.Li
     if not match_game:
         raise ValueError(f"MatchGame with id {match_game_id} not found")
 
-    # 1. 清除该游戏的所有现有阵容
+    # 1. 一次查询校验所有队伍都属于该比赛，一次查询校验所有选手存在
+    team_ids = [int(team_id) for team_id in lineup_setting.team_lineups]
+    valid_team_ids = set(db.scalars(select(models.MatchTeam.id).where(
+        models.MatchTeam.id.in_(team_ids),
+        models.MatchTeam.match_id == match_game.match_id
+    )))
+    for team_id in team_ids:
+        if team_id not in valid_team_ids:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Team with ID {team_id} not found or does not belong to this match."
+            )
+    _require_users(db, (user_id for player_ids in lineup_setting.team_lineups.values() for user_id in player_ids))
+
+    # 2. 清除该游戏的所有现有阵容
+    old_lineups = db.query(models.GameLineup.id, models.GameLineup.user_id).filter(
+        models.GameLineup.match_game_id == match_game_id
+    ).all()
     db.query(models.GameLineup).filter(
         models.GameLineup.match_game_id == match_game_id
     ).delete(synchronize_session='fetch')
+    record_changes(db, "game_lineups", [
+        (lineup_id, match_game.match_id, user_id) for lineup_id, user_id in old_lineups
+    ], op="delete")
+    mark_match_game_changed(db, match_game_id)
 
     player_in_lineup = set()
     new_lineups = []
 
-    # 2. 遍历所有队伍的阵容设置
+    # 3. 遍历所有队伍的阵容设置
     for team_id_str, player_ids in lineup_setting.team_lineups.items():
         team_id = int(team_id_str)
-        
-        team = db.query(models.MatchTeam).filter(models.MatchTeam.id == team_id).first()
-        if not team or team.match_id != match_game.match_id:
-             raise HTTPException(
-                status_code=400,
-                detail=f"Team with ID {team_id} not found or does not belong to this match."
-            )
 
         for user_id in player_ids:
-            # 3. 验证选手是否已在其他队伍的阵容中
+            # 4. 验证选手是否已在其他队伍的阵容中
             if user_id in player_in_lineup:
                 db.rollback()
                 raise HTTPException(
@@ -314,7 +365,7 @@ def set_game_lineups(db: Session, match_game_id: int, lineup_setting: schemas.Li
                 )
             player_in_lineup.add(user_id)
             
-            # 4. 创建新的阵容对象
+            # 5. 创建新的阵容对象
             new_lineups.append(models.GameLineup(
                 match_game_id=match_game_id,
                 match_team_id=team_id,
@@ -323,7 +374,7 @@ def set_game_lineups(db: Session, match_game_id: int, lineup_setting: schemas.Li
                 substitute_reason=lineup_setting.substitute_info.get(str(user_id)) if lineup_setting.substitute_info else None
             ))
 
-    # 5. 批量添加新阵容
+    # 6. 批量添加新阵容（一次提交）
     if new_lineups:
         db.add_all(new_lineups)
     
@@ -338,13 +389,15 @@ def get_game_lineup(db: Session, match_game_id: int, team_id: int = None):
 
 # --- Score CRUD ---
 
+@traced()
 def create_match_score(db: Session, match_game_id: int, score: schemas.ScoreCreate):
     """为指定赛程创建一条分数记录, 并根据阵容信息自动校正队伍ID"""
     # 查找选手在该游戏中的阵容记录，以确定其所属队伍
-    lineup_entry = db.query(models.GameLineup).filter(
-        models.GameLineup.match_game_id == match_game_id,
-        models.GameLineup.user_id == score.user_id
-    ).first()
+    with span("lineup_lookup", match_game_id=match_game_id, user_id=score.user_id):
+        lineup_entry = db.query(models.GameLineup).filter(
+            models.GameLineup.match_game_id == match_game_id,
+            models.GameLineup.user_id == score.user_id
+        ).first()
 
     if not lineup_entry:
         raise HTTPException(
@@ -367,9 +420,10 @@ def create_match_score(db: Session, match_game_id: int, score: schemas.ScoreCrea
         match_game_id=match_game_id,
         event_data=score.event_data
     )
-    db.add(db_score)
-    db.commit()
-    db.refresh(db_score)
+    with span("insert_score"):
+        db.add(db_score)
+        db.commit()
+        db.refresh(db_score)
     
     # 自动计算该游戏的标准分
     calculate_standard_scores_for_match_game(db, match_game_id)
@@ -382,6 +436,17 @@ def create_match_score(db: Session, match_game_id: int, score: schemas.ScoreCrea
 def get_scores_for_match_game(db: Session, match_game_id: int):
     return db.query(models.Score).filter(models.Score.match_game_id == match_game_id).all()
 
+def get_score_rows_for_match_game(db: Session, match_game_id: int):
+    """与 get_scores_for_match_game 相同的结果，直接查询列，字段顺序与 schemas.Score 一致"""
+    Score = models.Score
+    return rows_to_dicts(db.execute(
+        select(
+            Score.points, Score.user_id, Score.match_team_id.label("team_id"), Score.event_data,
+            Score.id, Score.match_game_id, Score.standard_score, Score.recorded_at,
+        ).where(Score.match_game_id == match_game_id)
+    ))
+
+@traced()
 def delete_score(db: Session, score_id: int):
     """删除分数记录"""
     db_score = db.query(models.Score).filter(models.Score.id == score_id).first()
@@ -414,6 +479,7 @@ def get_match_stats(db: Session, match_id: int):
         "total_games": len(db_match.match_games)
     }
 
+@traced()
 def get_match_leaderboard(db: Session, match_id: int, limit: int = 100) -> List[dict]:
     """获取指定比赛内的标准分排行榜（仅统计该比赛的所有赛程）。"""
     # 先取出该比赛的所有赛程ID
@@ -447,6 +513,7 @@ def get_match_leaderboard(db: Session, match_id: int, limit: int = 100) -> List[
         })
     return leaderboard
 
+@traced()
 def get_multi_match_leaderboard(db: Session, match_ids: List[int], limit: int = 100) -> List[dict]:
     """获取多场比赛合并的标准分排行榜。"""
     if not match_ids:
@@ -503,6 +570,7 @@ def get_user_matches(db: Session, user_id: int):
 
 # --- 标准分管理函数 ---
 
+@traced()
 def recalculate_match_standard_scores(db: Session, match_id: int) -> bool:
     """
     强制重新计算整个比赛的所有分数和排名：
@@ -522,10 +590,8 @@ def recalculate_match_standard_scores(db: Session, match_id: int) -> bool:
     if db_match:
         team_ids = [team.id for team in db_match.teams]
         if team_ids:
-            # 使用同步方法确保计算立即完成
-            update_team_scores_sync(team_ids)
-            # 再次显式调用排名更新，确保万无一失
-            update_team_rankings(db, match_id)
+            # 当前已在写线程中，直接用同一会话完成计算（再排队会等待自己）
+            update_team_scores(db, team_ids)
             
     return True
 
@@ -535,11 +601,9 @@ def recalculate_game_standard_scores(db: Session, match_game_id: int) -> bool:
 
 # --- 队伍积分更新函数 ---
 
-def update_team_scores_sync(team_ids: list[int]):
-    """同步更新指定队伍的积分（在独立的数据库会话中），考虑游戏倍率"""
-    from app.core.db import SessionLocal
-    
-    db = SessionLocal()
+@traced()
+def update_team_scores(db: Session, team_ids: list[int]):
+    """在给定会话中更新指定队伍的积分和排名，考虑游戏倍率（需在写线程中调用）"""
     try:
         for team_id in team_ids:
             # 计算队伍总积分和参与游戏数，考虑游戏倍率
@@ -582,15 +646,19 @@ def update_team_scores_sync(team_ids: list[int]):
             if match_row:
                 match_id = match_row[0]
                 update_team_rankings(db, match_id)
+                mark_changed(db, f"match:{match_id}")
         
         db.commit()
     except Exception as e:
         print(f"更新队伍积分时出错: {e}")
         db.rollback()
-    finally:
-        db.close()
+
+def update_team_scores_sync(team_ids: list[int]):
+    """同步更新指定队伍的积分：排入写队列并等待完成（不能在写线程内调用）"""
+    write_queue.run(update_team_scores, team_ids)
 
 
+@traced()
 def update_team_rankings(db, match_id: int):
     """更新指定比赛的队伍排名"""
     # 获取所有队伍按积分排序
@@ -611,7 +679,10 @@ def update_team_rankings(db, match_id: int):
             WHERE id = :team_id
         """), {"rank": rank, "team_id": team_id})
 
+    # 队伍总分和排名都是直接执行 SQL 更新的，需要手动记入变更日志
+    record_changes(db, "match_teams", [(team_id, match_id, None) for team_id, _ in teams])
+
 def update_team_scores_async(team_ids: list[int]):
-    """异步更新队伍积分，避免阻塞主线程"""
-    executor = ThreadPoolExecutor(max_workers=1)
-    executor.submit(update_team_scores_sync, team_ids)
\ No newline at end of file
+    """异步更新队伍积分，避免阻塞主线程（排入写队列，不等待结果）"""
+    with detached():
+        write_queue.submit(update_team_scores, team_ids)
\ No newline at end of file
@@ -1,6 +1,6 @@
 
 # -*- coding: utf-8 -*-
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Enum, Boolean, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Enum, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 import datetime
 import enum
@@ -69,7 +69,7 @@ class MatchTeam(Base):
     __tablename__ = "match_teams"
 
     id = Column(Integer, primary_key=True, index=True, comment="比赛队伍ID")
-    match_id = Column(Integer, ForeignKey("matches.id"), nullable=False, comment="关联的比赛ID")
+    match_id = Column(Integer, ForeignKey("matches.id"), nullable=False, index=True, comment="关联的比赛ID")
     name = Column(String, nullable=False, comment="队伍名称")
     color = Column(String, comment="队伍颜色")
     
@@ -123,6 +123,12 @@ class MatchTeam(Base):
 # 比赛队伍成员关系模型
 class MatchTeamMembership(Base):
     __tablename__ = "match_team_memberships"
+    __table_args__ = (
+        # 按队伍查成员 / 判断某人是否在某队
+        Index("ix_memberships_team_user", "match_team_id", "user_id"),
+        # 按玩家查参赛历史
+        Index("ix_memberships_user_team", "user_id", "match_team_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, comment="成员关系ID")
     match_team_id = Column(Integer, ForeignKey("match_teams.id"), nullable=False, comment="比赛队伍ID")
@@ -139,10 +145,13 @@ class MatchTeamMembership(Base):
 # 赛程数据模型
 class MatchGame(Base):
     __tablename__ = "match_games"
+    __table_args__ = (
+        Index("ix_match_games_match_order", "match_id", "game_order"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, comment="赛程ID")
     match_id = Column(Integer, ForeignKey("matches.id"), nullable=False, comment="关联的比赛ID")
-    game_id = Column(Integer, ForeignKey("games.id"), nullable=False, comment="关联的项目ID")
+    game_id = Column(Integer, ForeignKey("games.id"), nullable=False, index=True, comment="关联的项目ID")
     
     # 赛程信息
     game_order = Column(Integer, default=1, comment="比赛顺序")
@@ -167,6 +176,10 @@ class MatchGame(Base):
 # 每个小游戏的出战阵容
 class GameLineup(Base):
     __tablename__ = "game_lineups"
+    __table_args__ = (
+        # 录分时按 (赛程, 玩家) 查阵容
+        Index("ix_game_lineups_game_user", "match_game_id", "user_id", "match_team_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, comment="阵容ID")
     match_game_id = Column(Integer, ForeignKey("match_games.id"), nullable=False, comment="赛程ID")
@@ -187,13 +200,21 @@ class GameLineup(Base):
 
 class Score(Base):
     __tablename__ = "scores"
+    __table_args__ = (
+        # 赛程内标准分计算 / 比赛排行榜（覆盖索引，无需回表）
+        Index("ix_scores_game_user_std", "match_game_id", "user_id", "standard_score"),
+        # 玩家统计、时间线、按游戏排行
+        Index("ix_scores_user_game_std", "user_id", "match_game_id", "standard_score"),
+        # 最近得分
+        Index("ix_scores_user_recorded", "user_id", "recorded_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, comment="分数记录ID")
     points = Column(Integer, comment="原始得分")
     standard_score = Column(Float, nullable=True, comment="标准分（15000分制）")
     
     user_id = Column(Integer, ForeignKey("users.id"), comment="得分用户ID")
-    match_team_id = Column(Integer, ForeignKey("match_teams.id"), comment="得分队伍ID") 
+    match_team_id = Column(Integer, ForeignKey("match_teams.id"), index=True, comment="得分队伍ID") 
     match_game_id = Column(Integer, ForeignKey("match_games.id"), comment="关联的赛程ID")
     
     # 额外数据
@@ -1,36 +1,46 @@
 # -*- coding: utf-8 -*-
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.core.deps import get_db
+from app.core.cache import cache_response
+from app.core.deps import get_db, get_read_db
+from app.core.negotiation import NegotiatedRoute, negotiate
+from app.core.versions import versioned
+from app.core.writer import write_queue
 from . import crud, models, schemas
 from app.modules.users import crud as users_crud
 from app.core.security import get_api_key
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
 
 # --- 比赛接口 ---
 
 @router.post("/", response_model=schemas.Match, status_code=201)
-def create_match(match: schemas.MatchCreate, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def create_match(match: schemas.MatchCreate, api_key: str = Depends(get_api_key)):
     """创建一场新比赛"""
-    return crud.create_match(db=db, match=match)
+    return write_queue.run(crud.create_match, match=match)
 
 @router.get("/", response_model=List[schemas.MatchList])
-def read_matches(
+@versioned("matches")
+async def read_matches(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     status: schemas.MatchStatus = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取比赛列表，支持按状态筛选"""
-    return crud.get_matches(db, skip=skip, limit=limit, status=status)
+    matches = await db.run_sync(crud.get_match_rows, skip=skip, limit=limit, status=status)
+    return negotiate(request, matches)
 
 @router.get("/{match_id}", response_model=schemas.Match)
-def read_match(match_id: int, db: Session = Depends(get_db)):
+@cache_response()
+@versioned("match:{match_id}")
+async def read_match(match_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取单场比赛的详细信息"""
-    db_match = crud.get_match(db, match_id=match_id)
+    db_match = await db.run_sync(crud.get_match, match_id=match_id)
     if db_match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return db_match
@@ -39,19 +49,18 @@ def read_match(match_id: int, db: Session = Depends(get_db)):
 def update_match(
     match_id: int, 
     match_update: schemas.MatchUpdate, 
-    db: Session = Depends(get_db), 
     api_key: str = Depends(get_api_key)
 ):
     """更新比赛信息"""
-    db_match = crud.update_match(db, match_id=match_id, match_update=match_update)
+    db_match = write_queue.run(crud.update_match, match_id=match_id, match_update=match_update)
     if db_match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return db_match
 
 @router.post("/{match_id}/start", response_model=schemas.Match)
-def start_match(match_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def start_match(match_id: int, api_key: str = Depends(get_api_key)):
     """开始比赛"""
-    db_match = crud.start_match(db, match_id=match_id)
+    db_match = write_queue.run(crud.start_match, match_id=match_id)
     if db_match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return db_match
@@ -59,19 +68,18 @@ def start_match(match_id: int, db: Session = Depends(get_db), api_key: str = Dep
 @router.post("/{match_id}/finish", response_model=schemas.Match)
 def finish_match(
     match_id: int, 
-    db: Session = Depends(get_db), 
     api_key: str = Depends(get_api_key)
 ):
     """结束比赛"""
-    db_match = crud.finish_match(db, match_id=match_id)
+    db_match = write_queue.run(crud.finish_match, match_id=match_id)
     if db_match is None:
         raise HTTPException(status_code=404, detail="Match not found")
     return db_match
 
 @router.delete("/{match_id}")
-def delete_match(match_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def delete_match(match_id: int, api_key: str = Depends(get_api_key)):
     """删除比赛"""
-    success = crud.delete_match(db, match_id=match_id)
+    success = write_queue.run(crud.delete_match, match_id=match_id)
     if not success:
         raise HTTPException(status_code=404, detail="Match not found")
     return {"message": "Match deleted successfully"}
@@ -91,17 +99,20 @@ def create_match_team(
     if not db_match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    return crud.create_match_team(db=db, match_id=match_id, team_data=team)
+    return write_queue.run(crud.create_match_team, match_id=match_id, team_data=team)
 
 @router.get("/{match_id}/teams", response_model=List[schemas.MatchTeam])
-def get_match_teams(match_id: int, db: Session = Depends(get_db)):
+@cache_response()
+@versioned("match:{match_id}")
+async def get_match_teams(match_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取比赛的所有队伍"""
-    return crud.get_match_teams(db, match_id=match_id)
+    return await db.run_sync(crud.get_match_teams, match_id=match_id)
 
 @router.get("/teams/{team_id}", response_model=schemas.MatchTeamWithMatch)
-def get_match_team(team_id: int, db: Session = Depends(get_db)):
+async def get_match_team(team_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取单个比赛队伍详情"""
-    db_team = crud.get_match_team(db, team_id=team_id)
+    # 队伍所属比赛已预加载，下面访问 db_team.match 不会触发懒加载
+    db_team = await db.run_sync(crud.get_match_team, team_id=team_id)
     if db_team is None:
         raise HTTPException(status_code=404, detail="Team not found")
     
@@ -120,33 +131,32 @@ def get_match_team(team_id: int, db: Session = Depends(get_db)):
     return team_dict
 
 @router.get("/teams/{team_id}/members", response_model=List[schemas.MatchTeamMembershipSchema])
-def get_team_members(team_id: int, db: Session = Depends(get_db)):
+async def get_team_members(team_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取队伍成员列表"""
-    db_team = crud.get_match_team(db, team_id=team_id)
+    db_team = await db.run_sync(crud.get_match_team, team_id=team_id)
     if db_team is None:
         raise HTTPException(status_code=404, detail="Team not found")
     
     # 获取队伍成员
-    members = crud.get_team_members(db, team_id=team_id)
+    members = await db.run_sync(crud.get_team_members, team_id=team_id)
     return members
 
 @router.put("/teams/{team_id}", response_model=schemas.MatchTeam)
 def update_match_team(
     team_id: int, 
     team_update: schemas.MatchTeamUpdate, 
-    db: Session = Depends(get_db), 
     api_key: str = Depends(get_api_key)
 ):
     """更新比赛队伍信息"""
-    db_team = crud.update_match_team(db, team_id=team_id, team_update=team_update)
+    db_team = write_queue.run(crud.update_match_team, team_id=team_id, team_update=team_update)
     if db_team is None:
         raise HTTPException(status_code=404, detail="Team not found")
     return db_team
 
 @router.delete("/teams/{team_id}")
-def delete_match_team(team_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def delete_match_team(team_id: int, api_key: str = Depends(get_api_key)):
     """删除比赛队伍"""
-    success = crud.delete_match_team(db, team_id=team_id)
+    success = write_queue.run(crud.delete_match_team, team_id=team_id)
     if not success:
         raise HTTPException(status_code=404, detail="Team not found")
     return {"message": "Team deleted successfully"}
@@ -171,17 +181,16 @@ def add_team_member(
     if not db_team:
         raise HTTPException(status_code=404, detail="Team not found")
     
-    return crud.add_team_member(db=db, team_id=team_id, user_id=member.user_id, role=member.role)
+    return write_queue.run(crud.add_team_member, team_id=team_id, user_id=member.user_id, role=member.role)
 
 @router.delete("/teams/{team_id}/members/{user_id}")
 def remove_team_member(
     team_id: int, 
     user_id: int, 
-    db: Session = Depends(get_db), 
     api_key: str = Depends(get_api_key)
 ):
     """移除队员"""
-    success = crud.remove_team_member(db, team_id=team_id, user_id=user_id)
+    success = write_queue.run(crud.remove_team_member, team_id=team_id, user_id=user_id)
     if not success:
         raise HTTPException(status_code=404, detail="Member not found")
     return {"message": "Member removed successfully"}
@@ -191,11 +200,10 @@ def update_member_role(
     team_id: int, 
     user_id: int, 
     role_update: schemas.MemberRoleUpdate, 
-    db: Session = Depends(get_db), 
     api_key: str = Depends(get_api_key)
 ):
     """更新队员角色"""
-    membership = crud.update_team_member_role(db, team_id=team_id, user_id=user_id, new_role=role_update.role)
+    membership = write_queue.run(crud.update_team_member_role, team_id=team_id, user_id=user_id, new_role=role_update.role)
     if membership is None:
         raise HTTPException(status_code=404, detail="Member not found")
     return membership
@@ -203,14 +211,15 @@ def update_member_role(
 # --- 赛程接口 ---
 
 @router.get("/{match_id}/games", response_model=List[schemas.MatchGame])
-def get_match_games(match_id: int, db: Session = Depends(get_db)):
+@versioned("match:{match_id}")
+async def get_match_games(match_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取指定比赛的所有赛程"""
     # 验证比赛存在
-    db_match = crud.get_match(db, match_id=match_id)
+    db_match = await db.run_sync(crud.get_match, match_id=match_id)
     if not db_match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    return crud.get_match_games_by_match(db, match_id=match_id)
+    return await db.run_sync(crud.get_match_games_by_match, match_id=match_id)
 
 @router.post("/{match_id}/games", response_model=schemas.MatchGame, status_code=201)
 def create_match_game(
@@ -225,12 +234,13 @@ def create_match_game(
     if not db_match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    return crud.create_match_game(db=db, match_id=match_id, match_game=game)
+    return write_queue.run(crud.create_match_game, match_id=match_id, match_game=game)
 
 @router.get("/games/{match_game_id}", response_model=schemas.MatchGame)
-def read_match_game(match_game_id: int, db: Session = Depends(get_db)):
+@versioned("match_game:{match_game_id}")
+async def read_match_game(match_game_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取单个赛程的详细信息"""
-    db_match_game = crud.get_match_game(db, match_game_id=match_game_id)
+    db_match_game = await db.run_sync(crud.get_match_game, match_game_id=match_game_id)
     if db_match_game is None:
         raise HTTPException(status_code=404, detail="MatchGame not found")
     return db_match_game
@@ -254,17 +264,17 @@ def update_match_game(
             detail=f"Cannot start live stream: Match status is {db_match_game.match.status.value}. Only ongoing matches support live streaming."
         )
     
-    db_match_game = crud.update_match_game_status(
-        db, 
+    db_match_game = write_queue.run(
+        crud.update_match_game_status,
         match_game_id=match_game_id, 
         is_live=game_update.is_live
     )
     return db_match_game
 
 @router.delete("/games/{match_game_id}")
-def delete_match_game(match_game_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def delete_match_game(match_game_id: int, api_key: str = Depends(get_api_key)):
     """删除赛程"""
-    success = crud.delete_match_game(db, match_game_id=match_game_id)
+    success = write_queue.run(crud.delete_match_game, match_game_id=match_game_id)
     if not success:
         raise HTTPException(status_code=404, detail="MatchGame not found")
     return {"message": "MatchGame deleted successfully"}
@@ -285,13 +295,14 @@ def set_game_lineups(
         raise HTTPException(status_code=404, detail="MatchGame not found")
     
     # 一次性设置整个赛程的阵容（函数内部会清空并重建阵容，同时做唯一性校验）
-    crud.set_game_lineups(db=db, match_game_id=match_game_id, lineup_setting=lineup_setting)
+    write_queue.run(crud.set_game_lineups, match_game_id=match_game_id, lineup_setting=lineup_setting)
     return {"message": "Lineups set successfully"}
 
 @router.get("/games/{match_game_id}/lineups", response_model=List[schemas.GameLineup])
-def get_game_lineups(match_game_id: int, team_id: int = None, db: Session = Depends(get_db)):
+@versioned("match_game:{match_game_id}")
+async def get_game_lineups(match_game_id: int, team_id: int = None, db: AsyncSession = Depends(get_read_db)):
     """获取游戏出战阵容"""
-    return crud.get_game_lineup(db, match_game_id=match_game_id, team_id=team_id)
+    return await db.run_sync(crud.get_game_lineup, match_game_id=match_game_id, team_id=team_id)
 
 # --- 分数接口 ---
 
@@ -311,21 +322,23 @@ def create_score_for_match_game(
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
         
-    return crud.create_match_score(db=db, match_game_id=match_game_id, score=score)
+    return write_queue.run(crud.create_match_score, match_game_id=match_game_id, score=score)
 
 @router.get("/games/{match_game_id}/scores", response_model=List[schemas.Score])
-def read_scores_for_match_game(match_game_id: int, db: Session = Depends(get_db)):
+@versioned("match_game:{match_game_id}")
+async def read_scores_for_match_game(request: Request, match_game_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取指定赛程的所有分数记录"""
-    db_match_game = crud.get_match_game(db, match_game_id=match_game_id)
+    db_match_game = await db.run_sync(crud.get_match_game, match_game_id=match_game_id)
     if not db_match_game:
         raise HTTPException(status_code=404, detail="MatchGame not found")
     
-    return crud.get_scores_for_match_game(db=db, match_game_id=match_game_id)
+    scores = await db.run_sync(crud.get_score_rows_for_match_game, match_game_id=match_game_id)
+    return negotiate(request, scores)
 
 @router.delete("/scores/{score_id}")
-def delete_score(score_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def delete_score(score_id: int, api_key: str = Depends(get_api_key)):
     """删除分数记录"""
-    success = crud.delete_score(db, score_id=score_id)
+    success = write_queue.run(crud.delete_score, score_id=score_id)
     if not success:
         raise HTTPException(status_code=404, detail="Score not found")
     return {"message": "Score deleted successfully"}
@@ -333,29 +346,31 @@ def delete_score(score_id: int, db: Session = Depends(get_db), api_key: str = De
 # --- 统计接口 ---
 
 @router.get("/archived", response_model=List[schemas.MatchList])
-def get_archived_matches(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_archived_matches(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
     """获取已归档的比赛"""
-    return crud.get_archived_matches(db, skip=skip, limit=limit)
+    return await db.run_sync(crud.get_archived_matches, skip=skip, limit=limit)
 
 @router.get("/{match_id}/stats")
-def get_match_stats(match_id: int, db: Session = Depends(get_db)):
+@cache_response()
+@versioned("match:{match_id}")
+async def get_match_stats(request: Request, match_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取比赛统计数据"""
-    stats = crud.get_match_stats(db, match_id=match_id)
+    stats = await db.run_sync(crud.get_match_stats, match_id=match_id)
     if not stats:
         raise HTTPException(status_code=404, detail="Match not found")
-    return stats
+    return negotiate(request, stats)
 
 # --- 用户相关查询接口 ---
 
 @router.get("/users/{user_id}/teams")
-def get_user_teams_in_match(match_id: int, user_id: int, db: Session = Depends(get_db)):
+async def get_user_teams_in_match(match_id: int, user_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取用户在指定比赛中的所有队伍"""
-    return crud.get_user_teams_in_match(db, match_id=match_id, user_id=user_id)
+    return await db.run_sync(crud.get_user_teams_in_match, match_id=match_id, user_id=user_id)
 
 @router.get("/users/{user_id}/matches")
-def get_user_matches(user_id: int, db: Session = Depends(get_db)):
+async def get_user_matches(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取用户参与的所有比赛"""
-    return crud.get_user_matches(db, user_id=user_id)
+    return await db.run_sync(crud.get_user_matches, user_id=user_id)
 
 # --- 批量操作接口 ---
 
@@ -372,12 +387,13 @@ def create_teams_batch(
     if not db_match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    created_teams = []
-    for team_data in batch_create.teams:
-        created_team = crud.create_match_team(db=db, match_id=match_id, team_data=team_data)
-        created_teams.append(created_team)
+    # 所有队伍和队员在一个写操作（一个事务）中创建
+    created_teams = write_queue.run(crud.create_match_teams, match_id=match_id, teams=batch_create.teams)
     
-    return {"message": f"Created {len(created_teams)} teams successfully", "teams": created_teams}
+    return {
+        "message": f"Created {len(created_teams)} teams successfully",
+        "teams": [schemas.MatchTeam.model_validate(team) for team in created_teams],
+    }
 
 # --- 标准分管理接口 ---
 
@@ -392,7 +408,7 @@ def recalculate_match_standard_scores(
     if not db_match:
         raise HTTPException(status_code=404, detail="Match not found")
     
-    success = crud.recalculate_match_standard_scores(db, match_id=match_id)
+    success = write_queue.run(crud.recalculate_match_standard_scores, match_id=match_id)
     if success:
         return {"message": f"Successfully recalculated standard scores for match {match_id}"}
     else:
@@ -409,7 +425,7 @@ def recalculate_game_standard_scores(
     if not db_match_game:
         raise HTTPException(status_code=404, detail="MatchGame not found")
     
-    success = crud.recalculate_game_standard_scores(db, match_game_id=match_game_id)
+    success = write_queue.run(crud.recalculate_game_standard_scores, match_game_id=match_game_id)
     if success:
         return {"message": f"Successfully recalculated standard scores for game {match_game_id}"}
     else:
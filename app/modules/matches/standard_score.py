@@ -7,10 +7,13 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 from typing import List, Dict, Tuple
 from . import models
 from app.modules.users import models as user_models
+from app.core.tracing import span, traced
+from app.core.versions import mark_changed, mark_match_game_changed, match_of_game
+from app.modules.changes.crud import record_changes
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,7 @@ class StandardScoreCalculator:
     def __init__(self, db: Session):
         self.db = db
     
+    @traced()
     def calculate_match_game_standard_scores(self, match_game_id: int) -> Dict[int, float]:
         """
         计算单个比赛游戏的标准分
@@ -58,6 +62,7 @@ class StandardScoreCalculator:
         
         return standard_scores
     
+    @traced()
     def update_match_game_standard_scores(self, match_game_id: int) -> bool:
         """
         更新单个比赛游戏的标准分到数据库
@@ -81,6 +86,14 @@ class StandardScoreCalculator:
                     models.Score.id == score_id
                 ).update({"standard_score": standard_score})
             
+            # 标准分是批量 UPDATE 写入的，需要手动记入变更日志
+            match_id = match_of_game(self.db, match_game_id)
+            score_users = self.db.query(models.Score.id, models.Score.user_id).filter(
+                models.Score.match_game_id == match_game_id
+            ).all()
+            record_changes(self.db, "scores", [(score_id, match_id, user_id) for score_id, user_id in score_users])
+            mark_match_game_changed(self.db, match_game_id)
+            mark_changed(self.db, "leaderboard")
             self.db.commit()
             logger.info(f"Updated standard scores for match_game_id: {match_game_id}")
             return True
@@ -90,6 +103,7 @@ class StandardScoreCalculator:
             self.db.rollback()
             return False
     
+    @traced()
     def calculate_match_standard_scores(self, match_id: int) -> bool:
         """
         计算整个比赛的所有游戏的标准分
@@ -158,6 +172,7 @@ class StandardScoreCalculator:
             self.db.rollback()
             return False
     
+    @traced()
     def update_all_users_standard_score_stats(self) -> int:
         """
         更新所有用户的标准分统计信息
@@ -171,9 +186,10 @@ class StandardScoreCalculator:
             user_ids = [uid[0] for uid in user_ids]
             
             success_count = 0
-            for user_id in user_ids:
-                if self.update_user_standard_score_stats(user_id):
-                    success_count += 1
+            with span("update_user_standard_score_stats", users=len(user_ids)):
+                for user_id in user_ids:
+                    if self.update_user_standard_score_stats(user_id):
+                        success_count += 1
             
             logger.info(f"Updated standard score stats for {success_count}/{len(user_ids)} users")
             
@@ -216,6 +232,7 @@ class StandardScoreCalculator:
             return {'S': 0, 'A': 0, 'B': 0, 'C': 0, 'D': 0}
 
 
+@traced()
 def calculate_standard_scores_for_match(db: Session, match_id: int) -> bool:
     """
     便捷函数：为指定比赛计算标准分
@@ -237,6 +254,7 @@ def calculate_standard_scores_for_match(db: Session, match_id: int) -> bool:
     return success
 
 
+@traced()
 def calculate_standard_scores_for_match_game(db: Session, match_game_id: int) -> bool:
     """
     便捷函数：为指定比赛游戏计算标准分
@@ -258,8 +276,9 @@ def calculate_standard_scores_for_match_game(db: Session, match_game_id: int) ->
         ).all()
         
         user_ids = list(set(score.user_id for score in scores))
-        for user_id in user_ids:
-            calculator.update_user_standard_score_stats(user_id)
+        with span("update_user_standard_score_stats", users=len(user_ids)):
+            for user_id in user_ids:
+                calculator.update_user_standard_score_stats(user_id)
         
         # 更新所有用户的等级
         try:
@@ -269,4 +288,119 @@ def calculate_standard_scores_for_match_game(db: Session, match_game_id: int) ->
         except Exception as e:
             logger.error(f"Error updating user levels after match game update: {e}")
     
-    return success
\ No newline at end of file
+    return success
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+@traced()
+def recalculate_scores_bulk(db: Session, match_game_ids) -> dict:
+    """
+    批量重算派生数据（集合式 SQL，用于导入等一次写入大量分数的场景）
+
+    与逐条计算的结果口径一致：
+    1. 指定赛程的标准分（总分为 0 时平均分配）；
+    2. 涉及玩家的标准分统计；
+    3. 涉及比赛的队伍总分（乘倍率）、参与游戏数和排名；
+    4. 全体玩家等级。
+
+    Args:
+        db: 数据库会话
+        match_game_ids: 需要重算的赛程ID
+
+    Returns:
+        dict: 各步骤影响的行数
+    """
+    match_game_ids = sorted(set(match_game_ids))
+    result = {"match_games": len(match_game_ids), "scores": 0, "users": 0, "teams": 0, "levels": 0}
+    if not match_game_ids:
+        return result
+
+    user_ids, match_ids = set(), set()
+    with span("bulk_standard_scores", match_games=len(match_game_ids)):
+        for chunk in _chunks(match_game_ids):
+            params = {f"mg{i}": mg_id for i, mg_id in enumerate(chunk)}
+            in_clause = ", ".join(f":{name}" for name in params)
+            result["scores"] += db.execute(text(f"""
+                UPDATE scores
+                SET standard_score = CASE
+                    WHEN totals.total_points = 0 THEN {StandardScoreCalculator.STANDARD_TOTAL_SCORE}.0 / totals.score_count
+                    ELSE ROUND(scores.points * {StandardScoreCalculator.STANDARD_TOTAL_SCORE}.0 / totals.total_points, 2)
+                END
+                FROM (
+                    SELECT match_game_id, COALESCE(SUM(points), 0) AS total_points, COUNT(*) AS score_count
+                    FROM scores
+                    WHERE match_game_id IN ({in_clause})
+                    GROUP BY match_game_id
+                ) AS totals
+                WHERE scores.match_game_id = totals.match_game_id
+            """), params).rowcount
+            score_rows = db.execute(text(f"""
+                SELECT s.id, mg.match_id, s.user_id
+                FROM scores s JOIN match_games mg ON s.match_game_id = mg.id
+                WHERE s.match_game_id IN ({in_clause})
+            """), params).all()
+            record_changes(db, "scores", score_rows)
+            user_ids.update(user_id for _, _, user_id in score_rows)
+            match_ids.update(r[0] for r in db.execute(text(
+                f"SELECT DISTINCT match_id FROM match_games WHERE id IN ({in_clause})"), params))
+
+    with span("bulk_user_stats", users=len(user_ids)):
+        for chunk in _chunks(user_ids):
+            params = {f"u{i}": user_id for i, user_id in enumerate(chunk)}
+            in_clause = ", ".join(f":{name}" for name in params)
+            result["users"] += db.execute(text(f"""
+                UPDATE users
+                SET total_standard_score = COALESCE((
+                        SELECT SUM(s.standard_score) FROM scores s
+                        WHERE s.user_id = users.id AND s.standard_score IS NOT NULL), 0),
+                    average_standard_score = COALESCE((
+                        SELECT AVG(s.standard_score) FROM scores s
+                        WHERE s.user_id = users.id AND s.standard_score IS NOT NULL), 0)
+                WHERE id IN ({in_clause})
+            """), params).rowcount
+            record_changes(db, "users", [(user_id, None, user_id) for user_id in chunk])
+
+    with span("bulk_team_scores", matches=len(match_ids)):
+        for chunk in _chunks(match_ids):
+            params = {f"m{i}": match_id for i, match_id in enumerate(chunk)}
+            in_clause = ", ".join(f":{name}" for name in params)
+            result["teams"] += db.execute(text(f"""
+                UPDATE match_teams
+                SET total_score = CAST(COALESCE((
+                        SELECT SUM(s.points * COALESCE(mg.multiplier, 1.0))
+                        FROM scores s JOIN match_games mg ON s.match_game_id = mg.id
+                        WHERE s.match_team_id = match_teams.id), 0) AS INTEGER),
+                    games_played = (
+                        SELECT COUNT(DISTINCT s.match_game_id) FROM scores s
+                        WHERE s.match_team_id = match_teams.id)
+                WHERE match_id IN ({in_clause})
+            """), params).rowcount
+            db.execute(text(f"""
+                UPDATE match_teams
+                SET team_rank = ranked.team_rank
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY match_id ORDER BY total_score DESC, id) AS team_rank
+                    FROM match_teams
+                    WHERE match_id IN ({in_clause})
+                ) AS ranked
+                WHERE match_teams.id = ranked.id
+            """), params)
+            record_changes(db, "match_teams", db.execute(text(
+                f"SELECT id, match_id, NULL FROM match_teams WHERE match_id IN ({in_clause})"), params).all())
+
+    mark_changed(
+        db, "leaderboard", "users",
+        *(f"match_game:{mg_id}" for mg_id in match_game_ids),
+        *(f"match:{match_id}" for match_id in match_ids),
+        *(f"user:{user_id}" for user_id in user_ids),
+    )
+    db.commit()
+
+    from app.modules.users.crud import update_all_user_levels
+    result["levels"] = update_all_user_levels(db)
+    return result
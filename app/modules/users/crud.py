@@ -1,9 +1,18 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, desc, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Optional, Dict, Any, List
 
 from . import models, schemas
 from app.modules.matches import models as match_models
+from app.core.cache import RowCache
+from app.core.config import settings
+from app.core.tracing import traced
+from app.core.versions import data_versions, mark_changed
+from app.modules.changes.crud import record_changes
+
+# 精简玩家行缓存，按 user:{id} 的数据版本失效
+user_row_cache = RowCache("users", settings.USER_ROW_CACHE_SIZE)
 
 
 def get_user(db: Session, user_id: int):
@@ -12,196 +21,281 @@ def get_user(db: Session, user_id: int):
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
-def get_user_game_level_and_progress(db: Session, user_id: int, game_code: str, avg_standard_score: float) -> tuple[str, float]:
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100):
     """
-    基于游戏内排名计算用户在指定游戏中的等级和进度
-    
-    Args:
-        db: 数据库会话
-        user_id: 用户ID
-        game_code: 游戏代码
-        avg_standard_score: 用户在该游戏的平均标准分
-        
+    与 get_users 相同的结果，直接查询列（不构造 ORM 对象），字段顺序与 schemas.User 一致
+
+    win_rate / average_score 与 User 模型上的同名属性计算方式一致。
+    """
+    User = models.User
+    rows = db.execute(
+        select(
+            User.nickname, User.display_name, User.source, User.id,
+            User.total_matches, User.total_wins, User.total_points,
+            User.total_standard_score, User.average_standard_score,
+            User.created_at, User.last_active, User.game_level, User.level_progress,
+        ).offset(skip).limit(limit)
+    )
+    users = []
+    for (nickname, display_name, source, user_id, total_matches, total_wins, total_points,
+         total_standard_score, average_standard_score, created_at, last_active,
+         game_level, level_progress) in rows:
+        users.append({
+            "nickname": nickname, "display_name": display_name, "source": source, "id": user_id,
+            "total_matches": total_matches, "total_wins": total_wins, "total_points": total_points,
+            "total_standard_score": total_standard_score, "average_standard_score": average_standard_score,
+            "created_at": created_at, "last_active": last_active,
+            "win_rate": round(total_wins / total_matches * 100, 2) if total_matches else 0.0,
+            "average_score": round(total_points / total_matches, 2) if total_matches else 0.0,
+            "game_level": game_level, "level_progress": level_progress,
+        })
+    return users
+
+def get_compact_user_rows(db: Session, user_ids) -> dict:
+    """
+    按ID批量读取精简玩家信息（字段与 schemas.UserCompact 一致）
+
+    数据版本未变化的行直接取自 user_row_cache，其余的用一条 IN 查询读取。
+
     Returns:
-        tuple[str, float]: (等级, 进度百分比)
+        dict: {玩家ID: 行}，按传入顺序排列，不存在的玩家不出现在结果中
     """
-    from app.modules.games import models as game_models
-    from app.modules.matches import models as match_models
-    
-    # 获取该游戏的所有用户，按平均标准分排序
-    all_users_in_game = db.query(
-        models.User.id,
-        func.avg(match_models.Score.standard_score).label('avg_standard_score')
-    ).join(
-        match_models.Score, models.User.id == match_models.Score.user_id
-    ).join(
-        match_models.MatchGame, match_models.Score.match_game_id == match_models.MatchGame.id
-    ).join(
-        game_models.Game, match_models.MatchGame.game_id == game_models.Game.id
-    ).filter(
-        game_models.Game.code == game_code,
-        match_models.Score.standard_score.isnot(None)
-    ).group_by(
-        models.User.id
-    ).order_by(
-        desc(func.avg(match_models.Score.standard_score))
-    ).all()
-    
-    if not all_users_in_game:
-        return 'D', 0.0
-    
-    total_users_in_game = len(all_users_in_game)
-    
-    # 找到当前用户在该游戏中的排名
-    current_rank = None
-    for i, (uid, score) in enumerate(all_users_in_game):
-        if uid == user_id:
-            current_rank = i + 1
-            break
-    
-    if current_rank is None:
-        return 'D', 0.0
-    
-    # 基于排名百分比计算等级（游戏内排名）
-    if current_rank <= max(1, total_users_in_game * 0.1):  # 前10%
+    user_ids = list(dict.fromkeys(user_ids))
+    versions = {user_id: data_versions.version(f"user:{user_id}") for user_id in user_ids}
+    found, missing = {}, []
+    for user_id in user_ids:
+        row = user_row_cache.get(user_id, versions[user_id])
+        if row is None:
+            missing.append(user_id)
+        else:
+            found[user_id] = row
+
+    if missing:
+        User = models.User
+        columns = [getattr(User, name) for name in schemas.UserCompact.model_fields]
+        for start in range(0, len(missing), 500):
+            rows = db.execute(select(*columns).where(User.id.in_(missing[start:start + 500])))
+            for row in rows:
+                row = dict(row._mapping)
+                user_row_cache.set(row["id"], versions[row["id"]], row)
+                found[row["id"]] = row
+
+    return {user_id: found[user_id] for user_id in user_ids if user_id in found}
+
+def _rank_level_and_progress(current_rank: int, total_users: int) -> tuple[str, float]:
+    """基于排名百分比计算等级和等级内进度"""
+    if current_rank <= max(1, total_users * 0.1):  # 前10%
         level = 'S'
-        s_users = max(1, int(total_users_in_game * 0.1))
+        s_users = max(1, int(total_users * 0.1))
         progress = ((s_users - (current_rank - 1)) / s_users) * 100
-    elif current_rank <= max(1, total_users_in_game * 0.3):  # 前11%-30%
+    elif current_rank <= max(1, total_users * 0.3):  # 前11%-30%
         level = 'A'
-        a_start = max(1, int(total_users_in_game * 0.1)) + 1
-        a_end = max(1, int(total_users_in_game * 0.3))
+        a_start = max(1, int(total_users * 0.1)) + 1
+        a_end = max(1, int(total_users * 0.3))
         a_size = a_end - a_start + 1
         progress = ((a_end - current_rank + 1) / a_size) * 100
-    elif current_rank <= max(1, total_users_in_game * 0.6):  # 前31%-60%
+    elif current_rank <= max(1, total_users * 0.6):  # 前31%-60%
         level = 'B'
-        b_start = max(1, int(total_users_in_game * 0.3)) + 1
-        b_end = max(1, int(total_users_in_game * 0.6))
+        b_start = max(1, int(total_users * 0.3)) + 1
+        b_end = max(1, int(total_users * 0.6))
         b_size = b_end - b_start + 1
         progress = ((b_end - current_rank + 1) / b_size) * 100
-    elif current_rank <= max(1, total_users_in_game * 0.9):  # 前61%-90%
+    elif current_rank <= max(1, total_users * 0.9):  # 前61%-90%
         level = 'C'
-        c_start = max(1, int(total_users_in_game * 0.6)) + 1
-        c_end = max(1, int(total_users_in_game * 0.9))
+        c_start = max(1, int(total_users * 0.6)) + 1
+        c_end = max(1, int(total_users * 0.9))
         c_size = c_end - c_start + 1
         progress = ((c_end - current_rank + 1) / c_size) * 100
     else:  # 后10%
         level = 'D'
-        d_start = max(1, int(total_users_in_game * 0.9)) + 1
-        d_size = total_users_in_game - d_start + 1
-        progress = ((total_users_in_game - current_rank + 1) / d_size) * 100
-    
+        d_start = max(1, int(total_users * 0.9)) + 1
+        d_size = total_users - d_start + 1
+        progress = ((total_users - current_rank + 1) / d_size) * 100
+
     return level, round(progress, 1)
 
-def get_user_stats(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
-    """获取玩家详细统计信息"""
+def get_user_game_levels(db: Session, user_id: int, game_codes) -> Dict[str, tuple]:
+    """
+    基于游戏内排名计算用户在多个游戏中的等级和进度
+
+    一条分组查询取出这些游戏中所有用户的平均标准分，在内存中排名。
+
+    Returns:
+        Dict[str, tuple]: 游戏代码 -> (等级, 进度百分比)；用户在该游戏没有标准分时为 ('D', 0.0)
+    """
+    from app.modules.games import models as game_models
+
+    game_codes = list(game_codes)
+    if not game_codes:
+        return {}
+
+    avg_score = func.avg(match_models.Score.standard_score)
+    rows = db.query(
+        game_models.Game.code,
+        match_models.Score.user_id,
+    ).join(
+        match_models.MatchGame, match_models.Score.match_game_id == match_models.MatchGame.id
+    ).join(
+        game_models.Game, match_models.MatchGame.game_id == game_models.Game.id
+    ).filter(
+        game_models.Game.code.in_(game_codes),
+        match_models.Score.standard_score.isnot(None)
+    ).group_by(
+        game_models.Game.code, match_models.Score.user_id
+    ).order_by(
+        game_models.Game.code, desc(avg_score), match_models.Score.user_id
+    ).all()
+
+    # 每个游戏的用户按平均标准分降序排列
+    ranked: Dict[str, list] = {}
+    for code, uid in rows:
+        ranked.setdefault(code, []).append(uid)
+
+    levels = {}
+    for code in game_codes:
+        users_in_game = ranked.get(code, [])
+        if user_id not in users_in_game:
+            levels[code] = ('D', 0.0)
+            continue
+        levels[code] = _rank_level_and_progress(users_in_game.index(user_id) + 1, len(users_in_game))
+    return levels
+
+def get_user_game_level_and_progress(db: Session, user_id: int, game_code: str, avg_standard_score: float) -> tuple[str, float]:
+    """
+    基于游戏内排名计算用户在指定游戏中的等级和进度
+    
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+        game_code: 游戏代码
+        avg_standard_score: 用户在该游戏的平均标准分
+        
+    Returns:
+        tuple[str, float]: (等级, 进度百分比)
+    """
+    return get_user_game_levels(db, user_id, [game_code])[game_code]
+
+# 玩家统计中可按 fields 选择的部分（user 始终返回）
+USER_STATS_SECTIONS = (
+    "score_timeline", "score_timeline_by_game", "current_team", "historical_teams",
+    "match_history", "recent_scores", "game_scores",
+)
+# 排行榜行中始终返回的字段
+LEADERBOARD_KEY_FIELDS = ("rank", "user_id")
+# 综合排行榜 / 单游戏排行榜行中可按 fields 选择的字段
+LEADERBOARD_FIELDS = (
+    "nickname", "display_name", "average_standard_score", "total_standard_score", "game_level",
+    "level_progress", "total_matches", "total_games_played", "best_game", "game_count",
+)
+GAME_LEADERBOARD_FIELDS = (
+    "nickname", "display_name", "average_standard_score", "total_standard_score", "game_level",
+    "level_progress", "games_played", "total_raw_score", "average_raw_score", "game_code", "game_name",
+)
+# 需要逐个玩家查询 get_user_game_stats 才能得到的字段
+_GAME_STATS_FIELDS = frozenset({"total_games_played", "best_game", "game_count"})
+
+
+def _select_fields(row: dict, fields) -> dict:
+    """只保留 fields 中的字段（以及排名、玩家ID），fields 为 None 时原样返回"""
+    if fields is None:
+        return row
+    return {key: value for key, value in row.items() if key in fields or key in LEADERBOARD_KEY_FIELDS}
+
+def _user_team_totals(db: Session, user_id: int, match_ids) -> Dict[int, list]:
+    """
+    玩家在各比赛中按队伍分组的得分和参赛场次（一条分组查询）
+
+    Returns:
+        Dict[int, list]: 比赛ID -> [(队伍名, 总分, 参赛场次)]，按队伍ID排序；没有分数的比赛不出现
+    """
+    if not match_ids:
+        return {}
+    rows = db.query(
+        match_models.MatchGame.match_id,
+        match_models.MatchTeam.name,
+        func.sum(match_models.Score.points),
+        func.count(func.distinct(match_models.Score.match_game_id)),
+    ).join(
+        match_models.MatchGame, match_models.Score.match_game_id == match_models.MatchGame.id
+    ).outerjoin(
+        match_models.MatchTeam, match_models.Score.match_team_id == match_models.MatchTeam.id
+    ).filter(
+        match_models.Score.user_id == user_id,
+        match_models.MatchGame.match_id.in_(match_ids),
+        match_models.Score.match_team_id.isnot(None)
+    ).group_by(
+        match_models.MatchGame.match_id, match_models.Score.match_team_id
+    ).order_by(match_models.Score.match_team_id).all()
+
+    totals: Dict[int, list] = {}
+    for match_id, team_name, points, games_played in rows:
+        totals.setdefault(match_id, []).append((team_name or "未知队伍", int(points or 0), int(games_played or 0)))
+    return totals
+
+@traced()
+def get_user_stats(db: Session, user_id: int, fields=None) -> Optional[Dict[str, Any]]:
+    """
+    获取玩家详细统计信息
+
+    fields 为 USER_STATS_SECTIONS 的子集时只计算这些部分（其余部分不查询、不出现在结果中），
+    为 None 时返回全部。
+    """
+    def wanted(section):
+        return fields is None or section in fields
+
     try:
         user = db.query(models.User).filter(models.User.id == user_id).first()
         if not user:
             return None
         
-        # 查询玩家的得分记录来计算游戏统计
-        scores = db.query(match_models.Score).filter(match_models.Score.user_id == user_id).all()
-        
-        # 按游戏类型统计得分 - 使用游戏代码而不是名称
-        game_scores = {}
-        for score in scores:
-            if not score.match_game or not score.match_game.game:
-                continue
-                
-            game_code = score.match_game.game.code
-            if game_code not in game_scores:
-                game_scores[game_code] = {
-                    "total_score": 0,
-                    "total_standard_score": 0.0,
-                    "games_played": 0,
-                    "game_name": score.match_game.game.name  # 保留游戏名称用于显示
-                }
-            game_scores[game_code]["total_score"] += score.points
-            game_scores[game_code]["total_standard_score"] += (score.standard_score or 0.0)
-            game_scores[game_code]["games_played"] += 1
-        
-        # 计算每个游戏的平均标准分和等级
-        for game_code in game_scores:
-            avg_standard_score = (game_scores[game_code]["total_standard_score"] / 
-                                 game_scores[game_code]["games_played"]) if game_scores[game_code]["games_played"] > 0 else 0
-            game_scores[game_code]["average_standard_score"] = round(avg_standard_score, 2)
-            
-            # 基于游戏内排名计算等级和进度
-            if avg_standard_score > 0:
-                level, progress = get_user_game_level_and_progress(db, user_id, game_code, avg_standard_score)
-                game_scores[game_code]["level"] = level
-                game_scores[game_code]["level_progress"] = progress
-            else:
-                game_scores[game_code]["level"] = 'D'
-                game_scores[game_code]["level_progress"] = 0.0
+        # 按游戏类型统计得分 - 使用游戏代码而不是名称（一条分组查询）
+        game_scores = get_user_game_stats(db, user_id) if wanted("game_scores") else {}
+
+        # 基于游戏内排名计算等级和进度（所有游戏共用一条排名查询）
+        levels = get_user_game_levels(
+            db, user_id, [code for code, stats in game_scores.items() if stats["average_standard_score"] > 0]
+        )
+        for game_code, stats in game_scores.items():
+            stats["level"], stats["level_progress"] = levels.get(game_code, ('D', 0.0))
         
         # 查询比赛历史 - 改为按队伍分组，避免同一比赛不同队的分数被合并
         match_history = []
         try:
-            user_matches = db.query(match_models.Match).join(
-                match_models.MatchTeam, match_models.Match.id == match_models.MatchTeam.match_id
-            ).join(
-                match_models.MatchTeamMembership,
-                match_models.MatchTeam.id == match_models.MatchTeamMembership.match_team_id
-            ).filter(
-                match_models.MatchTeamMembership.user_id == user_id
-            ).distinct().limit(10).all()  # 限制数量避免过多查询
+            user_matches = []
+            if wanted("match_history"):
+                user_matches = db.query(match_models.Match).join(
+                    match_models.MatchTeam, match_models.Match.id == match_models.MatchTeam.match_id
+                ).join(
+                    match_models.MatchTeamMembership,
+                    match_models.MatchTeam.id == match_models.MatchTeamMembership.match_team_id
+                ).filter(
+                    match_models.MatchTeamMembership.user_id == user_id
+                ).distinct().limit(10).all()  # 限制数量避免过多查询
 
+            team_totals = _user_team_totals(db, user_id, [match.id for match in user_matches])
             for match in user_matches:
-                try:
-                    match_game_ids = [mg.id for mg in match.match_games]
-                    if not match_game_ids:
-                        continue
-
-                    # 找到该用户在这场比赛中产生分数的所有队伍ID
-                    team_ids = db.query(match_models.Score.match_team_id).filter(
-                        match_models.Score.user_id == user_id,
-                        match_models.Score.match_game_id.in_(match_game_ids)
-                    ).distinct().all()
-                    team_ids = [tid[0] for tid in team_ids if tid[0] is not None]
-
-                    # 若没有找到队伍ID，跳过该比赛
-                    if not team_ids:
-                        continue
-
-                    for team_id in team_ids:
-                        # 计算该玩家在这场比赛、且属于该队伍时的得分与参赛场次
-                        team_points = db.query(func.sum(match_models.Score.points)).filter(
-                            match_models.Score.user_id == user_id,
-                            match_models.Score.match_game_id.in_(match_game_ids),
-                            match_models.Score.match_team_id == team_id
-                        ).scalar() or 0
-
-                        team_games_played = db.query(func.count(func.distinct(match_models.Score.match_game_id))).filter(
-                            match_models.Score.user_id == user_id,
-                            match_models.Score.match_game_id.in_(match_game_ids),
-                            match_models.Score.match_team_id == team_id
-                        ).scalar() or 0
-
-                        team_name = db.query(match_models.MatchTeam.name).filter(
-                            match_models.MatchTeam.id == team_id
-                        ).scalar() or "未知队伍"
-
-                        match_history.append({
-                            "match_id": match.id,
-                            "match_name": match.name,
-                            "total_points": int(team_points),
-                            "games_played": int(team_games_played),
-                            "team_name": team_name
-                        })
-                except Exception as match_error:
-                    print(f"Error processing match {match.id}: {match_error}")
-                    continue
+                for team_name, team_points, team_games_played in team_totals.get(match.id, []):
+                    match_history.append({
+                        "match_id": match.id,
+                        "match_name": match.name,
+                        "total_points": team_points,
+                        "games_played": team_games_played,
+                        "team_name": team_name
+                    })
         except Exception as matches_error:
             print(f"Error querying matches: {matches_error}")
         
         # 查询最近得分记录
         recent_scores_data = []
         try:
-            recent_scores = db.query(match_models.Score).filter(
-                match_models.Score.user_id == user_id
-            ).order_by(desc(match_models.Score.recorded_at)).limit(10).all()
+            recent_scores = []
+            if wanted("recent_scores"):
+                recent_scores = db.query(match_models.Score).options(
+                    joinedload(match_models.Score.match_game).joinedload(match_models.MatchGame.game),
+                    joinedload(match_models.Score.team)
+                ).filter(
+                    match_models.Score.user_id == user_id
+                ).order_by(desc(match_models.Score.recorded_at)).limit(10).all()
             
             for score in recent_scores:
                 try:
@@ -217,7 +311,11 @@ def get_user_stats(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
         except Exception as scores_error:
             print(f"Error querying recent scores: {scores_error}")
         
-        return {
+        team_history = None
+        if wanted("current_team") or wanted("historical_teams"):
+            team_history = _user_team_history(db, user.id)
+
+        stats = {
             "user": {
                 "id": user.id,
                 "nickname": user.nickname,
@@ -229,20 +327,25 @@ def get_user_stats(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
             },
             # 新增：按时间序列的标准分趋势（用于前端画折线图）
             # 格式：[{"match_id": x, "match_name": y, "timestamp": iso, "avg_standard_score": v, "rank_change": d_rank, "score_delta": d_score}]
-            "score_timeline": get_user_score_timeline(db, user.id),
+            "score_timeline": get_user_score_timeline(db, user.id) if wanted("score_timeline") else [],
             # 新增：按游戏分类的趋势数据
-            "score_timeline_by_game": get_user_score_timeline_by_game(db, user.id),
-            "current_team": None,  # 使用下面的 get_user_team_history 函数
-            "historical_teams": [],  # 使用下面的 get_user_team_history 函数
+            "score_timeline_by_game": get_user_score_timeline_by_game(db, user.id) if wanted("score_timeline_by_game") else {},
+            # 当前队伍取最近加入的、比赛仍在筹备中 / 进行中的队伍
+            "current_team": next(iter(team_history["current_teams"]), None) if team_history else None,
+            "historical_teams": team_history["historical_teams"] if team_history else [],
             "match_history": match_history,
             "recent_scores": recent_scores_data,
             "game_scores": game_scores
         }
+        if fields is not None:
+            stats = {key: value for key, value in stats.items() if key == "user" or key in fields}
+        return stats
     except Exception as e:
         # 记录错误但不抛出，避免影响整个请求
         print(f"Error in get_user_stats: {e}")
         return None
 
+@traced()
 def get_user_match_history(db: Session, user_id: int, skip: int = 0, limit: int = 50):
     """获取玩家历史比赛记录（按队伍分组）"""
     user_matches = db.query(match_models.Match).join(
@@ -253,48 +356,61 @@ def get_user_match_history(db: Session, user_id: int, skip: int = 0, limit: int
         match_models.MatchTeamMembership.user_id == user_id
     ).order_by(desc(match_models.Match.created_at)).offset(skip).limit(limit).distinct().all()
 
+    team_totals = _user_team_totals(db, user_id, [match.id for match in user_matches])
     match_history = []
     for match in user_matches:
-        match_game_ids = [mg.id for mg in match.match_games]
-        if not match_game_ids:
-            continue
-
-        # 找到该用户在这场比赛中产生分数的所有队伍ID
-        team_ids = db.query(match_models.Score.match_team_id).filter(
-            match_models.Score.user_id == user_id,
-            match_models.Score.match_game_id.in_(match_game_ids)
-        ).distinct().all()
-        team_ids = [tid[0] for tid in team_ids if tid[0] is not None]
-
-        for team_id in team_ids:
-            match_scores = db.query(func.sum(match_models.Score.points)).filter(
-                match_models.Score.user_id == user_id,
-                match_models.Score.match_game_id.in_(match_game_ids),
-                match_models.Score.match_team_id == team_id
-            ).scalar() or 0
-
-            games_played = db.query(func.count(func.distinct(match_models.Score.match_game_id))).filter(
-                match_models.Score.user_id == user_id,
-                match_models.Score.match_game_id.in_(match_game_ids),
-                match_models.Score.match_team_id == team_id
-            ).scalar() or 0
-
-            team_name = db.query(match_models.MatchTeam.name).filter(
-                match_models.MatchTeam.id == team_id
-            ).scalar() or "未知队伍"
-
+        for team_name, match_scores, games_played in team_totals.get(match.id, []):
             match_history.append({
                 "match_id": match.id,
                 "match_name": match.name,
                 "status": match.status.value,
-                "total_points": int(match_scores),
-                "games_played": int(games_played),
+                "total_points": match_scores,
+                "games_played": games_played,
                 "created_at": match.created_at.isoformat(),
                 "team_name": team_name
             })
 
     return match_history
 
+def _ranked_averages(db: Session, match_ids, *group_columns) -> Dict[Any, list]:
+    """
+    比赛内各选手的平均标准分（一条分组查询）
+
+    Args:
+        match_ids: 比赛ID
+        group_columns: 分组列（比赛ID，或比赛ID + 游戏ID）
+
+    Returns:
+        Dict[Any, list]: 分组键（单列时为该列的值，否则为元组）-> [(玩家ID, 平均标准分)]，按平均标准分降序
+    """
+    if not match_ids:
+        return {}
+    avg_score = func.avg(match_models.Score.standard_score)
+    rows = db.query(
+        *group_columns, match_models.Score.user_id, avg_score
+    ).join(
+        match_models.MatchGame, match_models.Score.match_game_id == match_models.MatchGame.id
+    ).filter(
+        match_models.MatchGame.match_id.in_(match_ids),
+        match_models.Score.standard_score.isnot(None)
+    ).group_by(*group_columns, match_models.Score.user_id).order_by(
+        *group_columns, desc(avg_score), match_models.Score.user_id  # 平均分相同时按玩家ID，名次稳定
+    ).all()
+
+    ranked: Dict[Any, list] = {}
+    for row in rows:
+        key = row[0] if len(group_columns) == 1 else tuple(row[:len(group_columns)])
+        ranked.setdefault(key, []).append((row[-2], row[-1]))
+    return ranked
+
+def _user_average_and_rank(ranked: list, user_id: int) -> tuple:
+    """从 _ranked_averages 的一组结果中取出玩家的平均标准分（没有时为 0.0）和名次（没有时为 None）"""
+    for i, (uid, avg_score) in enumerate(ranked, start=1):
+        if uid == user_id:
+            return avg_score or 0.0, i
+    return 0.0, None
+
+@traced()
 def get_user_score_timeline(db: Session, user_id: int):
     """生成用户跨比赛的标准分时间序列，并计算相邻两站的排名变化和标准分增量。
     规则：以每场比赛所有赛程的平均标准分为该站成绩，再与上一站对比输出 rank_change 与 score_delta。
@@ -308,37 +424,21 @@ def get_user_score_timeline(db: Session, user_id: int):
         match_models.MatchTeam.id == match_models.MatchTeamMembership.match_team_id
     ).filter(
         match_models.MatchTeamMembership.user_id == user_id
+    ).options(
+        selectinload(match_models.Match.match_games)
     ).order_by(match_models.Match.start_time.asc().nulls_last(), match_models.Match.created_at.asc()).all()
 
+    # 所有比赛中各选手的平均标准分（一条分组查询，每场比赛内按平均标准分降序）
+    ranked = _ranked_averages(db, [m.id for m in matches if m.match_games], match_models.MatchGame.match_id)
+
     timeline = []
     prev_avg = None
     prev_rank = None
     for m in matches:
-        match_game_ids = [mg.id for mg in m.match_games]
-        if not match_game_ids:
+        if not m.match_games:
             continue
-        # 本站用户平均标准分
-        avg_score = db.query(func.avg(match_models.Score.standard_score)).filter(
-            match_models.Score.user_id == user_id,
-            match_models.Score.match_game_id.in_(match_game_ids),
-            match_models.Score.standard_score.isnot(None)
-        ).scalar() or 0.0
-
-        # 计算本站全部选手排行中的名次（按平均标准分）
-        ranks = db.query(
-            match_models.Score.user_id,
-            func.avg(match_models.Score.standard_score).label('avg_s')
-        ).filter(
-            match_models.Score.match_game_id.in_(match_game_ids),
-            match_models.Score.standard_score.isnot(None)
-        ).group_by(match_models.Score.user_id).order_by(func.avg(match_models.Score.standard_score).desc()).all()
-
-        # 找到当前用户在本站的名次
-        current_rank = None
-        for i, (uid, _) in enumerate(ranks, start=1):
-            if uid == user_id:
-                current_rank = i
-                break
+        # 本站用户平均标准分，以及在本站全部选手排行中的名次（按平均标准分）
+        avg_score, current_rank = _user_average_and_rank(ranked.get(m.id, []), user_id)
 
         # 计算变化
         score_delta = None if prev_avg is None else round(float(avg_score) - float(prev_avg), 2)
@@ -359,6 +459,7 @@ def get_user_score_timeline(db: Session, user_id: int):
 
     return timeline
 
+@traced()
 def get_user_score_timeline_by_game(db: Session, user_id: int):
     """生成用户分游戏的标准分时间序列。
     返回 { game_code: [{ match_id, match_name, timestamp, avg_standard_score, rank, rank_change, score_delta, game_name }] }
@@ -366,8 +467,9 @@ def get_user_score_timeline_by_game(db: Session, user_id: int):
     from app.modules.matches import models as match_models
     from app.modules.games import models as game_models
 
-    # 找出该用户有分数的所有游戏（code、name）
+    # 找出该用户有分数的所有游戏（id、code、name）
     game_rows = db.query(
+        game_models.Game.id.label('id'),
         game_models.Game.code.label('code'),
         game_models.Game.name.label('name')
     ).join(
@@ -378,50 +480,39 @@ def get_user_score_timeline_by_game(db: Session, user_id: int):
         match_models.Score.user_id == user_id,
         match_models.Score.standard_score.isnot(None)
     ).distinct().all()
+    if not game_rows:
+        return {}
 
-    result: Dict[str, Any] = {}
+    # 用户参与过这些游戏的所有（比赛, 游戏），按比赛时间升序
+    match_rows = db.query(
+        match_models.Match, match_models.MatchGame.game_id
+    ).join(
+        match_models.MatchGame, match_models.Match.id == match_models.MatchGame.match_id
+    ).join(
+        match_models.Score, match_models.Score.match_game_id == match_models.MatchGame.id
+    ).filter(
+        match_models.Score.user_id == user_id,
+        match_models.MatchGame.game_id.in_([row.id for row in game_rows])
+    ).order_by(match_models.Match.start_time.asc().nulls_last(), match_models.Match.created_at.asc()).distinct().all()
+
+    matches_by_game: Dict[int, list] = {}
+    for m, game_id in match_rows:
+        matches_by_game.setdefault(game_id, []).append(m)
 
-    for code, name in game_rows:
-        # 用户参与过该游戏的所有比赛（按时间升序）
-        matches = db.query(match_models.Match).join(
-            match_models.MatchGame, match_models.Match.id == match_models.MatchGame.match_id
-        ).join(
-            match_models.Score, match_models.Score.match_game_id == match_models.MatchGame.id
-        ).filter(
-            match_models.Score.user_id == user_id,
-            match_models.MatchGame.game.has(code=code)
-        ).order_by(match_models.Match.start_time.asc().nulls_last(), match_models.Match.created_at.asc()).distinct().all()
+    # 各站各游戏下全部选手的平均标准分（一条分组查询）
+    ranked = _ranked_averages(
+        db, list({m.id for m, _ in match_rows}), match_models.MatchGame.match_id, match_models.MatchGame.game_id
+    )
 
+    result: Dict[str, Any] = {}
+
+    for game_id, code, name in game_rows:
         prev_avg = None
         prev_rank = None
         timeline_items = []
-        for m in matches:
-            # 该比赛中，该游戏的赛程ID集合（通常一个）
-            mg_ids = [mg.id for mg in m.match_games if mg.game and mg.game.code == code]
-            if not mg_ids:
-                continue
-
-            # 本站该游戏下的平均标准分
-            avg_score = db.query(func.avg(match_models.Score.standard_score)).filter(
-                match_models.Score.user_id == user_id,
-                match_models.Score.match_game_id.in_(mg_ids),
-                match_models.Score.standard_score.isnot(None)
-            ).scalar() or 0.0
-
-            # 站内该游戏的名次（按平均标准分）
-            ranks = db.query(
-                match_models.Score.user_id,
-                func.avg(match_models.Score.standard_score).label('avg_s')
-            ).filter(
-                match_models.Score.match_game_id.in_(mg_ids),
-                match_models.Score.standard_score.isnot(None)
-            ).group_by(match_models.Score.user_id).order_by(func.avg(match_models.Score.standard_score).desc()).all()
-
-            current_rank = None
-            for i, (uid, _) in enumerate(ranks, start=1):
-                if uid == user_id:
-                    current_rank = i
-                    break
+        for m in matches_by_game.get(game_id, []):
+            # 本站该游戏下的平均标准分和站内名次（按平均标准分）
+            avg_score, current_rank = _user_average_and_rank(ranked.get((m.id, game_id), []), user_id)
 
             score_delta = None if prev_avg is None else round(float(avg_score) - float(prev_avg), 2)
             rank_change = None if prev_rank is None or current_rank is None else (prev_rank - current_rank)
@@ -444,12 +535,21 @@ def get_user_score_timeline_by_game(db: Session, user_id: int):
 
     return result
 
+@traced()
 def get_user_team_history(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
     """获取玩家队伍历史 - 新版本基于比赛队伍"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         return None
-    
+    return _user_team_history(db, user_id)
+
+def _user_team_history(db: Session, user_id: int) -> Dict[str, Any]:
+    """
+    玩家所在的比赛队伍（一条查询），按加入时间从新到旧排列
+
+    Returns:
+        Dict: current_teams（比赛筹备中 / 进行中）、historical_teams（其余比赛）、total_teams
+    """
     # 查询玩家参与的所有比赛队伍
     memberships = db.query(match_models.MatchTeamMembership).join(
         match_models.MatchTeam
@@ -457,9 +557,12 @@ def get_user_team_history(db: Session, user_id: int) -> Optional[Dict[str, Any]]
         match_models.Match, match_models.MatchTeam.match_id == match_models.Match.id
     ).filter(
         match_models.MatchTeamMembership.user_id == user_id
+    ).options(
+        joinedload(match_models.MatchTeamMembership.team).joinedload(match_models.MatchTeam.match)
     ).all()
     
     teams_info = []
+    match_status = {}
     for membership in memberships:
         team_info = {
             "id": membership.team.id,
@@ -471,6 +574,7 @@ def get_user_team_history(db: Session, user_id: int) -> Optional[Dict[str, Any]]
             "join_date": membership.joined_at.isoformat() if membership.joined_at else None
         }
         teams_info.append(team_info)
+        match_status[membership.team.match_id] = membership.team.match.status
     
     # 按照加入时间排序，最新的在前
     teams_info.sort(key=lambda x: x['join_date'] or '', reverse=True)
@@ -480,12 +584,8 @@ def get_user_team_history(db: Session, user_id: int) -> Optional[Dict[str, Any]]
     historical_teams = []
     
     for team in teams_info:
-        # 判断比赛是否还在进行中
-        match = db.query(match_models.Match).filter(
-            match_models.Match.id == team['match_id']
-        ).first()
-        
-        if match and match.status in [match_models.MatchStatus.PREPARING, match_models.MatchStatus.ONGOING]:
+        # 判断比赛是否还在进行中（比赛已随队伍预加载）
+        if match_status.get(team['match_id']) in [match_models.MatchStatus.PREPARING, match_models.MatchStatus.ONGOING]:
             current_teams.append(team)
         else:
             historical_teams.append(team)
@@ -507,6 +607,61 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+def _user_ids_by_nickname(db: Session, nicknames: list) -> dict:
+    found = {}
+    for start in range(0, len(nicknames), 500):
+        found.update(db.execute(
+            select(models.User.nickname, models.User.id)
+            .where(models.User.nickname.in_(nicknames[start:start + 500]))
+        ).all())
+    return found
+
+@traced()
+def create_users_bulk(db: Session, users: List[schemas.UserCreate]) -> List[Dict[str, Any]]:
+    """
+    批量 get-or-create 玩家
+
+    已有昵称用一条 IN 查询解析，缺少的用一次批量 INSERT ... ON CONFLICT(nickname) DO NOTHING 写入，
+    与其他进程同时创建同一昵称时以唯一索引为准，不会重复也不会报错。
+
+    Returns:
+        List[Dict]: 按输入顺序的 {"nickname", "id", "created"}，同一昵称重复出现时 created 只在第一次为 True
+    """
+    nicknames = list(dict.fromkeys(user.nickname for user in users))
+    user_ids = _user_ids_by_nickname(db, nicknames)
+
+    new_users = {}
+    for user in users:
+        if user.nickname not in user_ids and user.nickname not in new_users:
+            new_users[user.nickname] = user
+
+    created = {}
+    if new_users:
+        stmt = sqlite_insert(models.User).on_conflict_do_nothing(index_elements=["nickname"])
+        result = db.execute(
+            stmt.returning(models.User.id, models.User.nickname),
+            [{"nickname": u.nickname, "display_name": u.display_name, "source": u.source} for u in new_users.values()],
+        )
+        created = {nickname: user_id for user_id, nickname in result}
+        # 被其他写入者抢先创建的昵称没有返回行，重新查询
+        user_ids.update(created)
+        user_ids.update(_user_ids_by_nickname(db, [n for n in new_users if n not in created]))
+        # 绕过 ORM 插入，需要手动记录变更
+        record_changes(db, "users", [(user_id, None, user_id) for user_id in created.values()], op="insert")
+        mark_changed(db, "users", *(f"user:{user_id}" for user_id in created.values()))
+        db.commit()
+
+    mappings, reported = [], set()
+    for user in users:
+        nickname = user.nickname
+        mappings.append({
+            "nickname": nickname,
+            "id": user_ids[nickname],
+            "created": nickname in created and nickname not in reported,
+        })
+        reported.add(nickname)
+    return mappings
+
 def update_user(db: Session, user_id: int, user_update: schemas.UserCreate):
     """更新用户信息"""
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -535,7 +690,8 @@ def delete_user(db: Session, user_id: int):
 
 # --- 排行榜相关函数 ---
 
-def get_leaderboard(db: Session, skip: int = 0, limit: int = 100, game_code: str = None):
+@traced()
+def get_leaderboard(db: Session, skip: int = 0, limit: int = 100, game_code: str = None, fields=None):
     """
     获取标准分排行榜
     
@@ -544,25 +700,28 @@ def get_leaderboard(db: Session, skip: int = 0, limit: int = 100, game_code: str
         skip: 跳过数量
         limit: 返回数量限制
         game_code: 游戏代码，如果指定则按该游戏的平均标准分排序
+        fields: 每行只返回这些字段（以及 rank、user_id）；不需要 total_games_played / best_game /
+                game_count 时不再逐个玩家查询游戏统计。None 表示全部字段
         
     Returns:
         List[Dict]: 排行榜数据
     """
     if game_code:
         # 按指定游戏的平均标准分排行
-        return get_game_specific_leaderboard(db, game_code, skip, limit)
+        rows = get_game_specific_leaderboard(db, game_code, skip, limit)
+        return [_select_fields(row, fields) for row in rows]
     else:
         # 按综合平均标准分排行
         users = db.query(models.User).filter(
             models.User.average_standard_score > 0
         ).order_by(desc(models.User.average_standard_score)).offset(skip).limit(limit).all()
         
+        need_game_stats = fields is None or not _GAME_STATS_FIELDS.isdisjoint(fields)
+        # 本页所有玩家的游戏统计用一条分组查询取出
+        game_stats_by_user = get_users_game_stats(db, [user.id for user in users]) if need_game_stats else {}
         leaderboard = []
         for idx, user in enumerate(users):
-            # 获取用户的游戏统计
-            game_stats = get_user_game_stats(db, user.id)
-            
-            leaderboard.append({
+            row = {
                 "rank": skip + idx + 1,
                 "user_id": user.id,
                 "nickname": user.nickname,
@@ -572,13 +731,17 @@ def get_leaderboard(db: Session, skip: int = 0, limit: int = 100, game_code: str
                 "game_level": user.game_level,  # 直接从数据库读取
                 "level_progress": round(user.level_progress, 1),  # 直接从数据库读取
                 "total_matches": user.total_matches,
-                "total_games_played": sum(stats.get('games_played', 0) for stats in game_stats.values()),
-                "best_game": get_user_best_game(game_stats),
-                "game_count": len([g for g in game_stats.values() if g.get('games_played', 0) > 0])
-            })
+            }
+            if need_game_stats:
+                game_stats = game_stats_by_user.get(user.id, {})
+                row["total_games_played"] = sum(stats.get('games_played', 0) for stats in game_stats.values())
+                row["best_game"] = get_user_best_game(game_stats)
+                row["game_count"] = len([g for g in game_stats.values() if g.get('games_played', 0) > 0])
+            leaderboard.append(_select_fields(row, fields))
         
         return leaderboard
 
+@traced()
 def get_game_specific_leaderboard(db: Session, game_code: str, skip: int = 0, limit: int = 100):
     """
     获取指定游戏的排行榜
@@ -697,40 +860,55 @@ def get_game_specific_leaderboard(db: Session, game_code: str, skip: int = 0, li
     
     return leaderboard
 
+@traced()
+def get_users_game_stats(db: Session, user_ids) -> Dict[int, Dict[str, Any]]:
+    """
+    批量获取用户的游戏统计数据（一条按玩家、游戏分组的查询）
+
+    Returns:
+        Dict[int, Dict]: 用户ID -> get_user_game_stats 的结果；没有分数的用户不出现
+    """
+    from app.modules.games import models as game_models
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    rows = db.query(
+        match_models.Score.user_id,
+        game_models.Game.code,
+        game_models.Game.name,
+        func.sum(match_models.Score.points),
+        func.sum(func.coalesce(match_models.Score.standard_score, 0.0)),
+        func.count(match_models.Score.id),
+    ).join(
+        match_models.MatchGame, match_models.Score.match_game_id == match_models.MatchGame.id
+    ).join(
+        game_models.Game, match_models.MatchGame.game_id == game_models.Game.id
+    ).filter(
+        match_models.Score.user_id.in_(user_ids)
+    ).group_by(
+        match_models.Score.user_id, game_models.Game.id
+    ).order_by(
+        # 与逐条累加时一样，按玩家第一次在该游戏得分的顺序排列
+        match_models.Score.user_id, func.min(match_models.Score.id)
+    ).all()
+
+    stats_by_user: Dict[int, Dict[str, Any]] = {}
+    for uid, game_code, game_name, total_score, total_standard_score, games_played in rows:
+        stats_by_user.setdefault(uid, {})[game_code] = {
+            "total_score": int(total_score or 0),
+            "total_standard_score": float(total_standard_score or 0.0),
+            "games_played": games_played,
+            "game_name": game_name,
+            # 计算每个游戏的平均标准分
+            "average_standard_score": round(float(total_standard_score or 0.0) / games_played, 2) if games_played > 0 else 0.0,
+        }
+    return stats_by_user
+
 def get_user_game_stats(db: Session, user_id: int):
     """获取用户的游戏统计数据"""
-    from app.modules.matches import models as match_models
-    
-    scores = db.query(match_models.Score).filter(match_models.Score.user_id == user_id).all()
-    
-    game_stats = {}
-    for score in scores:
-        if not score.match_game or not score.match_game.game:
-            continue
-            
-        game_code = score.match_game.game.code
-        if game_code not in game_stats:
-            game_stats[game_code] = {
-                "total_score": 0,
-                "total_standard_score": 0.0,
-                "games_played": 0,
-                "game_name": score.match_game.game.name
-            }
-        
-        game_stats[game_code]["total_score"] += score.points
-        game_stats[game_code]["total_standard_score"] += (score.standard_score or 0.0)
-        game_stats[game_code]["games_played"] += 1
-    
-    # 计算每个游戏的平均标准分
-    for game_code in game_stats:
-        if game_stats[game_code]["games_played"] > 0:
-            game_stats[game_code]["average_standard_score"] = round(
-                game_stats[game_code]["total_standard_score"] / game_stats[game_code]["games_played"], 2
-            )
-        else:
-            game_stats[game_code]["average_standard_score"] = 0.0
-    
-    return game_stats
+    return get_users_game_stats(db, [user_id]).get(user_id, {})
 
 def get_user_best_game(game_stats):
     """获取用户表现最好的游戏"""
@@ -753,6 +931,7 @@ def get_user_best_game(game_stats):
     
     return best_game
 
+@traced()
 def get_level_distribution(db: Session):
     """
     获取等级分布统计
@@ -832,6 +1011,7 @@ def get_available_games_for_leaderboard(db: Session):
         for game in games_with_scores
     ]
 
+@traced()
 def update_all_user_levels(db: Session):
     """
     更新所有用户的等级和进度信息
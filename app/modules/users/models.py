@@ -9,7 +9,7 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    nickname = Column(String, index=True, comment="玩家昵称")
+    nickname = Column(String, unique=True, index=True, comment="玩家昵称")
     display_name = Column(String, nullable=True, comment="显示名称")
     source = Column(String, nullable=True, comment="数据来源")
     
@@ -18,7 +18,7 @@ class User(Base):
     total_wins = Column(Integer, default=0, comment="获胜次数")
     total_points = Column(Integer, default=0, comment="总得分")
     total_standard_score = Column(Float, default=0.0, comment="总标准分")
-    average_standard_score = Column(Float, default=0.0, comment="平均标准分")
+    average_standard_score = Column(Float, default=0.0, index=True, comment="平均标准分")
     
     # 等级信息（预计算存储）
     game_level = Column(String, default='D', comment="游戏等级")
@@ -1,33 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from app.core.deps import get_db
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.core.cache import cache_response
+from app.core.config import settings
+from app.core.deps import get_read_db, run_read
+from app.core.negotiation import NegotiatedRoute, negotiate
+from app.core.versions import versioned
+from app.core.writer import write_queue
 from . import crud, models, schemas
 from app.core.security import get_api_key
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
+
+
+def _parse_fields(fields: Optional[str], allowed) -> Optional[frozenset]:
+    """解析逗号分隔的 fields 参数，不传时返回 None（全部字段）"""
+    if fields is None:
+        return None
+    selected = frozenset(name.strip() for name in fields.split(",") if name.strip())
+    unknown = selected.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"未知字段: {', '.join(sorted(unknown))}；可选: {', '.join(allowed)}",
+        )
+    return selected
 
 
 @router.post("/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
-    return crud.create_user(db=db, user=user)
+def create_user(user: schemas.UserCreate, api_key: str = Depends(get_api_key)):
+    return write_queue.run(crud.create_user, user=user)
+
+
+@router.post("/bulk", response_model=List[schemas.UserIdMapping])
+def create_users_bulk(
+    users: List[schemas.UserCreate] = Body(..., min_length=1, max_length=settings.USERS_BULK_MAX),
+    api_key: str = Depends(get_api_key),
+):
+    """批量 get-or-create 玩家，按输入顺序返回昵称到ID的映射"""
+    return write_queue.run(crud.create_users_bulk, users=users)
 
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+@versioned("users")
+async def read_users(request: Request, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)):
+    users = await db.run_sync(crud.get_user_rows, skip=skip, limit=limit)
+    return negotiate(request, users)
+
+
+# --- 批量查询接口 (必须在 /{user_id} 路由之前) ---
+
+async def _users_batch(request: Request, user_ids: List[int], db: AsyncSession):
+    users = await db.run_sync(crud.get_compact_user_rows, user_ids)
+    return negotiate(request, {
+        "users": users,
+        "missing": [user_id for user_id in dict.fromkeys(user_ids) if user_id not in users],
+    })
+
+
+@router.get("/batch", response_model=schemas.UserBatch)
+async def read_users_batch(request: Request, ids: str, db: AsyncSession = Depends(get_read_db)):
+    """
+    按ID批量查询精简玩家信息，ids 为逗号分隔的玩家ID（如 ids=1,2,3）
+
+    返回按玩家ID索引的 users 和不存在的 missing；ID 较多时使用 POST /batch。
+    """
+    try:
+        user_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids 应为逗号分隔的整数")
+    if not user_ids or len(user_ids) > settings.USERS_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"ids 数量应在 1 到 {settings.USERS_BATCH_MAX_IDS} 之间")
+    return await _users_batch(request, user_ids, db)
+
+
+@router.post("/batch", response_model=schemas.UserBatch)
+async def read_users_batch_post(request: Request, batch: schemas.UserBatchRequest,
+                                db: AsyncSession = Depends(get_read_db)):
+    """与 GET /batch 相同，ID 放在请求体中"""
+    return await _users_batch(request, batch.ids, db)
 
 
 # --- 排行榜接口 (必须在 /{user_id} 路由之前) ---
 
 @router.get("/leaderboard")
-def get_leaderboard(
+@cache_response()
+@versioned("leaderboard")
+async def get_leaderboard(
+    request: Request,
     skip: int = 0, 
     limit: int = 100, 
     game_code: str = None, 
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     获取游戏等级分排行榜
@@ -36,82 +102,101 @@ def get_leaderboard(
         skip: 跳过数量
         limit: 返回数量限制 (最大100)
         game_code: 游戏代码，如果指定则按该游戏排行，否则按综合排行
+        fields: 逗号分隔的字段列表，每行只返回这些字段（rank、user_id 始终返回），未选中的字段不计算
     
     Returns:
         排行榜数据
     """
     # 限制最大返回数量
     limit = min(limit, 100)
+    selected = _parse_fields(fields, crud.GAME_LEADERBOARD_FIELDS if game_code else crud.LEADERBOARD_FIELDS)
     
-    leaderboard = crud.get_leaderboard(db, skip=skip, limit=limit, game_code=game_code)
-    return {
+    leaderboard = await run_read(
+        db, crud.get_leaderboard, skip=skip, limit=limit, game_code=game_code, fields=selected)
+    return negotiate(request, {
         "leaderboard": leaderboard,
         "total_displayed": len(leaderboard),
         "game_code": game_code
-    }
+    })
 
 @router.get("/leaderboard/level-distribution")
-def get_level_distribution(db: Session = Depends(get_db)):
+@cache_response()
+@versioned("leaderboard")
+async def get_level_distribution(db: AsyncSession = Depends(get_read_db)):
     """获取等级分布统计"""
-    return crud.get_level_distribution(db)
+    return await db.run_sync(crud.get_level_distribution)
 
 @router.get("/leaderboard/games")
-def get_available_games_for_leaderboard(db: Session = Depends(get_db)):
+@cache_response()
+@versioned("leaderboard", "games")
+async def get_available_games_for_leaderboard(db: AsyncSession = Depends(get_read_db)):
     """获取有排行榜数据的游戏列表"""
     return {
-        "games": crud.get_available_games_for_leaderboard(db)
+        "games": await db.run_sync(crud.get_available_games_for_leaderboard)
     }
 
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, user_id=user_id)
+@versioned("user:{user_id}")
+async def read_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    db_user = await db.run_sync(crud.get_user, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 
 @router.get("/{user_id}/stats", response_model=schemas.UserStats)
-def get_user_stats(user_id: int, db: Session = Depends(get_db)):
-    """获取玩家详细统计信息，包括历史比赛数据"""
-    stats = crud.get_user_stats(db, user_id=user_id)
+@cache_response()
+@versioned("user:{user_id}", "leaderboard", "matches", "teams")
+async def get_user_stats(request: Request, user_id: int, fields: Optional[str] = None,
+                         db: AsyncSession = Depends(get_read_db)):
+    """
+    获取玩家详细统计信息，包括历史比赛数据
+
+    fields 为逗号分隔的部分名称（如 fields=game_scores,recent_scores），只计算并返回这些部分和 user。
+    """
+    selected = _parse_fields(fields, crud.USER_STATS_SECTIONS)
+    stats = await run_read(db, crud.get_user_stats, user_id=user_id, fields=selected)
     if not stats:
         raise HTTPException(status_code=404, detail="User not found")
-    return stats
+    if selected is None:
+        return stats
+    # 按 response_model 校验，但只输出选中的部分
+    return negotiate(request, schemas.UserStats.model_validate(stats).model_dump(mode="json", include={"user", *selected}))
 
 
 @router.get("/{user_id}/matches")
-def get_user_match_history(user_id: int, skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+async def get_user_match_history(user_id: int, skip: int = 0, limit: int = 50, db: AsyncSession = Depends(get_read_db)):
     """获取玩家历史比赛记录"""
-    history = crud.get_user_match_history(db, user_id=user_id, skip=skip, limit=limit)
+    history = await run_read(db, crud.get_user_match_history, user_id=user_id, skip=skip, limit=limit)
     if not history:
         raise HTTPException(status_code=404, detail="User not found")
     return history
 
 
 @router.get("/{user_id}/teams")
-def get_user_team_history(user_id: int, db: Session = Depends(get_db)):
+async def get_user_team_history(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取玩家队伍历史"""
-    teams = crud.get_user_team_history(db, user_id=user_id)
+    teams = await db.run_sync(crud.get_user_team_history, user_id=user_id)
     if teams is None:
         raise HTTPException(status_code=404, detail="User not found")
     return {
-        "current_team": teams.get("current_team"),
+        "current_team": next(iter(teams["current_teams"]), None),
         "historical_teams": teams.get("historical_teams", [])
     }
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(user_id: int, user: schemas.UserCreate, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def update_user(user_id: int, user: schemas.UserCreate, api_key: str = Depends(get_api_key)):
     """更新用户信息"""
-    db_user = crud.update_user(db, user_id=user_id, user_update=user)
+    db_user = write_queue.run(crud.update_user, user_id=user_id, user_update=user)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db), api_key: str = Depends(get_api_key)):
+def delete_user(user_id: int, api_key: str = Depends(get_api_key)):
     """删除用户"""
-    success = crud.delete_user(db, user_id=user_id)
+    success = write_queue.run(crud.delete_user, user_id=user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
\ No newline at end of file
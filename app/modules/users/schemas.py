@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 import datetime
 
+from app.core.config import settings
+
 
 # Shared properties
 class UserBase(BaseModel):
@@ -36,6 +38,32 @@ class User(UserBase):
         from_attributes = True
 
 
+# 批量 get-or-create 的结果
+class UserIdMapping(BaseModel):
+    nickname: str
+    id: int
+    created: bool  # 本次新建
+
+
+# 精简玩家信息（批量查询使用）
+class UserCompact(BaseModel):
+    id: int
+    nickname: str
+    display_name: Optional[str] = None
+    game_level: str = 'D'
+    level_progress: float = 0.0
+    average_standard_score: float = 0.0
+
+
+class UserBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.USERS_BATCH_MAX_IDS)
+
+
+class UserBatch(BaseModel):
+    users: Dict[int, UserCompact]  # 按玩家ID索引
+    missing: List[int] = []  # 不存在的玩家ID
+
+
 # Extended user info with team relationships
 class UserWithTeams(User):
     current_team: Optional[str] = None
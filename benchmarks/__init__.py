@@ -0,0 +1 @@
+# 性能基准测试脚本集合，使用方式见各脚本顶部说明
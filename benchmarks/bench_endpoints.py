@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+热点接口基准测试（进程内 ASGI，不需要启动服务）
+
+在 benchmarks.datagen 生成的数据集上，用 httpx.AsyncClient + ASGITransport 并发请求热点接口：
+排行榜、玩家统计、比赛页面和分数录入。每个场景报告 p50/p95/p99 延迟和吞吐，
+结果写入 JSON，可以用 --compare 与之前的运行对比。
+
+用法:
+    python -m benchmarks.bench_endpoints --users 5000 --matches 100 --output bench_after.json
+    python -m benchmarks.bench_endpoints --db bench.db --compare bench_before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+API_KEY_HEADER = "X-API-Key"
+
+# 场景名 -> (方法, 路径模板)；路径参数由 build_params 生成的取值池随机填充
+SCENARIOS = {
+    "leaderboard": ("GET", "/api/users/leaderboard?limit=100"),
+    "leaderboard_by_game": ("GET", "/api/users/leaderboard?limit=100&game_code={game_code}"),
+    "level_distribution": ("GET", "/api/users/leaderboard/level-distribution"),
+    "user_stats": ("GET", "/api/users/{user_id}/stats"),
+    "user_detail": ("GET", "/api/users/{user_id}"),
+    "match_list": ("GET", "/api/matches/"),
+    "match_detail": ("GET", "/api/matches/{match_id}"),
+    "match_teams": ("GET", "/api/matches/{match_id}/teams"),
+    "match_stats": ("GET", "/api/matches/{match_id}/stats"),
+    "live_scores": ("GET", "/api/matches/games/{live_match_game_id}/scores"),
+    "score_ingestion": ("POST", "/api/matches/games/{live_match_game_id}/scores"),
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_params(engine) -> dict:
+    """从数据集中取出各路径参数的取值池"""
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        user_ids = [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT user_id FROM scores ORDER BY user_id"))]
+        match_ids = [r[0] for r in conn.execute(text("SELECT id FROM matches ORDER BY id"))]
+        game_codes = [r[0] for r in conn.execute(text("SELECT code FROM games ORDER BY id"))]
+        live = conn.execute(text(
+            "SELECT id FROM match_games WHERE is_live = 1 ORDER BY id LIMIT 1")).scalar()
+        if live is None:
+            live = conn.execute(text("SELECT MAX(id) FROM match_games")).scalar()
+        lineup = [tuple(r) for r in conn.execute(text(
+            "SELECT user_id, match_team_id FROM game_lineups WHERE match_game_id = :id ORDER BY id"), {"id": live})]
+    return {
+        "user_id": user_ids, "match_id": match_ids, "game_code": game_codes,
+        "live_match_game_id": [live], "lineup": lineup,
+    }
+
+
+def render(template: str, params: dict, rng: random.Random) -> str:
+    values = {name: rng.choice(pool) for name, pool in params.items() if name != "lineup" and pool}
+    return template.format(**values)
+
+
+async def run_scenario(client, name: str, params: dict, requests: int, concurrency: int,
+                       api_key: str, seed: int) -> dict:
+    method, template = SCENARIOS[name]
+    rng = random.Random(f"{seed}-{name}")
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            path = render(template, params, rng)
+            kwargs = {}
+            if method == "POST":
+                user_id, team_id = rng.choice(params["lineup"])
+                kwargs = {
+                    "json": {"points": rng.randint(0, 300), "user_id": user_id, "team_id": team_id},
+                    "headers": {API_KEY_HEADER: api_key},
+                }
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+async def run_all(app, params, scenarios, requests, concurrency, api_key, seed, warmup) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in scenarios:
+            if warmup:
+                await run_scenario(client, name, params, warmup, min(concurrency, warmup), api_key, seed + 1)
+            results[name] = await run_scenario(client, name, params, requests, concurrency, api_key, seed)
+            r = results[name]
+            print(f"{name:<22}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\n与 {baseline_path} 对比（p95 / 吞吐变化）")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        p95_change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rps_change = (r["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        print(f"{name:<22}p95 {old['p95_ms']:>8} -> {r['p95_ms']:<8} ({p95_change:+.1f}%)   "
+              f"rps {old['throughput_rps']:>8} -> {r['throughput_rps']:<8} ({rps_change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="已有的数据集（SQLite 文件）；不指定则在临时目录生成")
+    parser.add_argument("--users", type=int, default=2000, help="生成数据集的用户数")
+    parser.add_argument("--matches", type=int, default=40, help="生成数据集的比赛数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="每个场景正式计时前的预热请求数")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_endpoints_"), "bench.db")
+    # 必须在导入 app 之前设置，app.core.db 在导入时按配置创建引擎
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    os.environ.pop("READ_DATABASE_URI", None)
+
+    from app.core.config import settings
+    from app.core.db import create_db_engine
+
+    engine = create_db_engine(settings.SQLALCHEMY_DATABASE_URI)
+    dataset = None
+    if not args.db:
+        from benchmarks.datagen import generate
+
+        print(f"生成数据集 users={args.users} matches={args.matches} -> {db_path}")
+        dataset = generate(engine, users=args.users, matches=args.matches, seed=args.seed)
+    params = build_params(engine)
+    engine.dispose()
+
+    from app.main import app
+
+    print(f"\n{'scenario':<22}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    results = asyncio.run(run_all(
+        app, params, args.scenarios, args.requests, args.concurrency, settings.API_KEY, args.seed, args.warmup,
+    ))
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "db": args.db,
+                "dataset": dataset,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seed": args.seed,
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+对运行中的服务做高并发压测，比较改动前后排行榜和比赛接口的吞吐
+
+每个并发客户端是一个线程，持有自己的 keep-alive 连接，在给定时长内循环请求同一个接口。
+用 --label 标记本次运行（例如 before / after），结果追加到 --json 指定的文件中，便于对比。
+
+用法:
+    uvicorn app.main:app --workers 1 &
+    python -m benchmarks.bench_http_concurrency --base-url http://127.0.0.1:8000 \\
+        --clients 500 --duration 15 --label after --json bench_output.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import requests
+
+DEFAULT_PATHS = [
+    "/api/users/leaderboard?limit=100",
+    "/api/users/leaderboard?limit=100&game_code={game_code}",
+    "/api/matches/",
+    "/api/matches/{match_id}",
+    "/api/matches/{match_id}/teams",
+    "/api/matches/{match_id}/games",
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_endpoint(base_url: str, path: str, clients: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        start_barrier.wait()
+        stop_at = time.perf_counter() + duration
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=60)
+                if response.status_code >= 400:
+                    local_errors += 1
+                    continue
+            except requests.RequestException:
+                local_errors += 1
+                continue
+            local_latencies.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15.0, help="每个接口压测的秒数")
+    parser.add_argument("--match-id", type=int, default=1)
+    parser.add_argument("--game-code", default="bingo")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--label", default="current", help="本次运行的标记，例如 before / after")
+    parser.add_argument("--json", help="将结果追加到该 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    for template in args.paths:
+        path = template.format(match_id=args.match_id, game_code=args.game_code)
+        print(f"压测 {path} ({args.clients} 并发, {args.duration}s) ...")
+        results.append(run_endpoint(args.base_url, path, args.clients, args.duration))
+
+    print(f"\n{'path':<55}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    for r in results:
+        print(f"{r['path']:<55}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['errors']:>8}")
+
+    if args.json:
+        runs = []
+        if os.path.exists(args.json):
+            with open(args.json, encoding="utf-8") as f:
+                runs = json.load(f)
+        runs.append({"label": args.label, "clients": args.clients, "results": results})
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(runs, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+大列表接口序列化路径对比（进程内，不经过 HTTP）
+
+对每个接口分别运行两条路径，并校验两者输出的 JSON 完全一致：
+- orm:  原来的路径。读取 ORM 对象后按 response_model 校验（from_attributes）再由 Pydantic 输出 JSON，
+        与 FastAPI 处理 response_model 的方式相同；没有 response_model 的接口走 jsonable_encoder + JSONResponse。
+- fast: 查询列元组（crud 的 *_rows 函数）后用 FastJSONResponse（orjson）直接编码。
+
+报告每条路径的最短耗时（查询 + 序列化）和加速比。
+
+用法:
+    python -m benchmarks.bench_serialization --db bench.db
+    python -m benchmarks.bench_serialization --users 5000 --matches 100 --repeat 20
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import JSONResponse
+
+from app.core.db import create_db_engine
+from app.core.responses import FastJSONResponse
+from app.modules.games import models as games_models  # noqa: F401  注册 Game 映射
+from app.modules.users import crud as users_crud, schemas as users_schemas
+from app.modules.matches import crud as matches_crud, schemas as matches_schemas
+
+
+def _orm_path(adapter, fetch):
+    def run(db):
+        return adapter.dump_json(adapter.validate_python(fetch(db), from_attributes=True))
+    return run
+
+
+def _encoder_path(fetch):
+    def run(db):
+        return JSONResponse(jsonable_encoder(fetch(db))).body
+    return run
+
+
+def _fast_path(fetch):
+    def run(db):
+        return FastJSONResponse(fetch(db)).body
+    return run
+
+
+def build_cases(db, limit: int) -> dict:
+    """接口名 -> (orm 路径, fast 路径)"""
+    busiest_game = db.execute(text(
+        "SELECT match_game_id FROM scores GROUP BY match_game_id ORDER BY COUNT(*) DESC LIMIT 1"
+    )).scalar()
+    match_id = db.execute(text("SELECT MAX(id) FROM matches")).scalar()
+    users_adapter = TypeAdapter(List[users_schemas.User])
+    matches_adapter = TypeAdapter(List[matches_schemas.MatchList])
+    scores_adapter = TypeAdapter(List[matches_schemas.Score])
+
+    def leaderboard(db):
+        rows = users_crud.get_leaderboard(db, limit=limit)
+        return {"leaderboard": rows, "total_displayed": len(rows), "game_code": None}
+
+    return {
+        "read_users": (
+            _orm_path(users_adapter, lambda db: users_crud.get_users(db, limit=limit)),
+            _fast_path(lambda db: users_crud.get_user_rows(db, limit=limit)),
+        ),
+        "read_matches": (
+            _orm_path(matches_adapter, lambda db: matches_crud.get_matches(db, limit=limit)),
+            _fast_path(lambda db: matches_crud.get_match_rows(db, limit=limit)),
+        ),
+        "read_scores_for_match_game": (
+            _orm_path(scores_adapter, lambda db: matches_crud.get_scores_for_match_game(db, busiest_game)),
+            _fast_path(lambda db: matches_crud.get_score_rows_for_match_game(db, busiest_game)),
+        ),
+        "leaderboard": (_encoder_path(leaderboard), _fast_path(leaderboard)),
+        "match_stats": (
+            _encoder_path(lambda db: matches_crud.get_match_stats(db, match_id)),
+            _fast_path(lambda db: matches_crud.get_match_stats(db, match_id)),
+        ),
+    }
+
+
+def measure(session_factory, fn, repeat: int):
+    """运行 repeat 次（先预热一次），返回 (最短耗时毫秒, 输出)"""
+    timings, body = [], None
+    for i in range(repeat + 1):
+        db = session_factory()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            body = fn(db)
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            gc.enable()
+            db.close()
+        if i:
+            timings.append(elapsed)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="已有的数据集（SQLite 文件）；不指定则在临时目录生成")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--matches", type=int, default=40)
+    parser.add_argument("--limit", type=int, default=100, help="列表接口的 limit")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_serialization_"), "bench.db")
+    engine = create_db_engine(f"sqlite:///{db_path}")
+    if not args.db:
+        from benchmarks.datagen import generate
+
+        print(f"生成数据集 users={args.users} matches={args.matches} -> {db_path}")
+        generate(engine, users=args.users, matches=args.matches)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    db = session_factory()
+    try:
+        cases = build_cases(db, args.limit)
+    finally:
+        db.close()
+
+    mismatches = []
+    print(f"\n{'endpoint':<30}{'orm ms':>10}{'fast ms':>10}{'speedup':>10}{'bytes':>10}")
+    for name, (orm_fn, fast_fn) in cases.items():
+        orm_ms, orm_body = measure(session_factory, orm_fn, args.repeat)
+        fast_ms, fast_body = measure(session_factory, fast_fn, args.repeat)
+        if json.loads(orm_body) != json.loads(fast_body):
+            mismatches.append(name)
+        print(f"{name:<30}{orm_ms:>10.2f}{fast_ms:>10.2f}{orm_ms / fast_ms:>9.1f}x{len(fast_body):>10}")
+    engine.dispose()
+
+    if mismatches:
+        print(f"\n输出不一致: {', '.join(mismatches)}")
+        raise SystemExit(1)
+    print("\n两条路径输出一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+比较不同 SQLite 配置（见 app.core.db.SQLITE_PROFILES）下的并发读写吞吐
+
+每个配置使用一个全新的临时数据库文件，写线程不断插入分数记录，
+读线程同时执行排行榜式的聚合查询，统计每秒读/写次数和锁错误数。
+
+用法:
+    python -m benchmarks.bench_sqlite_profiles --duration 10 --readers 8 --writers 2
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.db import SQLITE_PROFILES, Base, create_db_engine
+# 导入所有模型，确保它们已注册到 Base.metadata
+from app.modules.users import models as user_models  # noqa: F401
+from app.modules.games import models as game_models  # noqa: F401
+from app.modules.matches import models as match_models  # noqa: F401
+
+SEED_USERS = 500
+SEED_GAMES = 20
+
+READ_SQL = text("""
+    SELECT s.user_id, AVG(s.standard_score) AS avg_s, COUNT(s.id) AS n
+    FROM scores s
+    JOIN match_games mg ON s.match_game_id = mg.id
+    WHERE mg.game_id = :game_id AND s.standard_score IS NOT NULL
+    GROUP BY s.user_id
+    ORDER BY avg_s DESC
+    LIMIT 100
+""")
+WRITE_SQL = text("""
+    INSERT INTO scores (points, standard_score, user_id, match_team_id, match_game_id, recorded_at)
+    VALUES (:points, :standard_score, :user_id, 1, :match_game_id, CURRENT_TIMESTAMP)
+""")
+
+
+def seed(engine):
+    """建表并写入基础数据"""
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO matches (id, name) VALUES (1, 'bench')"))
+        conn.execute(text("INSERT INTO match_teams (id, match_id, name) VALUES (1, 1, 'team')"))
+        conn.execute(
+            text("INSERT INTO games (id, name, code) VALUES (:id, :name, :code)"),
+            [{"id": i, "name": f"game{i}", "code": f"g{i}"} for i in range(1, SEED_GAMES + 1)],
+        )
+        conn.execute(
+            text("INSERT INTO match_games (id, match_id, game_id) VALUES (:id, 1, :id)"),
+            [{"id": i} for i in range(1, SEED_GAMES + 1)],
+        )
+        conn.execute(
+            text("INSERT INTO users (id, nickname) VALUES (:id, :nickname)"),
+            [{"id": i, "nickname": f"user{i}"} for i in range(1, SEED_USERS + 1)],
+        )
+        conn.execute(WRITE_SQL, [
+            {
+                "points": rng.randint(0, 500),
+                "standard_score": rng.uniform(0, 1500),
+                "user_id": rng.randint(1, SEED_USERS),
+                "match_game_id": rng.randint(1, SEED_GAMES),
+            }
+            for _ in range(20000)
+        ])
+
+
+def run_profile(profile: str, duration: float, readers: int, writers: int, pool_size: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_{profile}_")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_db_engine(url, profile=profile, pool_size=pool_size, max_overflow=0)
+    seed(engine)
+
+    counters = {"reads": 0, "writes": 0, "lock_errors": 0, "read_ms": 0.0, "write_ms": 0.0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def reader(worker_id):
+        rng = random.Random(worker_id)
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(READ_SQL, {"game_id": rng.randint(1, SEED_GAMES)}).fetchall()
+            except OperationalError:
+                with lock:
+                    counters["lock_errors"] += 1
+                continue
+            with lock:
+                counters["reads"] += 1
+                counters["read_ms"] += (time.perf_counter() - started) * 1000
+
+    def writer(worker_id):
+        rng = random.Random(1000 + worker_id)
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(WRITE_SQL, {
+                        "points": rng.randint(0, 500),
+                        "standard_score": rng.uniform(0, 1500),
+                        "user_id": rng.randint(1, SEED_USERS),
+                        "match_game_id": rng.randint(1, SEED_GAMES),
+                    })
+            except OperationalError:
+                with lock:
+                    counters["lock_errors"] += 1
+                continue
+            with lock:
+                counters["writes"] += 1
+                counters["write_ms"] += (time.perf_counter() - started) * 1000
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    return {
+        "profile": profile,
+        "reads_per_sec": round(counters["reads"] / duration, 1),
+        "writes_per_sec": round(counters["writes"] / duration, 1),
+        "avg_read_ms": round(counters["read_ms"] / max(counters["reads"], 1), 2),
+        "avg_write_ms": round(counters["write_ms"] / max(counters["writes"], 1), 2),
+        "lock_errors": counters["lock_errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    parser.add_argument("--duration", type=float, default=10.0, help="每个配置运行的秒数")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    for profile in args.profiles:
+        print(f"运行配置 {profile} ...")
+        results.append(run_profile(profile, args.duration, args.readers, args.writers, args.pool_size))
+
+    print(f"\n{'profile':<12}{'reads/s':>10}{'writes/s':>10}{'read ms':>10}{'write ms':>10}{'locked':>8}")
+    for r in results:
+        print(f"{r['profile']:<12}{r['reads_per_sec']:>10}{r['writes_per_sec']:>10}"
+              f"{r['avg_read_ms']:>10}{r['avg_write_ms']:>10}{r['lock_errors']:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+赛前建队基准测试（进程内 ASGI，不需要启动服务）
+
+在临时数据库中准备玩家和赛程，然后通过接口完成一场比赛的赛前设置：
+- POST /api/matches/{id}/teams/batch      批量创建队伍和队员
+- POST /api/matches/games/{id}/lineups    设置整个赛程的出战阵容
+
+每轮使用一场新比赛，报告各步骤的最短 / 中位耗时和执行的 SQL 语句数。
+
+用法:
+    python -m benchmarks.bench_team_setup --teams 32 --players 4 --repeat 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def seed(engine, users: int, rounds: int):
+    """写入玩家、一个游戏，以及每轮一场比赛和一个赛程；返回 (玩家ID, [(比赛ID, 赛程ID)])"""
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.db import Base
+    from app.modules.users.models import User
+    from app.modules.games.models import Game
+    from app.modules.matches.models import Match, MatchGame
+    from app.modules.changes import models as change_models  # noqa: F401  注册变更日志表
+
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        players = [User(nickname=f"setup{i:05d}") for i in range(users)]
+        game = Game(name="基准游戏", code="bench")
+        matches = [Match(name=f"建队基准 #{i}") for i in range(rounds)]
+        db.add_all([*players, game, *matches])
+        db.flush()
+        match_games = [MatchGame(match_id=match.id, game_id=game.id) for match in matches]
+        db.add_all(match_games)
+        db.commit()
+        return [p.id for p in players], [(m.id, mg.id) for m, mg in zip(matches, match_games)]
+    finally:
+        db.close()
+
+
+async def run(app, api_key: str, player_ids, rounds, teams: int, players: int) -> dict:
+    import httpx
+
+    from app.core.querystats import track_queries
+
+    headers = {"X-API-Key": api_key}
+    timings = {"teams_batch": [], "lineups": []}
+    queries = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for round_no, (match_id, match_game_id) in enumerate(rounds):
+            body = {"teams": [
+                {
+                    "name": f"队伍{t + 1}",
+                    "members": [{"user_id": player_ids[t * players + p]} for p in range(players)],
+                }
+                for t in range(teams)
+            ]}
+            with track_queries(include_requests=True) as stats:
+                started = time.perf_counter()
+                response = await client.post(f"/api/matches/{match_id}/teams/batch", json=body, headers=headers)
+                elapsed = (time.perf_counter() - started) * 1000
+            response.raise_for_status()
+            if round_no:  # 第一轮为预热
+                timings["teams_batch"].append(elapsed)
+            queries["teams_batch"] = stats.count
+            team_ids = [team["id"] for team in response.json()["teams"]]
+
+            lineups = {"team_lineups": {
+                str(team_id): [player_ids[t * players + p] for p in range(players)]
+                for t, team_id in enumerate(team_ids)
+            }}
+            with track_queries(include_requests=True) as stats:
+                started = time.perf_counter()
+                response = await client.post(f"/api/matches/games/{match_game_id}/lineups", json=lineups, headers=headers)
+                elapsed = (time.perf_counter() - started) * 1000
+            response.raise_for_status()
+            if round_no:
+                timings["lineups"].append(elapsed)
+            queries["lineups"] = stats.count
+
+    return {
+        name: {"min_ms": min(values), "median_ms": statistics.median(values), "queries": queries[name]}
+        for name, values in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=32)
+    parser.add_argument("--players", type=int, default=4, help="每队人数")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench_team_setup_"), "bench.db")
+    # 必须在导入 app 之前设置，app.core.db 在导入时按配置创建引擎
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    os.environ.pop("READ_DATABASE_URI", None)
+
+    from app.core.config import settings
+    from app.core.db import create_db_engine
+
+    engine = create_db_engine(settings.SQLALCHEMY_DATABASE_URI)
+    player_ids, rounds = seed(engine, args.teams * args.players, args.repeat + 1)
+    engine.dispose()
+
+    from app.main import app
+
+    results = asyncio.run(run(app, settings.API_KEY, player_ids, rounds, args.teams, args.players))
+    print(f"\n{args.teams} 队 x {args.players} 人，{args.repeat} 轮（另有一轮预热）")
+    print(f"{'step':<16}{'min ms':>10}{'median ms':>12}{'queries':>10}")
+    for name, result in results.items():
+        print(f"{name:<16}{result['min_ms']:>10.1f}{result['median_ms']:>12.1f}{result['queries']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+检查热点查询的执行计划
+
+在临时 SQLite 数据库中建表并写入少量数据，执行排行榜、阵容、历史等热点 CRUD 函数，
+对期间发出的每条 SELECT 运行 EXPLAIN QUERY PLAN。只要有一条在热点表上退化为全表扫描
+（计划中出现不带索引的 "SCAN <table>"），或者排行榜、玩家统计等调用的语句数超出
+QUERY_BUDGETS（assert_query_budget，拦截循环中逐条查询的 N+1），脚本以非零状态退出。
+python -m benchmarks.microbench 在计时之前先运行本检查，两者共用一个退出码。
+
+用法:
+    python -m benchmarks.check_query_plans [-v]
+"""
+import os
+import re
+import sys
+import tempfile
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base, create_db_engine
+from app.core.querystats import assert_query_budget
+from app.modules.users import models as user_models
+from app.modules.users import crud as users_crud
+from app.modules.users.schemas import UserCreate
+from app.modules.games import models as game_models
+from app.modules.matches import models as match_models
+from app.modules.matches import crud as matches_crud
+from app.modules.changes import crud as changes_crud
+
+# 这些表在生产中行数最多，不允许全表扫描
+HOT_TABLES = {"scores", "game_lineups", "match_team_memberships", "match_teams", "match_games", "users", "change_log"}
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# 热点调用允许执行的最大语句数，与玩家、比赛、游戏的数量无关
+QUERY_BUDGETS = {
+    "get_leaderboard": 2,
+    "get_leaderboard(game_code)": 3,
+    "get_user_stats": 13,
+    "get_user_match_history": 2,
+}
+
+
+def seed(db):
+    """写入能覆盖所有热点查询分支的最小数据集（两场比赛 × 两个游戏，循环内的 N+1 会在查询数上体现）"""
+    games = [game_models.Game(name="宾果时速", code="bingo"), game_models.Game(name="跑酷", code="parkour")]
+    users = [user_models.User(nickname=f"player{i}", average_standard_score=100.0 + i) for i in range(8)]
+    matches = [match_models.Match(name=f"检查用比赛{i}") for i in range(2)]
+    db.add_all([*games, *matches, *users])
+    db.flush()
+
+    for match in matches:
+        match_games = [match_models.MatchGame(match_id=match.id, game_id=game.id) for game in games]
+        teams = [match_models.MatchTeam(match_id=match.id, name=f"队伍{i}") for i in range(2)]
+        db.add_all([*match_games, *teams])
+        db.flush()
+
+        for i, user in enumerate(users):
+            team = teams[i % 2]
+            db.add(match_models.MatchTeamMembership(match_team_id=team.id, user_id=user.id))
+            for match_game in match_games:
+                db.add(match_models.GameLineup(match_game_id=match_game.id, match_team_id=team.id, user_id=user.id))
+                db.add(match_models.Score(
+                    points=10 * (i + 1), standard_score=1000.0 + i,
+                    user_id=user.id, match_team_id=team.id, match_game_id=match_game.id,
+                ))
+    db.commit()
+    # 热点调用使用第一场比赛
+    match = matches[0]
+    return match, match.match_games[0], match.teams, users
+
+
+def hot_paths(db, match, match_game, teams, users):
+    """要检查的热点 CRUD 调用"""
+    user_id = users[0].id
+    return {
+        "get_leaderboard": lambda: users_crud.get_leaderboard(db, limit=100),
+        "get_leaderboard(game_code)": lambda: users_crud.get_leaderboard(db, limit=100, game_code="bingo"),
+        "get_user_stats": lambda: users_crud.get_user_stats(db, user_id),
+        "get_user_match_history": lambda: users_crud.get_user_match_history(db, user_id),
+        "get_user_team_history": lambda: users_crud.get_user_team_history(db, user_id),
+        "get_match_leaderboard": lambda: matches_crud.get_match_leaderboard(db, match.id),
+        "get_match_teams": lambda: matches_crud.get_match_teams(db, match.id),
+        "get_team_members": lambda: matches_crud.get_team_members(db, teams[0].id),
+        "get_game_lineup": lambda: matches_crud.get_game_lineup(db, match_game.id, team_id=teams[0].id),
+        "get_scores_for_match_game": lambda: matches_crud.get_scores_for_match_game(db, match_game.id),
+        "get_user_teams_in_match": lambda: matches_crud.get_user_teams_in_match(db, match.id, user_id),
+        "create_user(existing)": lambda: users_crud.create_user(db, UserCreate(nickname=users[0].nickname)),
+        "get_changes(match)": lambda: changes_crud.get_changes(db, 0, ("match", match.id)),
+        "get_changes(user)": lambda: changes_crud.get_changes(db, 0, ("user", user_id)),
+    }
+
+
+def main(verbose: bool = False):
+    workdir = tempfile.mkdtemp(prefix="query_plans_")
+    engine = create_db_engine(f"sqlite:///{os.path.join(workdir, 'plans.db')}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autoflush=False, bind=engine)()
+    fixtures = seed(db)
+
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failures = []
+    over_budget = []
+    for name, call in hot_paths(db, *fixtures).items():
+        captured.clear()
+        try:
+            with assert_query_budget(QUERY_BUDGETS.get(name, sys.maxsize)):
+                call()
+        except AssertionError as e:
+            over_budget.append(name)
+            print(f"[OVER BUDGET] {name}: {e}")
+        db.rollback()
+        statements = list(captured)
+        for statement, parameters in statements:
+            plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            details = [row[-1] for row in plan]
+            scans = [d for d in details if (m := FULL_SCAN.match(d)) and m.group(1) in HOT_TABLES]
+            if scans:
+                failures.append((name, statement, details))
+            if verbose or scans:
+                print(f"[{'FULL SCAN' if scans else 'ok'}] {name}")
+                print("    " + " ".join(statement.split())[:300])
+                for d in details:
+                    print(f"      {d}")
+        if not verbose:
+            print(f"{name}: {len(statements)} 条查询已检查")
+
+    db.close()
+    if failures:
+        print(f"\n发现 {len(failures)} 条查询退化为全表扫描")
+    if over_budget:
+        print(f"\n{len(over_budget)} 个调用超出语句数预算: {', '.join(over_budget)}")
+    if failures or over_budget:
+        return 1
+    print("\n所有热点查询均使用索引，语句数在预算以内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(verbose="-v" in sys.argv))
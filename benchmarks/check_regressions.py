@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+写路径与接口行为的回归检查
+
+在临时 SQLite 数据库上重放曾经出错的场景，任一项不符合预期时以非零状态退出：
+- id_reuse_after_match_delete: 删除比赛后 SQLite 复用赛程 / 队伍ID，另一场比赛新建的队员、阵容、分数
+  应递增该比赛的 match:{id} 版本，变更日志也应记在该比赛下（scope=match:{id} 的增量同步不漏行）
+- team_rename_changes_user_stats_etag: 修改队伍名称后，队员的玩家统计（含队伍名）ETag 应变化，
+  否则 If-None-Match 得到过期的 304、响应缓存继续返回旧内容
+- batch_sub_request_errors: 批量请求中未知路径的子请求应返回 404、接口抛出的 HTTPException 保留原状态码，
+  而不是 500（两个子请求都不访问数据库）
+
+python -m benchmarks.microbench 在计时之前先运行本检查，与查询计划检查共用一个退出码。
+
+用法:
+    python -m benchmarks.check_regressions
+"""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.db import Base, create_db_engine
+from app.core.versions import data_versions
+from app.modules.users import models as user_models
+from app.modules.games import models as game_models
+from app.modules.matches import models as match_models
+from app.modules.matches import crud as matches_crud
+from app.modules.changes import crud as changes_crud
+from app.modules.changes import models as change_models
+
+
+def _session():
+    """临时数据库上的会话（与写线程一样提交后不过期对象）"""
+    workdir = tempfile.mkdtemp(prefix="regressions_")
+    engine = create_db_engine(f"sqlite:///{os.path.join(workdir, 'regressions.db')}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)()
+
+
+def _add_player_results(db, match_game, team, user):
+    """队员、阵容、分数各一条"""
+    db.add_all([
+        match_models.MatchTeamMembership(match_team_id=team.id, user_id=user.id),
+        match_models.GameLineup(match_game_id=match_game.id, match_team_id=team.id, user_id=user.id),
+        match_models.Score(points=10, user_id=user.id, match_team_id=team.id, match_game_id=match_game.id),
+    ])
+    db.commit()
+
+
+def check_id_reuse_after_match_delete():
+    db = _session()
+    try:
+        user = user_models.User(nickname="reuse_player")
+        game = game_models.Game(name="ID复用", code="reuse")
+        deleted_match = match_models.Match(name="被删除的比赛")
+        live_match = match_models.Match(name="进行中的比赛")
+        db.add_all([user, game, deleted_match, live_match])
+        db.commit()
+
+        # 被删除比赛的赛程 / 队伍先被写过一次，ID -> 比赛 的映射进入进程内缓存
+        old_game = match_models.MatchGame(match_id=deleted_match.id, game_id=game.id)
+        old_team = match_models.MatchTeam(match_id=deleted_match.id, name="旧队伍")
+        db.add_all([old_game, old_team])
+        db.commit()
+        _add_player_results(db, old_game, old_team, user)
+        matches_crud.delete_match(db, deleted_match.id)
+
+        new_game = match_models.MatchGame(match_id=live_match.id, game_id=game.id)
+        new_team = match_models.MatchTeam(match_id=live_match.id, name="新队伍")
+        db.add_all([new_game, new_team])
+        db.commit()
+        assert (new_game.id, new_team.id) == (old_game.id, old_team.id), \
+            f"SQLite did not reuse ids ({old_game.id}, {old_team.id}) -> ({new_game.id}, {new_team.id}); scenario not reproduced"
+
+        cursor = db.scalar(select(func.max(change_models.ChangeLog.id)))
+        versions_before = {
+            match.id: data_versions.version(f"match:{match.id}") for match in (deleted_match, live_match)
+        }
+        _add_player_results(db, new_game, new_team, user)
+
+        assert data_versions.version(f"match:{live_match.id}") > versions_before[live_match.id], \
+            f"match:{live_match.id} was not bumped by writes to its own lineup and scores"
+        assert data_versions.version(f"match:{deleted_match.id}") == versions_before[deleted_match.id], \
+            f"match:{deleted_match.id} was bumped by writes to another match"
+
+        changes = changes_crud.get_changes(db, cursor, ("match", live_match.id))["changes"]
+        for entity in ("match_team_memberships", "game_lineups", "scores"):
+            inserted = changes.get(entity, {}).get("inserted", [])
+            assert len(inserted) == 1, \
+                f"changes?scope=match:{live_match.id} returned {len(inserted)} inserted {entity}, expected 1"
+    finally:
+        db.close()
+
+
+def check_team_rename_changes_user_stats_etag():
+    from app.modules.users.router import get_user_stats
+    from app.modules.matches import schemas as match_schemas
+
+    db = _session()
+    try:
+        user = user_models.User(nickname="rename_player")
+        match = match_models.Match(name="改名的比赛")
+        db.add_all([user, match])
+        db.commit()
+        team = match_models.MatchTeam(match_id=match.id, name="旧队名")
+        db.add(team)
+        db.commit()
+        db.add(match_models.MatchTeamMembership(match_team_id=team.id, user_id=user.id))
+        db.commit()
+
+        scopes = [scope.format(user_id=user.id) for scope in get_user_stats.version_scopes]
+        etag_before = data_versions.etag(scopes)
+        matches_crud.update_match_team(db, team.id, match_schemas.MatchTeamUpdate(name="新队名"))
+        assert data_versions.etag(scopes) != etag_before, \
+            f"renaming team {team.id} left the stats ETag of member {user.id} at {etag_before}"
+    finally:
+        db.close()
+
+
+def check_batch_sub_request_errors():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    expected = {"/api/nonexistent": 404, "/api/users/1/stats?fields=bogus": 400}
+    response = TestClient(app).post("/api/batch/", json={"requests": [{"path": path} for path in expected]})
+    assert response.status_code == 200, f"POST /api/batch/ returned {response.status_code}"
+    for item in response.json()["responses"]:
+        assert item["status"] == expected[item["path"]], \
+            f"batch item {item['path']} returned {item['status']} {item['body']}, expected {expected[item['path']]}"
+
+
+CHECKS = {
+    "id_reuse_after_match_delete": check_id_reuse_after_match_delete,
+    "team_rename_changes_user_stats_etag": check_team_rename_changes_user_stats_etag,
+    "batch_sub_request_errors": check_batch_sub_request_errors,
+}
+
+
+def main() -> int:
+    failures = []
+    for name, check in CHECKS.items():
+        try:
+            check()
+        except AssertionError as e:
+            failures.append(name)
+            print(f"[FAIL] {name}: {e}")
+        else:
+            print(f"[ok] {name}")
+
+    if failures:
+        print(f"\n{len(failures)} 项回归检查失败: {', '.join(failures)}")
+        return 1
+    print("\n回归检查全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
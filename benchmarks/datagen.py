@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+确定性的合成数据生成器
+
+按给定规模生成用户、游戏、比赛、队伍、队员、阵容和分数，全部通过批量 INSERT 写入，
+相同的 --seed 和规模参数总是生成完全相同的数据。分布尽量贴近真实赛事：
+- 每个玩家有一个隐藏实力值（正态分布），得分围绕实力波动；
+- 活跃度服从长尾分布，少数玩家参加大部分比赛；
+- 标准分按 15000 分制折算（与 StandardScoreCalculator 一致），
+  玩家统计、等级、队伍总分和排名在最后统一计算。
+
+用法:
+    python -m benchmarks.datagen --db bench.db --users 5000 --matches 100
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+from collections import defaultdict
+
+from sqlalchemy import insert
+
+from app.core.db import Base, SessionLocal, analyze_database, create_db_engine
+from app.modules.users.models import User
+from app.modules.users.crud import update_all_user_levels
+from app.modules.games.models import Game
+from app.modules.matches.models import (
+    Match, MatchTeam, MatchTeamMembership, MatchGame, GameLineup, Score, MatchStatus, MemberRole
+)
+from app.modules.matches.standard_score import StandardScoreCalculator
+
+BATCH_SIZE = 5000
+TEAM_COLORS = ["red", "blue", "green", "yellow", "purple", "orange", "cyan", "pink", "white", "black", "gray", "lime"]
+
+
+def _bulk_insert(conn, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(insert(model.__table__), rows[start:start + BATCH_SIZE])
+
+
+def _weighted_sample(rng, population, weights, k):
+    """按权重不放回抽样（Efraimidis-Spirakis）"""
+    keyed = sorted(population, key=lambda i: rng.random() ** (1.0 / weights[i]), reverse=True)
+    return keyed[:k]
+
+
+def generate(engine, users: int = 2000, matches: int = 40, games: int = 12,
+             teams_per_match: int = 12, players_per_team: int = 4, games_per_match: int = 8,
+             seed: int = 42) -> dict:
+    """
+    建表并写入合成数据，返回各表写入的行数
+
+    每支队伍有 players_per_team 名主力和 1 名替补，每个小游戏由各队主力出战。
+    """
+    rng = random.Random(seed)
+    Base.metadata.create_all(bind=engine)
+    base_time = datetime.datetime(2024, 1, 1)
+
+    skill = {uid: rng.gauss(0, 1) for uid in range(1, users + 1)}
+    activity = {uid: rng.paretovariate(1.5) for uid in range(1, users + 1)}
+    user_rows = [
+        {"id": uid, "nickname": f"player{uid:06d}", "display_name": f"Player {uid}", "source": "datagen",
+         "total_matches": 0, "total_wins": 0, "total_points": 0,
+         "total_standard_score": 0.0, "average_standard_score": 0.0,
+         "created_at": base_time, "last_active": base_time}
+        for uid in range(1, users + 1)
+    ]
+    game_rows = [
+        {"id": gid, "name": f"Game {gid}", "code": f"game{gid:02d}", "description": "synthetic"}
+        for gid in range(1, games + 1)
+    ]
+
+    match_rows, team_rows, membership_rows = [], [], []
+    match_game_rows, lineup_rows, score_rows = [], [], []
+    team_id = membership_id = match_game_id = lineup_id = score_id = 0
+    seats_per_team = players_per_team + 1  # 含一名替补
+
+    for mid in range(1, matches + 1):
+        start_time = base_time + datetime.timedelta(days=7 * mid)
+        status = MatchStatus.ONGOING if mid == matches else MatchStatus.FINISHED
+        match_rows.append({
+            "id": mid, "name": f"Synthetic Cup #{mid}", "status": status,
+            "start_time": start_time, "end_time": start_time + datetime.timedelta(hours=6),
+            "max_teams": teams_per_match, "max_players_per_team": players_per_team,
+            "created_at": start_time, "updated_at": start_time,
+        })
+
+        participants = _weighted_sample(rng, range(1, users + 1), activity, teams_per_match * seats_per_team)
+        match_teams = []
+        for t in range(teams_per_match):
+            team_id += 1
+            team_rows.append({
+                "id": team_id, "match_id": mid, "name": f"Team {t + 1}",
+                "color": TEAM_COLORS[t % len(TEAM_COLORS)], "total_score": 0, "games_played": 0,
+                "created_at": start_time,
+            })
+            members = participants[t * seats_per_team:(t + 1) * seats_per_team]
+            for position, uid in enumerate(members):
+                membership_id += 1
+                role = MemberRole.CAPTAIN if position == 0 else (
+                    MemberRole.SUBSTITUTE if position == players_per_team else MemberRole.MAIN)
+                membership_rows.append({
+                    "id": membership_id, "match_team_id": team_id, "user_id": uid,
+                    "role": role, "joined_at": start_time,
+                })
+            match_teams.append((team_id, members[:players_per_team]))
+
+        for order, gid in enumerate(rng.sample(range(1, games + 1), min(games_per_match, games)), 1):
+            match_game_id += 1
+            game_time = start_time + datetime.timedelta(minutes=40 * order)
+            match_game_rows.append({
+                "id": match_game_id, "match_id": mid, "game_id": gid, "game_order": order,
+                "multiplier": rng.choice([1.0, 1.0, 1.0, 1.5, 2.0]),
+                "is_live": status == MatchStatus.ONGOING and order == 1,
+                "start_time": game_time, "created_at": game_time,
+            })
+            game_scores = []
+            for tid, lineup in match_teams:
+                for uid in lineup:
+                    lineup_id += 1
+                    lineup_rows.append({
+                        "id": lineup_id, "match_game_id": match_game_id, "match_team_id": tid,
+                        "user_id": uid, "is_starting": True, "created_at": game_time,
+                    })
+                    score_id += 1
+                    game_scores.append({
+                        "id": score_id, "points": max(0, int(rng.gauss(100 + 35 * skill[uid], 30))),
+                        "user_id": uid, "match_team_id": tid, "match_game_id": match_game_id,
+                        "recorded_at": game_time + datetime.timedelta(seconds=rng.randint(0, 2400)),
+                    })
+            total = sum(s["points"] for s in game_scores)
+            for s in game_scores:
+                s["standard_score"] = round(s["points"] / total * StandardScoreCalculator.STANDARD_TOTAL_SCORE, 2) if total else 0.0
+            score_rows.extend(game_scores)
+
+    # 预计算的玩家和队伍统计（与线上写路径的计算口径一致）
+    user_stats = defaultdict(lambda: {"points": 0, "std_total": 0.0, "std_count": 0, "matches": set()})
+    team_totals = defaultdict(lambda: {"score": 0.0, "games": set()})
+    multipliers = {row["id"]: row["multiplier"] for row in match_game_rows}
+    team_match = {row["id"]: row["match_id"] for row in team_rows}
+    for s in score_rows:
+        stat = user_stats[s["user_id"]]
+        stat["points"] += s["points"]
+        stat["std_total"] += s["standard_score"]
+        stat["std_count"] += 1
+        stat["matches"].add(team_match[s["match_team_id"]])
+        team = team_totals[s["match_team_id"]]
+        team["score"] += s["points"] * multipliers[s["match_game_id"]]
+        team["games"].add(s["match_game_id"])
+    for row in user_rows:
+        stat = user_stats.get(row["id"])
+        if stat:
+            row.update({
+                "total_points": stat["points"], "total_matches": len(stat["matches"]),
+                "total_standard_score": stat["std_total"],
+                "average_standard_score": stat["std_total"] / stat["std_count"],
+            })
+    ranked = defaultdict(list)
+    for row in team_rows:
+        total = team_totals[row["id"]]
+        row["total_score"] = int(total["score"])
+        row["games_played"] = len(total["games"])
+        ranked[row["match_id"]].append(row)
+    for rows in ranked.values():
+        for rank, row in enumerate(sorted(rows, key=lambda r: r["total_score"], reverse=True), 1):
+            row["team_rank"] = rank
+
+    with engine.begin() as conn:
+        _bulk_insert(conn, User, user_rows)
+        _bulk_insert(conn, Game, game_rows)
+        _bulk_insert(conn, Match, match_rows)
+        _bulk_insert(conn, MatchTeam, team_rows)
+        _bulk_insert(conn, MatchTeamMembership, membership_rows)
+        _bulk_insert(conn, MatchGame, match_game_rows)
+        _bulk_insert(conn, GameLineup, lineup_rows)
+        _bulk_insert(conn, Score, score_rows)
+
+    # 等级依赖全体排名，复用线上的计算函数
+    db = SessionLocal(bind=engine)
+    try:
+        update_all_user_levels(db)
+    finally:
+        db.close()
+    if engine.dialect.name == "sqlite":
+        analyze_database(engine)
+
+    return {
+        "users": len(user_rows), "games": len(game_rows), "matches": len(match_rows),
+        "teams": len(team_rows), "memberships": len(membership_rows),
+        "match_games": len(match_game_rows), "lineups": len(lineup_rows), "scores": len(score_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="SQLite 数据库文件路径（已存在则报错）")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--matches", type=int, default=40)
+    parser.add_argument("--games", type=int, default=12, help="游戏项目数")
+    parser.add_argument("--teams-per-match", type=int, default=12)
+    parser.add_argument("--players-per-team", type=int, default=4)
+    parser.add_argument("--games-per-match", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    if args.users < args.teams_per_match * (args.players_per_team + 1):
+        parser.error("--users is too small for one match worth of teams")
+
+    engine = create_db_engine(f"sqlite:///{args.db}")
+    started = time.perf_counter()
+    counts = generate(
+        engine, users=args.users, matches=args.matches, games=args.games,
+        teams_per_match=args.teams_per_match, players_per_team=args.players_per_team,
+        games_per_match=args.games_per_match, seed=args.seed,
+    )
+    engine.dispose()
+    print(", ".join(f"{name}={count}" for name, count in counts.items()))
+    print(f"生成完成，用时 {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
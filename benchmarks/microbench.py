@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+计分与排名引擎的微基准测试（带回归阈值）
+
+在固定规模（约 1k / 10k / 100k 条分数）的内存 SQLite 数据集上分别测量：
+- standard_score_games: StandardScoreCalculator 计算全部赛程的标准分（只计算不写回）
+- standard_score_match: 重新计算一场比赛的标准分并写回
+- user_score_stats: 全体玩家标准分统计 + 等级重算（update_all_users_standard_score_stats）
+- level_banding: update_all_user_levels 的排名分级循环
+- timeline: 最活跃的 20 名玩家的跨比赛时间线
+- timeline_by_game: 同上，按游戏分组的时间线
+
+每次运行都在数据集的一份新拷贝上执行，写回的基准（standard_score_match、user_score_stats、level_banding）
+不会影响后续的运行和基准。
+
+每项重复运行取最小值（与 timeit 一样，噪声只会让结果变慢，最小值最稳定），小规模数据集耗时短、相对噪声大，
+重复次数更多（见 REPEATS）。与 benchmarks/baselines/microbench.json 中的基线比较，
+任一项慢于 基线 × (1 + 容差) 且比基线慢出噪声下限（noise_floor_ms，默认 5ms）以上时退出码为 1。
+基线与机器相关，更换机器或有意改变性能时用 --update-baseline 重新生成。
+
+计时之前先运行 benchmarks.check_query_plans 和 benchmarks.check_regressions，任一检查失败时同样退出码为 1。
+
+用法:
+    python -m benchmarks.microbench                     # 与基线比较
+    python -m benchmarks.microbench --sizes 1k 10k      # 只跑部分规模
+    python -m benchmarks.microbench --update-baseline   # 重新生成基线
+    python -m benchmarks.microbench --skip-checks       # 跳过查询计划和回归检查
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.db import apply_sqlite_profile, get_sqlite_pragmas
+from app.modules.users.crud import get_user_score_timeline, get_user_score_timeline_by_game, update_all_user_levels
+from app.modules.matches.models import MatchGame
+from app.modules.matches.standard_score import StandardScoreCalculator
+from benchmarks import check_query_plans, check_regressions
+from benchmarks.datagen import generate
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "microbench.json")
+DEFAULT_TOLERANCE = 0.30
+# 比基线慢不超过这个毫秒数时不算回归（几毫秒的基准，30% 在调度噪声以内）
+DEFAULT_NOISE_FLOOR_MS = 5.0
+
+# 每场比赛 12 队 × 4 人 × 8 个小游戏 = 384 条分数
+SCORES_PER_MATCH = 384
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+# 每个规模默认的重复次数
+REPEATS = {"1k": 15, "10k": 9, "100k": 5}
+TIMELINE_USERS = 20
+
+
+def _memory_engine():
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    pragmas = {k: v for k, v in get_sqlite_pragmas("production").items() if k != "journal_mode"}
+    apply_sqlite_profile(engine, pragmas, optimize_interval=0)
+    return engine
+
+
+def build_fixture(target_scores: int):
+    """生成约 target_scores 条分数的内存数据库，返回引擎（各次运行从它复制）"""
+    engine = _memory_engine()
+    matches = max(1, round(target_scores / SCORES_PER_MATCH))
+    generate(engine, users=max(200, target_scores // 20), matches=matches, seed=7)
+    return engine
+
+
+def copy_fixture(fixture):
+    """把数据集复制到一个新的内存数据库（SQLite 在线备份），返回新引擎"""
+    engine = _memory_engine()
+    with fixture.connect() as source, engine.connect() as target:
+        source.connection.driver_connection.backup(target.connection.driver_connection)
+    return engine
+
+
+def _active_users(db, limit):
+    return [r[0] for r in db.execute(text(
+        "SELECT user_id FROM scores GROUP BY user_id ORDER BY COUNT(*) DESC, user_id LIMIT :limit"
+    ), {"limit": limit})]
+
+
+def _standard_score_games(db):
+    calculator = StandardScoreCalculator(db)
+    for (match_game_id,) in db.query(MatchGame.id).all():
+        calculator.calculate_match_game_standard_scores(match_game_id)
+
+
+def _standard_score_match(db):
+    StandardScoreCalculator(db).calculate_match_standard_scores(1)
+
+
+def _user_score_stats(db):
+    StandardScoreCalculator(db).update_all_users_standard_score_stats()
+
+
+def _timeline(db):
+    for user_id in _active_users(db, TIMELINE_USERS):
+        get_user_score_timeline(db, user_id)
+
+
+def _timeline_by_game(db):
+    for user_id in _active_users(db, TIMELINE_USERS):
+        get_user_score_timeline_by_game(db, user_id)
+
+
+BENCHMARKS = {
+    "standard_score_games": _standard_score_games,
+    "standard_score_match": _standard_score_match,
+    "user_score_stats": _user_score_stats,
+    "level_banding": update_all_user_levels,
+    "timeline": _timeline,
+    "timeline_by_game": _timeline_by_game,
+}
+
+
+def measure(fixture, fn, repeat: int) -> float:
+    """在数据集的新拷贝上运行 repeat 次（先预热一次），返回最短耗时（毫秒）；计时期间关闭 GC"""
+    timings = []
+    for i in range(repeat + 1):
+        engine = copy_fixture(fixture)
+        db = sessionmaker(bind=engine, autoflush=False)()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            fn(db)
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            gc.enable()
+            db.close()
+            engine.dispose()
+        if i:
+            timings.append(elapsed)
+    return min(timings)
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {"tolerance": DEFAULT_TOLERANCE, "noise_floor_ms": DEFAULT_NOISE_FLOOR_MS, "results": {}}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, help="每项重复次数，默认按规模取 REPEATS 中的值")
+    parser.add_argument("--tolerance", type=float, help=f"允许的变慢比例，默认取基线文件中的值（{DEFAULT_TOLERANCE}）")
+    parser.add_argument("--noise-floor", type=float,
+                        help=f"比基线慢不超过这个毫秒数时不算回归，默认取基线文件中的值（{DEFAULT_NOISE_FLOOR_MS}）")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--skip-checks", action="store_true", help="不运行查询计划和回归检查")
+    args = parser.parse_args()
+
+    checks_failed = False
+    if not args.skip_checks:
+        for check in (check_query_plans, check_regressions):
+            checks_failed = (check.main() != 0) or checks_failed
+            print()
+
+    baseline = load_baseline()
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+    noise_floor = args.noise_floor if args.noise_floor is not None \
+        else baseline.get("noise_floor_ms", DEFAULT_NOISE_FLOOR_MS)
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':<28}{'best ms':>12}{'baseline':>12}{'change':>10}")
+    for size in args.sizes:
+        fixture = build_fixture(SIZES[size])
+        repeat = args.repeat or REPEATS[size]
+        for name in args.benchmarks:
+            key = f"{name}@{size}"
+            elapsed = measure(fixture, BENCHMARKS[name], repeat)
+            results[key] = round(elapsed, 3)
+            expected = baseline["results"].get(key)
+            if expected:
+                change = (elapsed - expected) / expected
+                regressed = change > tolerance and elapsed - expected > noise_floor
+                flag = "  REGRESSION" if regressed else ""
+                print(f"{key:<28}{elapsed:>12.2f}{expected:>12.2f}{change:>+10.1%}{flag}")
+                if regressed:
+                    regressions.append(key)
+            else:
+                print(f"{key:<28}{elapsed:>12.2f}{'-':>12}{'':>10}")
+
+    if args.update_baseline:
+        baseline["tolerance"] = tolerance
+        baseline["noise_floor_ms"] = noise_floor
+        baseline["results"].update(results)
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n基线已更新: {BASELINE_PATH}")
+        sys.exit(1 if checks_failed else 0)
+
+    if regressions:
+        print(f"\n{len(regressions)} 项超出容差 {tolerance:.0%}（且慢出 {noise_floor:g}ms 以上）: {', '.join(regressions)}")
+    else:
+        print(f"\n全部在容差 {tolerance:.0%}（或噪声下限 {noise_floor:g}ms）以内")
+    if regressions or checks_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
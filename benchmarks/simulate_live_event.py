@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+直播赛事模拟：并发录分 + 大量观众轮询
+
+按脚本通过 HTTP 接口在运行中的服务上完整走一遍比赛：
+1. 创建玩家、游戏、比赛、队伍，开始比赛；
+2. 每个小游戏：设置阵容、开启直播，多个录分线程同时提交该游戏的全部分数（突发写入）；
+3. 整个过程中观众线程持续轮询排行榜、比赛页、队伍积分和直播分数。
+
+报告：
+- 写入确认延迟（p50/p95/p99）、读延迟（按接口）；
+- 分数可见延迟：录分确认到观众第一次在直播分数中看到该记录；
+- 派生数据收敛时间：每个小游戏录分全部确认后，到观众看到队伍总分与已确认分数一致、标准分全部算出为止；
+- 锁错误（响应中出现 "database is locked"）、其他错误，以及丢失的更新（已确认但最终不存在的分数）。
+
+用法:
+    uvicorn app.main:app --workers 1 &
+    python -m benchmarks.simulate_live_event --base-url http://127.0.0.1:8000 \\
+        --teams 16 --games 6 --writers 8 --viewers 200 --json live_event.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks.bench_http_concurrency import percentile
+
+STANDARD_TOTAL_SCORE = 15000
+
+
+class Recorder:
+    """线程安全的延迟和错误记录"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock_errors = 0
+
+    def request(self, session, kind, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+        except requests.RequestException as e:
+            with self._lock:
+                self.errors[f"{kind}: {type(e).__name__}"] += 1
+            return None
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latencies[kind].append(elapsed)
+            if response.status_code >= 400:
+                if "database is locked" in response.text:
+                    self.lock_errors += 1
+                else:
+                    self.errors[f"{kind}: HTTP {response.status_code}"] += 1
+        return response if response.status_code < 400 else None
+
+    def summary(self, kind):
+        values = sorted(self.latencies.get(kind, []))
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2) if values else 0.0,
+        }
+
+
+class LiveEvent:
+    def __init__(self, base_url, api_key, teams, players_per_team, games, writers, viewers, poll_interval, seed):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-API-Key": api_key}
+        self.teams = teams
+        self.players_per_team = players_per_team
+        self.games = games
+        self.writers = writers
+        self.viewers = viewers
+        self.poll_interval = poll_interval
+        self.rng = random.Random(seed)
+        self.run_id = f"{seed}-{int(time.time())}"
+        self.recorder = Recorder()
+
+        self.match_id = None
+        self.team_ids = []
+        self.team_players = {}  # team_id -> [user_id]
+        self.match_game_ids = []
+        self.current_game = None
+
+        self._lock = threading.Lock()
+        self.acked = {}  # score_id -> (确认时间, match_game_id, team_id, points)
+        self.first_seen = {}  # score_id -> 观众第一次看到的时间
+        self.game_done_at = {}  # match_game_id -> 全部录分确认的时间
+        self.converged_at = {}  # match_game_id -> 派生数据收敛的时间
+        self.teams_caught_up = False  # 最近一次看到的队伍总分是否已包含所有录完小游戏的分数
+        self.standard_scores_ready = set()  # 观众已看到标准分全部算出的小游戏
+        self.stop = threading.Event()
+
+    def url(self, path):
+        return self.base_url + path
+
+    # --- 准备阶段 ---
+
+    def setup(self):
+        s = requests.Session()
+        post = lambda path, body: s.post(self.url(path), json=body, headers=self.headers, timeout=30)
+
+        user_ids = []
+        for i in range(self.teams * self.players_per_team):
+            r = post("/api/users/", {"nickname": f"sim-{self.run_id}-{i}"})
+            r.raise_for_status()
+            user_ids.append(r.json()["id"])
+        game_ids = []
+        for g in range(self.games):
+            r = post("/api/games/", {"name": f"Sim Game {g}", "code": f"sim-{self.run_id}-{g}"})
+            r.raise_for_status()
+            game_ids.append(r.json()["id"])
+        r = post("/api/matches/", {
+            "name": f"Live simulation {self.run_id}",
+            "match_games": [{"game_id": gid, "game_order": order} for order, gid in enumerate(game_ids, 1)],
+        })
+        r.raise_for_status()
+        self.match_id = r.json()["id"]
+
+        teams = [
+            {"name": f"Team {t + 1}", "members": [{"user_id": uid} for uid in user_ids[t * self.players_per_team:(t + 1) * self.players_per_team]]}
+            for t in range(self.teams)
+        ]
+        for team in teams:
+            r = post(f"/api/matches/{self.match_id}/teams", team)
+            r.raise_for_status()
+            self.team_ids.append(r.json()["id"])
+            self.team_players[r.json()["id"]] = [m["user_id"] for m in team["members"]]
+
+        s.post(self.url(f"/api/matches/{self.match_id}/start"), headers=self.headers, timeout=30).raise_for_status()
+        r = s.get(self.url(f"/api/matches/{self.match_id}/games"), timeout=30)
+        r.raise_for_status()
+        self.match_game_ids = [g["id"] for g in sorted(r.json(), key=lambda g: g["game_order"])]
+
+    # --- 观众 ---
+
+    def viewer(self, viewer_id):
+        s = requests.Session()
+        rng = random.Random(viewer_id)
+        kinds = ["leaderboard", "match_page", "team_scores", "live_scores"]
+        while not self.stop.is_set():
+            kind = rng.choice(kinds)
+            game = self.current_game
+            if kind == "leaderboard":
+                self.recorder.request(s, kind, "GET", self.url("/api/users/leaderboard?limit=50"))
+            elif kind == "match_page":
+                self.recorder.request(s, kind, "GET", self.url(f"/api/matches/{self.match_id}"))
+            elif kind == "team_scores":
+                r = self.recorder.request(s, kind, "GET", self.url(f"/api/matches/{self.match_id}/teams"))
+                if r is not None:
+                    self.check_convergence(teams=r.json())
+            elif game is not None:
+                r = self.recorder.request(s, kind, "GET", self.url(f"/api/matches/games/{game}/scores"))
+                if r is not None:
+                    self.observe_scores(game, r.json())
+            time.sleep(self.poll_interval * rng.uniform(0.5, 1.5))
+
+    def observe_scores(self, match_game_id, scores):
+        now = time.perf_counter()
+        with self._lock:
+            for score in scores:
+                self.first_seen.setdefault(score["id"], now)
+        self.check_convergence(match_game_id=match_game_id, scores=scores)
+
+    def check_convergence(self, teams=None, match_game_id=None, scores=None):
+        """某个已录完的小游戏：队伍总分与已确认分数一致，且该游戏标准分全部算出，视为派生数据已收敛"""
+        now = time.perf_counter()
+        with self._lock:
+            pending = [g for g in self.game_done_at if g not in self.converged_at]
+            if not pending:
+                return
+            if teams is not None:
+                expected = defaultdict(int)
+                for _, game, team_id, points in self.acked.values():
+                    if game in self.game_done_at:
+                        expected[team_id] += points
+                self.teams_caught_up = all(t["total_score"] >= expected[t["id"]] for t in teams)
+            if scores is not None and match_game_id in pending:
+                acked_ids = {sid for sid, a in self.acked.items() if a[1] == match_game_id}
+                seen = {s["id"]: s for s in scores}
+                if acked_ids <= seen.keys() and all(seen[sid]["standard_score"] is not None for sid in acked_ids):
+                    self.standard_scores_ready.add(match_game_id)
+            for game in pending:
+                if self.teams_caught_up and game in self.standard_scores_ready:
+                    self.converged_at[game] = now
+
+    # --- 录分 ---
+
+    def play_game(self, match_game_id):
+        s = requests.Session()
+        lineups = {team_id: players for team_id, players in self.team_players.items()}
+        self.recorder.request(s, "set_lineup", "POST", self.url(f"/api/matches/games/{match_game_id}/lineups"),
+                              json={"team_lineups": lineups}, headers=self.headers)
+        self.recorder.request(s, "set_live", "PUT", self.url(f"/api/matches/games/{match_game_id}"),
+                              json={"is_live": True}, headers=self.headers)
+        self.current_game = match_game_id
+
+        submissions = [
+            (team_id, user_id, self.rng.randint(0, 300))
+            for team_id, players in lineups.items() for user_id in players
+        ]
+        self.rng.shuffle(submissions)
+        queue = iter(submissions)
+        queue_lock = threading.Lock()
+
+        def writer():
+            ws = requests.Session()
+            while True:
+                with queue_lock:
+                    item = next(queue, None)
+                if item is None:
+                    return
+                team_id, user_id, points = item
+                r = self.recorder.request(ws, "score_write", "POST", self.url(f"/api/matches/games/{match_game_id}/scores"),
+                                          json={"points": points, "user_id": user_id, "team_id": team_id}, headers=self.headers)
+                if r is not None:
+                    with self._lock:
+                        self.acked[r.json()["id"]] = (time.perf_counter(), match_game_id, team_id, points)
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with self._lock:
+            self.game_done_at[match_game_id] = time.perf_counter()
+
+    # --- 结果 ---
+
+    def verify(self):
+        """比赛结束后核对：已确认的分数是否都在、队伍总分和标准分是否正确"""
+        s = requests.Session()
+        lost, bad_standard = 0, 0
+        for match_game_id in self.match_game_ids:
+            scores = s.get(self.url(f"/api/matches/games/{match_game_id}/scores"), timeout=30).json()
+            present = {sc["id"] for sc in scores}
+            lost += sum(1 for sid, a in self.acked.items() if a[1] == match_game_id and sid not in present)
+            total_standard = sum(sc["standard_score"] or 0 for sc in scores)
+            if scores and sum(sc["points"] for sc in scores) and abs(total_standard - STANDARD_TOTAL_SCORE) > 1:
+                bad_standard += 1
+        expected = defaultdict(int)
+        for _, _, team_id, points in self.acked.values():
+            expected[team_id] += points
+        teams = s.get(self.url(f"/api/matches/{self.match_id}/teams"), timeout=30).json()
+        team_mismatches = sum(1 for t in teams if t["total_score"] != expected[t["id"]])
+        return {"lost_updates": lost, "team_total_mismatches": team_mismatches, "games_with_bad_standard_scores": bad_standard}
+
+    def run(self):
+        print(f"准备比赛：{self.teams} 队 × {self.players_per_team} 人，{self.games} 个小游戏")
+        self.setup()
+        viewers = [threading.Thread(target=self.viewer, args=(i,), daemon=True) for i in range(self.viewers)]
+        for t in viewers:
+            t.start()
+
+        started = time.perf_counter()
+        for order, match_game_id in enumerate(self.match_game_ids, 1):
+            print(f"第 {order} 个小游戏（match_game_id={match_game_id}）录分中 ...")
+            self.play_game(match_game_id)
+        # 留出时间让观众观察到最后一个小游戏的派生数据
+        deadline = time.perf_counter() + 10
+        while time.perf_counter() < deadline and len(self.converged_at) < len(self.match_game_ids):
+            time.sleep(0.1)
+        self.stop.set()
+        for t in viewers:
+            t.join(timeout=5)
+        elapsed = time.perf_counter() - started
+
+        # 观众可能在录分响应返回之前就读到了已提交的分数，此时记为 0
+        visibility = sorted(
+            max(0.0, (self.first_seen[sid] - ack[0]) * 1000)
+            for sid, ack in self.acked.items() if sid in self.first_seen
+        )
+        convergence = sorted(
+            (self.converged_at[g] - self.game_done_at[g]) * 1000 for g in self.converged_at
+        )
+        reads = {kind: self.recorder.summary(kind) for kind in ("leaderboard", "match_page", "team_scores", "live_scores")}
+        return {
+            "config": {
+                "teams": self.teams, "players_per_team": self.players_per_team, "games": self.games,
+                "writers": self.writers, "viewers": self.viewers, "poll_interval": self.poll_interval,
+            },
+            "duration_s": round(elapsed, 2),
+            "writes": self.recorder.summary("score_write"),
+            "reads": reads,
+            "score_visibility_ms": {
+                "observed": len(visibility),
+                "p50": round(percentile(visibility, 50), 2),
+                "p95": round(percentile(visibility, 95), 2),
+                "max": round(visibility[-1], 2) if visibility else 0.0,
+            },
+            "derived_convergence_ms": {
+                "games_converged": len(convergence),
+                "games": len(self.match_game_ids),
+                "p50": round(percentile(convergence, 50), 2),
+                "max": round(convergence[-1], 2) if convergence else 0.0,
+            },
+            "lock_errors": self.recorder.lock_errors,
+            "errors": dict(self.recorder.errors),
+            **self.verify(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY", "a_super_secret_api_key"))
+    parser.add_argument("--teams", type=int, default=16)
+    parser.add_argument("--players-per-team", type=int, default=4)
+    parser.add_argument("--games", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=8, help="并发录分线程数")
+    parser.add_argument("--viewers", type=int, default=200, help="轮询观众线程数")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="观众平均轮询间隔（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    event = LiveEvent(args.base_url, args.api_key, args.teams, args.players_per_team, args.games,
+                      args.writers, args.viewers, args.poll_interval, args.seed)
+    report = event.run()
+
+    w = report["writes"]
+    print(f"\n用时 {report['duration_s']}s")
+    print(f"录分确认  n={w['count']} p50={w['p50_ms']}ms p95={w['p95_ms']}ms p99={w['p99_ms']}ms")
+    for kind, r in report["reads"].items():
+        print(f"读 {kind:<12} n={r['count']} p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms")
+    v, c = report["score_visibility_ms"], report["derived_convergence_ms"]
+    print(f"分数可见延迟 p50={v['p50']}ms p95={v['p95']}ms max={v['max']}ms（观察到 {v['observed']} 条）")
+    print(f"派生数据收敛 p50={c['p50']}ms max={c['max']}ms（{c['games_converged']}/{c['games']} 个小游戏）")
+    print(f"锁错误 {report['lock_errors']}，其他错误 {sum(report['errors'].values())}，"
+          f"丢失更新 {report['lost_updates']}，队伍总分不一致 {report['team_total_mismatches']}，"
+          f"标准分异常的小游戏 {report['games_with_bad_standard_scores']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 # This script initializes the database by creating all necessary tables.
 
-from app.core.db import Base, engine
+from app.core.db import Base, engine, is_sqlite, analyze_database
+from app.core.config import settings
 from app.modules.users.models import User  # Import all models here
 from app.modules.games.models import Game
 from app.modules.matches.models import (
     Match, MatchTeam, MatchTeamMembership, 
     MatchGame, GameLineup, Score
 )
+from app.modules.changes.models import ChangeLog
 
 print("Creating database tables...")
 Base.metadata.create_all(bind=engine)
+if is_sqlite(settings.SQLALCHEMY_DATABASE_URI):
+    # 收集统计信息，供查询规划器选择索引
+    analyze_database(engine)
 print("Database tables created successfully.")
 print("\nNew team system is ready!")
 print("- MatchTeam: 比赛专属队伍")
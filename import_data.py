@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+历史数据批量导入工具
+
+从 CSV / JSON / JSON Lines 文件导入玩家、比赛、队伍、队员、阵容和分数（按扩展名识别格式）。
+所有引用都用自然键表示，导入时按批次（IN 查询）统一解析成 ID：
+- users:       nickname[, display_name, source]
+- matches:     name[, description, status, start_time, end_time, games]
+               games 为游戏代码列表（CSV 中用 ; 分隔，可写成 code:倍率），按顺序创建赛程
+- teams:       match, name[, color]
+- memberships: match, team, nickname[, role]
+- lineups:     match, game_code, team, nickname[, is_starting]
+- scores:      match, game_code, nickname, points[, team, recorded_at, event_data]
+               不写 team 时按阵容、再按队员关系确定得分队伍
+
+不存在的玩家和游戏会自动创建；已存在的比赛、队伍、队员关系和阵容会跳过，分数总是追加。
+所有新行在同一个事务中用 executemany 分批插入，最后统一做一次集合式的派生数据重算
+（标准分、玩家统计、队伍总分与排名、玩家等级），并报告每类数据的吞吐（行/秒）。
+
+导入直接写数据库、不经过写队列，建议在服务停机或低峰时运行。
+
+用法:
+    python import_data.py --users users.csv --matches matches.json --scores scores.jsonl
+    python import_data.py --database-url sqlite:///./prod.db --scores scores.csv --dry-run
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+
+from sqlalchemy import insert, select, tuple_
+
+from app.core.config import settings
+from app.core.db import Base, SessionLocal, analyze_database, create_db_engine
+from app.modules.users.models import User
+from app.modules.games.models import Game
+from app.modules.matches.models import (
+    Match, MatchTeam, MatchTeamMembership, MatchGame, GameLineup, Score, MatchStatus, MemberRole
+)
+from app.modules.matches.standard_score import recalculate_scores_bulk
+
+BATCH_SIZE = 5000
+LOOKUP_CHUNK = 500
+KINDS = ["users", "matches", "teams", "memberships", "lineups", "scores"]
+
+
+class ImportDataError(Exception):
+    pass
+
+
+def read_rows(path: str) -> list:
+    """读取 CSV / JSON / JSON Lines 文件，CSV 中的空字符串视为缺省"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig") as f:
+        if ext == ".csv":
+            return [{k: (v if v != "" else None) for k, v in row.items()} for row in csv.DictReader(f)]
+        if ext in (".jsonl", ".ndjson"):
+            return [json.loads(line) for line in f if line.strip()]
+        if ext == ".json":
+            data = json.load(f)
+            return data["rows"] if isinstance(data, dict) else data
+    raise ImportDataError(f"{path}: 不支持的文件格式 {ext}（支持 .csv / .json / .jsonl）")
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _bulk_insert(conn, model, rows):
+    for chunk in _chunks(rows, BATCH_SIZE):
+        conn.execute(insert(model.__table__), chunk)
+
+
+def _lookup(conn, key_columns, value_column, keys) -> dict:
+    """按自然键批量查询 ID：{key: id}，复合键用元组"""
+    found = {}
+    keys = list(keys)
+    if not keys:
+        return found
+    composite = len(key_columns) > 1
+    key_expr = tuple_(*key_columns) if composite else key_columns[0]
+    for chunk in _chunks(keys, LOOKUP_CHUNK):
+        for row in conn.execute(select(*key_columns, value_column).where(key_expr.in_(chunk))):
+            found[tuple(row[:-1]) if composite else row[0]] = row[-1]
+    return found
+
+
+def _parse_time(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def _parse_bool(value, default=True):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _parse_games(value) -> list:
+    """赛程列表 -> [(game_code, multiplier)]"""
+    if not value:
+        return []
+    items = value.split(";") if isinstance(value, str) else value
+    games = []
+    for item in items:
+        if isinstance(item, dict):
+            games.append((item["code"], float(item.get("multiplier") or 1.0)))
+            continue
+        code, _, multiplier = str(item).strip().partition(":")
+        games.append((code, float(multiplier) if multiplier else 1.0))
+    return games
+
+
+def _require(row, *fields, kind):
+    missing = [f for f in fields if row.get(f) in (None, "")]
+    if missing:
+        raise ImportDataError(f"{kind}: 缺少字段 {', '.join(missing)}: {row}")
+
+
+class Importer:
+    def __init__(self, conn):
+        self.conn = conn
+        self.now = datetime.datetime.utcnow()
+        self.user_ids = {}
+        self.game_ids = {}
+        self.match_ids = {}
+        self.team_ids = {}        # (match_id, team_name) -> team_id
+        self.match_game_ids = {}  # (match_id, game_id) -> match_game_id
+        self.touched_match_games = set()
+        self.counts = {}
+        self.skipped = {}
+
+    # ---------- 自然键解析 ----------
+
+    def resolve_users(self, nicknames, display_names=None, source="import"):
+        """解析昵称，不存在的玩家批量创建"""
+        wanted = {n for n in nicknames if n not in self.user_ids}
+        self.user_ids.update(_lookup(self.conn, [User.nickname], User.id, wanted))
+        missing = sorted(wanted - self.user_ids.keys())
+        if missing:
+            display_names = display_names or {}
+            _bulk_insert(self.conn, User, [
+                {"nickname": n, "display_name": display_names.get(n) or n, "source": source,
+                 "total_matches": 0, "total_wins": 0, "total_points": 0,
+                 "total_standard_score": 0.0, "average_standard_score": 0.0,
+                 "game_level": "D", "level_progress": 0.0,
+                 "created_at": self.now, "last_active": self.now}
+                for n in missing
+            ])
+            self.user_ids.update(_lookup(self.conn, [User.nickname], User.id, missing))
+        return len(missing)
+
+    def resolve_games(self, codes):
+        """解析游戏代码，不存在的游戏以代码为名称创建"""
+        wanted = {c for c in codes if c not in self.game_ids}
+        self.game_ids.update(_lookup(self.conn, [Game.code], Game.id, wanted))
+        missing = sorted(wanted - self.game_ids.keys())
+        if missing:
+            _bulk_insert(self.conn, Game, [{"code": c, "name": c, "description": None} for c in missing])
+            self.game_ids.update(_lookup(self.conn, [Game.code], Game.id, missing))
+
+    def resolve_matches(self, names):
+        wanted = {n for n in names if n not in self.match_ids}
+        for chunk in _chunks(wanted, LOOKUP_CHUNK):
+            # 同名比赛取最早创建的一场
+            for name, match_id in self.conn.execute(
+                select(Match.name, Match.id).where(Match.name.in_(chunk)).order_by(Match.id.desc())
+            ):
+                self.match_ids[name] = match_id
+
+    def resolve_teams(self, match_ids):
+        wanted = {m for m in match_ids}
+        for chunk in _chunks(wanted, LOOKUP_CHUNK):
+            for match_id, name, team_id in self.conn.execute(
+                select(MatchTeam.match_id, MatchTeam.name, MatchTeam.id).where(MatchTeam.match_id.in_(chunk))
+            ):
+                self.team_ids[(match_id, name)] = team_id
+
+    def resolve_match_games(self, match_ids):
+        for chunk in _chunks(set(match_ids), LOOKUP_CHUNK):
+            for match_id, game_id, mg_id in self.conn.execute(
+                select(MatchGame.match_id, MatchGame.game_id, MatchGame.id)
+                .where(MatchGame.match_id.in_(chunk)).order_by(MatchGame.id.desc())
+            ):
+                self.match_game_ids[(match_id, game_id)] = mg_id
+
+    def _match_id(self, row, kind):
+        match_id = self.match_ids.get(row["match"])
+        if match_id is None:
+            raise ImportDataError(f"{kind}: 找不到比赛 {row['match']!r}")
+        return match_id
+
+    def _team_id(self, match_id, name, kind):
+        team_id = self.team_ids.get((match_id, name))
+        if team_id is None:
+            raise ImportDataError(f"{kind}: 比赛 {match_id} 中找不到队伍 {name!r}")
+        return team_id
+
+    def _match_game_id(self, match_id, code, kind):
+        mg_id = self.match_game_ids.get((match_id, self.game_ids.get(code)))
+        if mg_id is None:
+            raise ImportDataError(f"{kind}: 比赛 {match_id} 中没有游戏 {code!r} 的赛程")
+        return mg_id
+
+    # ---------- 各类数据 ----------
+
+    def import_users(self, rows):
+        for row in rows:
+            _require(row, "nickname", kind="users")
+        display_names = {r["nickname"]: r.get("display_name") for r in rows}
+        sources = {r.get("source") or "import" for r in rows}
+        created = 0
+        for source in sorted(sources):
+            nicknames = [r["nickname"] for r in rows if (r.get("source") or "import") == source]
+            created += self.resolve_users(nicknames, display_names, source)
+        self.counts["users"] = created
+        self.skipped["users"] = len({r["nickname"] for r in rows}) - created
+
+    def import_matches(self, rows):
+        for row in rows:
+            _require(row, "name", kind="matches")
+        self.resolve_matches(r["name"] for r in rows)
+        self.resolve_games(code for r in rows for code, _ in _parse_games(r.get("games")))
+
+        new_rows, seen = [], set()
+        for row in rows:
+            if row["name"] in self.match_ids or row["name"] in seen:
+                continue
+            seen.add(row["name"])
+            status = row.get("status")
+            start_time = _parse_time(row.get("start_time"))
+            new_rows.append({
+                "name": row["name"], "description": row.get("description"),
+                "status": MatchStatus(status) if status else MatchStatus.FINISHED,
+                "start_time": start_time, "end_time": _parse_time(row.get("end_time")),
+                "max_players_per_team": int(row.get("max_players_per_team") or 4),
+                "allow_substitutes": True,
+                "created_at": start_time or self.now, "updated_at": start_time or self.now,
+            })
+        _bulk_insert(self.conn, Match, new_rows)
+        self.resolve_matches(seen)
+
+        # 只为新建的比赛创建赛程，已有比赛的赛程保持不变
+        match_game_rows = []
+        for row in rows:
+            if row["name"] not in seen:
+                continue
+            seen.discard(row["name"])
+            match_id = self.match_ids[row["name"]]
+            start_time = _parse_time(row.get("start_time"))
+            for order, (code, multiplier) in enumerate(_parse_games(row.get("games")), 1):
+                match_game_rows.append({
+                    "match_id": match_id, "game_id": self.game_ids[code], "game_order": order,
+                    "multiplier": multiplier, "is_live": False, "start_time": start_time,
+                    "created_at": start_time or self.now,
+                })
+        _bulk_insert(self.conn, MatchGame, match_game_rows)
+        self.counts["matches"] = len(new_rows)
+        self.counts["match_games"] = len(match_game_rows)
+        self.skipped["matches"] = len(rows) - len(new_rows)
+
+    def import_teams(self, rows):
+        for row in rows:
+            _require(row, "match", "name", kind="teams")
+        self.resolve_matches(r["match"] for r in rows)
+        match_ids = {self._match_id(r, "teams") for r in rows}
+        self.resolve_teams(match_ids)
+
+        new_rows, seen = [], set()
+        for row in rows:
+            key = (self.match_ids[row["match"]], row["name"])
+            if key in self.team_ids or key in seen:
+                continue
+            seen.add(key)
+            new_rows.append({
+                "match_id": key[0], "name": row["name"], "color": row.get("color"),
+                "total_score": 0, "games_played": 0, "created_at": self.now,
+            })
+        _bulk_insert(self.conn, MatchTeam, new_rows)
+        self.resolve_teams({key[0] for key in seen})
+        self.counts["teams"] = len(new_rows)
+        self.skipped["teams"] = len(rows) - len(new_rows)
+
+    def import_memberships(self, rows):
+        for row in rows:
+            _require(row, "match", "team", "nickname", kind="memberships")
+        self.resolve_matches(r["match"] for r in rows)
+        self.resolve_teams({self._match_id(r, "memberships") for r in rows})
+        self.resolve_users(r["nickname"] for r in rows)
+
+        candidates = []
+        for row in rows:
+            match_id = self.match_ids[row["match"]]
+            team_id = self._team_id(match_id, row["team"], "memberships")
+            candidates.append((team_id, self.user_ids[row["nickname"]], row))
+        existing = set(_lookup(
+            self.conn, [MatchTeamMembership.match_team_id, MatchTeamMembership.user_id], MatchTeamMembership.id,
+            {(team_id, user_id) for team_id, user_id, _ in candidates},
+        ))
+
+        new_rows = []
+        for team_id, user_id, row in candidates:
+            if (team_id, user_id) in existing:
+                continue
+            existing.add((team_id, user_id))
+            role = row.get("role")
+            new_rows.append({
+                "match_team_id": team_id, "user_id": user_id,
+                "role": MemberRole(role) if role else MemberRole.MAIN, "joined_at": self.now,
+            })
+        _bulk_insert(self.conn, MatchTeamMembership, new_rows)
+        self.counts["memberships"] = len(new_rows)
+        self.skipped["memberships"] = len(rows) - len(new_rows)
+
+    def import_lineups(self, rows):
+        for row in rows:
+            _require(row, "match", "game_code", "team", "nickname", kind="lineups")
+        self.resolve_matches(r["match"] for r in rows)
+        match_ids = {self._match_id(r, "lineups") for r in rows}
+        self.resolve_teams(match_ids)
+        self.resolve_match_games(match_ids)
+        self.resolve_games(r["game_code"] for r in rows)
+        self.resolve_users(r["nickname"] for r in rows)
+
+        candidates = []
+        for row in rows:
+            match_id = self.match_ids[row["match"]]
+            mg_id = self._match_game_id(match_id, row["game_code"], "lineups")
+            team_id = self._team_id(match_id, row["team"], "lineups")
+            candidates.append((mg_id, self.user_ids[row["nickname"]], team_id, row))
+        existing = set(_lookup(
+            self.conn, [GameLineup.match_game_id, GameLineup.user_id], GameLineup.id,
+            {(mg_id, user_id) for mg_id, user_id, _, _ in candidates},
+        ))
+
+        new_rows = []
+        for mg_id, user_id, team_id, row in candidates:
+            if (mg_id, user_id) in existing:
+                continue
+            existing.add((mg_id, user_id))
+            new_rows.append({
+                "match_game_id": mg_id, "match_team_id": team_id, "user_id": user_id,
+                "is_starting": _parse_bool(row.get("is_starting")),
+                "substitute_reason": row.get("substitute_reason"), "created_at": self.now,
+            })
+        _bulk_insert(self.conn, GameLineup, new_rows)
+        self.counts["lineups"] = len(new_rows)
+        self.skipped["lineups"] = len(rows) - len(new_rows)
+
+    def import_scores(self, rows):
+        for row in rows:
+            _require(row, "match", "game_code", "nickname", "points", kind="scores")
+        self.resolve_matches(r["match"] for r in rows)
+        match_ids = {self._match_id(r, "scores") for r in rows}
+        self.resolve_teams(match_ids)
+        self.resolve_match_games(match_ids)
+        self.resolve_games(r["game_code"] for r in rows)
+        self.resolve_users(r["nickname"] for r in rows)
+
+        resolved = []
+        for row in rows:
+            match_id = self.match_ids[row["match"]]
+            mg_id = self._match_game_id(match_id, row["game_code"], "scores")
+            team_id = self._team_id(match_id, row["team"], "scores") if row.get("team") else None
+            resolved.append((match_id, mg_id, self.user_ids[row["nickname"]], team_id, row))
+
+        # 没有写队伍的分数：先按阵容、再按队员关系确定队伍
+        unresolved = [r for r in resolved if r[3] is None]
+        lineup_teams = _lookup(
+            self.conn, [GameLineup.match_game_id, GameLineup.user_id], GameLineup.match_team_id,
+            {(mg_id, user_id) for _, mg_id, user_id, _, _ in unresolved},
+        )
+        membership_teams = {}
+        need_membership = {(match_id, user_id) for match_id, mg_id, user_id, _, _ in unresolved
+                           if (mg_id, user_id) not in lineup_teams}
+        for chunk in _chunks({user_id for _, user_id in need_membership}, LOOKUP_CHUNK):
+            for match_id, user_id, team_id in self.conn.execute(
+                select(MatchTeam.match_id, MatchTeamMembership.user_id, MatchTeam.id)
+                .join(MatchTeam, MatchTeamMembership.match_team_id == MatchTeam.id)
+                .where(MatchTeamMembership.user_id.in_(chunk), MatchTeam.match_id.in_(match_ids))
+                .order_by(MatchTeam.id.desc())
+            ):
+                membership_teams[(match_id, user_id)] = team_id
+
+        new_rows = []
+        for match_id, mg_id, user_id, team_id, row in resolved:
+            if team_id is None:
+                team_id = lineup_teams.get((mg_id, user_id)) or membership_teams.get((match_id, user_id))
+            if team_id is None:
+                raise ImportDataError(f"scores: 无法确定 {row['nickname']!r} 在比赛 {row['match']!r} 中的队伍")
+            event_data = row.get("event_data")
+            if isinstance(event_data, str):
+                event_data = json.loads(event_data)
+            new_rows.append({
+                "points": int(row["points"]), "standard_score": None,
+                "user_id": user_id, "match_team_id": team_id, "match_game_id": mg_id,
+                "event_data": event_data, "recorded_at": _parse_time(row.get("recorded_at")) or self.now,
+            })
+            self.touched_match_games.add(mg_id)
+        _bulk_insert(self.conn, Score, new_rows)
+        self.counts["scores"] = len(new_rows)
+        self.skipped["scores"] = 0
+
+
+def run_import(engine, files: dict, dry_run: bool = False) -> dict:
+    """按依赖顺序导入 files（{kind: path}），返回每类数据的行数、耗时和吞吐"""
+    report = {}
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            importer = Importer(conn)
+            for kind in KINDS:
+                if kind not in files:
+                    continue
+                started = time.perf_counter()
+                rows = read_rows(files[kind])
+                getattr(importer, f"import_{kind}")(rows)
+                elapsed = time.perf_counter() - started
+                report[kind] = {
+                    "rows": len(rows), "inserted": importer.counts.get(kind, 0),
+                    "skipped": importer.skipped.get(kind, 0), "seconds": elapsed,
+                }
+            if dry_run:
+                trans.rollback()
+            else:
+                trans.commit()
+        except BaseException:
+            trans.rollback()
+            raise
+
+    if importer.touched_match_games and not dry_run:
+        started = time.perf_counter()
+        db = SessionLocal(bind=engine)
+        try:
+            recalculated = recalculate_scores_bulk(db, importer.touched_match_games)
+        finally:
+            db.close()
+        report["recalculate"] = {"rows": recalculated["scores"], "seconds": time.perf_counter() - started,
+                                 "details": recalculated}
+    if not dry_run and engine.dialect.name == "sqlite":
+        analyze_database(engine)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for kind in KINDS:
+        parser.add_argument(f"--{kind}", metavar="FILE", help=f"{kind} 数据文件")
+    parser.add_argument("--database-url", default=settings.SQLALCHEMY_DATABASE_URI,
+                        help="目标数据库，默认取 SQLALCHEMY_DATABASE_URI")
+    parser.add_argument("--dry-run", action="store_true", help="只解析和校验，最后回滚")
+    args = parser.parse_args()
+
+    files = {kind: getattr(args, kind) for kind in KINDS if getattr(args, kind)}
+    if not files:
+        parser.error("至少指定一个数据文件")
+
+    engine = create_db_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        report = run_import(engine, files, dry_run=args.dry_run)
+    except (ImportDataError, ValueError, KeyError, OSError) as e:
+        print(f"导入失败，已回滚: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        engine.dispose()
+    total = time.perf_counter() - started
+
+    print(f"{'kind':<14}{'rows':>10}{'inserted':>10}{'skipped':>10}{'seconds':>10}{'rows/s':>12}")
+    total_rows = 0
+    for kind, r in report.items():
+        total_rows += r["rows"] if kind != "recalculate" else 0
+        rate = r["rows"] / r["seconds"] if r["seconds"] else 0.0
+        print(f"{kind:<14}{r['rows']:>10}{r.get('inserted', '-'):>10}{r.get('skipped', '-'):>10}"
+              f"{r['seconds']:>10.2f}{rate:>12.0f}")
+    print(f"\n共 {total_rows} 行，用时 {total:.2f}s，{total_rows / total if total else 0:.0f} 行/秒"
+          + ("（dry run，已回滚）" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
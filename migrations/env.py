@@ -0,0 +1,50 @@
+"""
+Alembic 迁移环境
+
+新建数据库: python create_db.py && alembic stamp head
+已有数据库: alembic upgrade head
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from app.core.config import settings
+from app.core.db import Base
+# 导入所有模型，确保它们已注册到 Base.metadata
+from app.modules.users import models as user_models  # noqa: F401
+from app.modules.games import models as game_models  # noqa: F401
+from app.modules.matches import models as match_models  # noqa: F401
+from app.modules.changes import models as change_models  # noqa: F401
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(
+        url=settings.SQLALCHEMY_DATABASE_URI,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+    with connectable.connect() as connection:
+        # SQLite 不支持大部分 ALTER TABLE，使用 batch 模式
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
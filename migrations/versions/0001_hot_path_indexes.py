@@ -0,0 +1,57 @@
+"""热点外键访问路径的索引，users.nickname 唯一
+
+Revision ID: 0001_hot_path_indexes
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_hot_path_indexes"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列, 是否唯一)，与各模块 models.py 中的定义保持一致
+INDEXES = [
+    ("ix_scores_game_user_std", "scores", ["match_game_id", "user_id", "standard_score"], False),
+    ("ix_scores_user_game_std", "scores", ["user_id", "match_game_id", "standard_score"], False),
+    ("ix_scores_user_recorded", "scores", ["user_id", "recorded_at"], False),
+    ("ix_scores_match_team_id", "scores", ["match_team_id"], False),
+    ("ix_game_lineups_game_user", "game_lineups", ["match_game_id", "user_id", "match_team_id"], False),
+    ("ix_memberships_team_user", "match_team_memberships", ["match_team_id", "user_id"], False),
+    ("ix_memberships_user_team", "match_team_memberships", ["user_id", "match_team_id"], False),
+    ("ix_match_teams_match_id", "match_teams", ["match_id"], False),
+    ("ix_match_games_match_order", "match_games", ["match_id", "game_order"], False),
+    ("ix_match_games_game_id", "match_games", ["game_id"], False),
+    ("ix_users_average_standard_score", "users", ["average_standard_score"], False),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # 昵称是 get-or-create 的键，建唯一索引前先确认没有重复数据
+    duplicates = conn.execute(sa.text(
+        "SELECT nickname, COUNT(*) FROM users GROUP BY nickname HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        names = ", ".join(f"{name!r} x{count}" for name, count in duplicates[:20])
+        raise RuntimeError(f"users.nickname 存在重复，请先合并这些用户再迁移: {names}")
+
+    # 旧库中 ix_users_nickname 是普通索引，替换为唯一索引
+    op.execute("DROP INDEX IF EXISTS ix_users_nickname")
+    op.create_index("ix_users_nickname", "users", ["nickname"], unique=True)
+
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+    # 让查询规划器立即用上新索引
+    op.execute("ANALYZE")
+
+
+def downgrade():
+    for name, table, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
+    op.drop_index("ix_users_nickname", table_name="users")
+    op.create_index("ix_users_nickname", "users", ["nickname"], unique=False)
@@ -0,0 +1,36 @@
+"""增量同步的变更日志表 change_log
+
+Revision ID: 0002_change_log
+Revises: 0001_hot_path_indexes
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_change_log"
+down_revision = "0001_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 与 app/modules/changes/models.py 中的定义保持一致
+    op.create_table(
+        "change_log",
+        sa.Column("id", sa.Integer(), primary_key=True, comment="变更序号（游标）"),
+        sa.Column("entity", sa.String(), nullable=False, comment="实体类型（表名）"),
+        sa.Column("entity_id", sa.Integer(), nullable=False, comment="实体ID"),
+        sa.Column("op", sa.String(), nullable=False, comment="操作：insert / update / delete"),
+        sa.Column("match_id", sa.Integer(), nullable=True, comment="所属比赛ID"),
+        sa.Column("user_id", sa.Integer(), nullable=True, comment="所属玩家ID"),
+        sa.Column("changed_at", sa.DateTime(), nullable=True, comment="变更时间"),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_change_log_match_id", "change_log", ["match_id", "id"])
+    op.create_index("ix_change_log_user_id", "change_log", ["user_id", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_change_log_user_id", table_name="change_log")
+    op.drop_index("ix_change_log_match_id", table_name="change_log")
+    op.drop_table("change_log")